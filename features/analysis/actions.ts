@@ -1,9 +1,12 @@
 'use server'
 
+import { createHash } from 'crypto'
 import { createServerSupabaseClient } from '@/lib/supabase/server'
-import type { JobType, AnalysisResult, UploadResult } from './types'
+import { isStaleJob, staleJobResult } from './stale'
+import type { JobType, AnalysisResult, UploadResult, ArtifactPointer } from './types'
 
 const STORAGE_BUCKET = 'analysis-uploads'
+const RESULTS_BUCKET = 'analysis-results'
 const MAX_DAILY_JOBS = 50
 const DEMO_PASSWORD = process.env.DEMO_PASSWORD || 'leo'
 
@@ -38,6 +41,11 @@ export async function uploadAndCreateJob(
     throw new Error('Daily limit reached. Try again tomorrow.')
   }
 
+  // Content hash lets Modal reuse an identical earlier result without downloading
+  const inputHash = createHash('sha256')
+    .update(Buffer.from(await file.arrayBuffer()))
+    .digest('hex')
+
   // Generate unique path
   const timestamp = Date.now()
   const path = `${jobType}/${timestamp}_${file.name}`
@@ -71,6 +79,7 @@ export async function uploadAndCreateJob(
       input_file_path: path,
       status: 'pending',
       column_config: columnConfig,
+      input_hash: inputHash,
     })
     .select('id')
     .single()
@@ -118,9 +127,6 @@ async function triggerProcessing(jobId: string): Promise<void> {
   }
 }
 
-// Jobs stuck in pending/running for more than this are considered stale
-const STALE_JOB_TIMEOUT_MS = 5 * 60 * 1000 // 5 minutes
-
 /**
  * Poll job status with progress
  * 
@@ -140,20 +146,8 @@ export async function getJobStatus(jobId: string): Promise<AnalysisResult> {
     throw new Error(`Failed to fetch job: ${error.message}`)
   }
 
-  // Detect stale jobs: pending/running for too long with no progress
-  const isStale =
-    (job.status === 'pending' || job.status === 'running') &&
-    job.progress === 0 &&
-    Date.now() - new Date(job.updated_at ?? job.created_at).getTime() > STALE_JOB_TIMEOUT_MS
-
-  if (isStale) {
-    return {
-      jobId: job.id,
-      status: 'error',
-      progress: 0,
-      result: undefined,
-      error: 'Job timed out. The processing server may be unreachable. Please try again.',
-    }
+  if (isStaleJob(job)) {
+    return staleJobResult(job.id)
   }
 
   return {
@@ -182,6 +176,28 @@ export async function getSignedUrl(path: string, expiresIn = 3600): Promise<stri
   return data.signedUrl
 }
 
+/**
+ * Get a signed URL for a result artifact (full score tables written by Modal).
+ * Pass a pointer from `result.artifacts`; fetch it only when the data is needed.
+ */
+export async function getArtifactUrl(artifact: ArtifactPointer, expiresIn = 3600): Promise<string> {
+  if (artifact.bucket !== RESULTS_BUCKET) {
+    throw new Error(`Unexpected artifact bucket: ${artifact.bucket}`)
+  }
+
+  const supabase = await createServerSupabaseClient()
+
+  const { data, error } = await supabase.storage
+    .from(RESULTS_BUCKET)
+    .createSignedUrl(artifact.path, expiresIn)
+
+  if (error) {
+    throw new Error(`Failed to create artifact URL: ${error.message}`)
+  }
+
+  return data.signedUrl
+}
+
 /**
  * Delete the uploaded file for a job (call after processing completes)
  * This should be called by the processing backend (Modal) after job completion.
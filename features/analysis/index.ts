@@ -1,3 +1,5 @@
 export * from './types'
 export * from './actions'
 
+export * from './stale'
+export * from './status'
@@ -0,0 +1,29 @@
+import type { AnalysisResult, JobStatusSummary } from './types'
+
+// Jobs stuck in pending/running for more than this are considered stale
+export const STALE_JOB_TIMEOUT_MS = 5 * 60 * 1000 // 5 minutes
+
+/**
+ * Whether a job has sat in pending/running with no progress and no update
+ * for STALE_JOB_TIMEOUT_MS (likely Modal failing to reach Supabase to
+ * update its status)
+ */
+export function isStaleJob(
+  job: Pick<JobStatusSummary, 'status' | 'progress' | 'created_at' | 'updated_at'>
+): boolean {
+  return (
+    (job.status === 'pending' || job.status === 'running') &&
+    job.progress === 0 &&
+    Date.now() - new Date(job.updated_at ?? job.created_at).getTime() > STALE_JOB_TIMEOUT_MS
+  )
+}
+
+export function staleJobResult(jobId: string): AnalysisResult {
+  return {
+    jobId,
+    status: 'error',
+    progress: 0,
+    result: undefined,
+    error: 'Job timed out. The processing server may be unreachable. Please try again.',
+  }
+}
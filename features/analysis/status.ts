@@ -0,0 +1,66 @@
+import { getJobStatus } from './actions'
+import { isStaleJob, staleJobResult } from './stale'
+import type { AnalysisResult, JobStatusSummary } from './types'
+
+// Modal's job_status endpoint; without it, watchers fall back to polling the row
+const STATUS_URL = process.env.NEXT_PUBLIC_MODAL_STATUS_URL
+const STATUS_WAIT_SECONDS = 25
+const POLL_INTERVAL_MS = 2000
+
+/**
+ * Follow a job's progress: returns a function that resolves with its next state.
+ *
+ * With NEXT_PUBLIC_MODAL_STATUS_URL set, each call long-polls the status
+ * endpoint (id, status and progress only, with an ETag) and resolves when
+ * the job changes, or with the same state after STATUS_WAIT_SECONDS. The
+ * full row, result included, is read once, when the job finishes. A job
+ * that goes stale (see isStaleJob) resolves as an error, as from
+ * getJobStatus. Otherwise each call reads the row every POLL_INTERVAL_MS.
+ */
+export function watchJob(jobId: string): () => Promise<AnalysisResult> {
+  let etag: string | null = null
+  let summary: JobStatusSummary | null = null
+  let first = true
+
+  // The last summary, re-checked for staleness every call: a 304 means no update
+  const current = (): AnalysisResult => {
+    if (!summary) {
+      return { jobId, status: 'pending', progress: 0 }
+    }
+    if (isStaleJob(summary)) {
+      return staleJobResult(jobId)
+    }
+    return { jobId, status: summary.status, progress: summary.progress ?? 0 }
+  }
+
+  return async () => {
+    if (!STATUS_URL) {
+      if (!first) {
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS))
+      }
+      first = false
+      return getJobStatus(jobId)
+    }
+
+    const params = new URLSearchParams({ jobId, wait: String(etag ? STATUS_WAIT_SECONDS : 0) })
+    const response = await fetch(`${STATUS_URL}?${params}`, {
+      headers: etag ? { 'If-None-Match': etag } : {},
+      cache: 'no-store',
+    })
+
+    // Unchanged within the wait
+    if (response.status === 304) {
+      return current()
+    }
+    if (!response.ok) {
+      throw new Error(`Status check failed: ${response.status}`)
+    }
+
+    etag = response.headers.get('ETag')
+    summary = (await response.json()) as JobStatusSummary
+    if (summary.status === 'done' || summary.status === 'error') {
+      return getJobStatus(jobId)
+    }
+    return current()
+  }
+}
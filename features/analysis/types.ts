@@ -6,9 +6,14 @@ export type JobStatus = Job['status']
 
 export type JobType = 
   | 'poisson_factorization'
+  | 'poisson_scoring'
   | 'survival_analysis'
   | 'nrr_decomposition'
   | 'propensity_model'
+  | 'multi_analysis'
+
+// What Modal's job_status endpoint returns: never the result
+export type JobStatusSummary = Pick<Job, 'id' | 'status' | 'progress' | 'created_at' | 'updated_at'>
 
 export interface AnalysisResult {
   jobId: string
@@ -18,6 +23,19 @@ export interface AnalysisResult {
   error?: string
 }
 
+// Pointer to a large result array stored as a file (result.artifacts[name])
+export interface ArtifactPointer {
+  bucket: string
+  path: string
+  format: 'parquet' | 'npz'
+  bytes: number
+  description: string
+  rows?: number
+  columns?: string[]
+  shape?: number[]
+  dtype?: string
+}
+
 export interface UploadResult {
   path: string
   jobId: string
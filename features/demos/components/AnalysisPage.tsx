@@ -22,7 +22,7 @@ import {
   Check,
   X
 } from "lucide-react";
-import { uploadAndCreateJob, getJobStatus } from "@/features/analysis";
+import { uploadAndCreateJob, watchJob } from "@/features/analysis";
 import type { JobType } from "@/features/analysis";
 import { PoissonResults } from "./PoissonResults";
 import { ColumnPicker, type ColumnConfig } from "./ColumnPicker";
@@ -534,13 +534,12 @@ export function AnalysisPage({ config }: AnalysisPageProps) {
   };
 
   const pollJobStatus = useCallback(async (id: string) => {
-    const maxAttempts = 120;
-    let attempts = 0;
+    const deadline = Date.now() + 10 * 60 * 1000; // Give up after 10 minutes
+    const nextStatus = watchJob(id);
 
     const poll = async (): Promise<void> => {
-      attempts++;
       try {
-        const jobResult = await getJobStatus(id);
+        const jobResult = await nextStatus();
         setProgress(jobResult.progress);
         
         if (jobResult.status === "done") {
@@ -556,8 +555,8 @@ export function AnalysisPage({ config }: AnalysisPageProps) {
           return;
         }
 
-        if (attempts < maxAttempts) {
-          setTimeout(poll, 2000);
+        if (Date.now() < deadline) {
+          setTimeout(poll, 0); // nextStatus waits for the next change
         } else {
           setStatus("error");
           setError("Job timed out");
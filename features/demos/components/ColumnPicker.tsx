@@ -21,6 +21,24 @@ export interface ColumnConfig {
   // Long format: column names
   featureNameColumn?: string;
   featureValueColumn?: string;
+  // Poisson factorization: most factors to try (default 50)
+  maxFactors?: number;
+  // Poisson scoring: finished poisson_factorization job whose factors to score against
+  referenceJobId?: string;
+  // Survival analysis: tenure, churn flag, optional segment and covariates
+  durationColumn?: string;
+  eventColumn?: string;
+  segmentColumn?: string;
+  covariateColumns?: string[];
+  // NRR decomposition: revenue per customer and period
+  periodColumn?: string;
+  revenueColumn?: string;
+  periodFrequency?: "month" | "quarter" | "year";
+  // Propensity model: won/lost outcome per deal
+  outcomeColumn?: string;
+  dealIdColumn?: string;
+  // Multi-analysis jobs: the job types to run on the one upload
+  analyses?: string[];
 }
 
 interface ColumnPickerProps {
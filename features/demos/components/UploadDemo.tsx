@@ -2,7 +2,7 @@
 
 import { useState, useCallback } from "react";
 import { Upload, FileSpreadsheet, Loader2, CheckCircle2, AlertCircle } from "lucide-react";
-import { uploadAndCreateJob, getJobStatus } from "@/features/analysis";
+import { uploadAndCreateJob, watchJob } from "@/features/analysis";
 import type { JobType } from "@/features/analysis";
 
 const JOB_TYPES: { value: JobType; label: string; description: string }[] = [
@@ -72,13 +72,12 @@ export function UploadDemo() {
   }, []);
 
   const pollJobStatus = useCallback(async (id: string) => {
-    const maxAttempts = 120; // 10 minutes with 5s intervals
-    let attempts = 0;
+    const deadline = Date.now() + 10 * 60 * 1000; // Give up after 10 minutes
+    const nextStatus = watchJob(id);
 
     const poll = async (): Promise<void> => {
-      attempts++;
       try {
-        const jobResult = await getJobStatus(id);
+        const jobResult = await nextStatus();
         
         // Update progress
         setProgress(jobResult.progress);
@@ -96,8 +95,8 @@ export function UploadDemo() {
           return;
         }
 
-        if (attempts < maxAttempts) {
-          setTimeout(poll, 2000); // Poll every 2s for smoother progress
+        if (Date.now() < deadline) {
+          setTimeout(poll, 0); // nextStatus waits for the next change
         } else {
           setStatus("error");
           setError("Job timed out");
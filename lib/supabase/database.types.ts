@@ -24,6 +24,14 @@ export interface Database {
           error_message: string | null
           progress: number | null
           column_config: Json | null
+          input_hash: string | null
+          result_key: string | null
+          result_cache_hit: boolean | null
+          claimed_by: string | null
+          lease_expires_at: string | null
+          attempts: number
+          metrics: Json | null
+          route: string | null
         }
         Insert: {
           id?: string
@@ -36,6 +44,14 @@ export interface Database {
           error_message?: string | null
           progress?: number | null
           column_config?: Json | null
+          input_hash?: string | null
+          result_key?: string | null
+          result_cache_hit?: boolean | null
+          claimed_by?: string | null
+          lease_expires_at?: string | null
+          attempts?: number
+          metrics?: Json | null
+          route?: string | null
         }
         Update: {
           id?: string
@@ -48,11 +64,64 @@ export interface Database {
           error_message?: string | null
           progress?: number | null
           column_config?: Json | null
+          input_hash?: string | null
+          result_key?: string | null
+          result_cache_hit?: boolean | null
+          claimed_by?: string | null
+          lease_expires_at?: string | null
+          attempts?: number
+          metrics?: Json | null
+          route?: string | null
         }
       }
     }
-    Views: {}
-    Functions: {}
+    Views: {
+      result_cache_stats: {
+        Row: {
+          job_type: string
+          hits: number
+          misses: number
+        }
+      }
+      job_stage_stats: {
+        Row: {
+          job_type: string
+          stage: string
+          spans: number
+          p50_seconds: number | null
+          p95_seconds: number | null
+          max_peak_rss_mb: number | null
+        }
+      }
+    }
+    Functions: {
+      claim_jobs: {
+        Args: {
+          max_jobs: number
+          lease_seconds: number
+          worker_id: string
+          only_job_id?: string | null
+          max_attempts?: number
+          routes?: string[] | null
+        }
+        Returns: Database['public']['Tables']['jobs']['Row'][]
+      }
+      heartbeat_jobs: {
+        Args: {
+          job_ids: string[]
+          lease_seconds: number
+          worker_id: string
+        }
+        Returns: number
+      }
+      release_jobs: {
+        Args: {
+          job_ids: string[]
+          worker_id: string
+        }
+        Returns: number
+      }
+    }
     Enums: {}
   }
 }
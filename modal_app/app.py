@@ -5,10 +5,17 @@ Deploy: modal deploy modal_app/app.py
 Dev:    modal serve modal_app/app.py
 """
 
+import os
+
 import modal
 
 app = modal.App("analysis-jobs")
 
+# Memory snapshots for JobProcessor: on unless deployed with
+# ANALYSIS_MEMORY_SNAPSHOT=0. The image carries the choice into containers
+# so their class definition matches the deployed one.
+MEMORY_SNAPSHOT = os.environ.get("ANALYSIS_MEMORY_SNAPSHOT", "1") != "0"
+
 # Image with pinned versions
 # Using postgrest-py + storage3 directly to avoid supabase-py version conflicts
 image = (
@@ -18,6 +25,8 @@ image = (
         "pandas==2.2.0",
         "numpy==1.26.3",
         "scikit-learn==1.4.0",
+        "scipy==1.12.0",
+        "pyarrow==15.0.0",
         # Web endpoint
         "fastapi",
         # Supabase components (avoiding the full supabase-py due to version conflicts)
@@ -25,30 +34,48 @@ image = (
         "postgrest==0.16.11",
         "storage3==0.7.7",
     )
+    .env({"ANALYSIS_MEMORY_SNAPSHOT": "1" if MEMORY_SNAPSHOT else "0"})
+    # Numeric engines live in modal_app/jobs/
+    .add_local_python_source("modal_app")
 )
 
 
+# Parsed uploads cached as Arrow files, keyed by content hash (see lib/cache.py)
+UPLOAD_CACHE_DIR = "/upload-cache"
+upload_cache_volume = modal.Volume.from_name("analysis-upload-cache", create_if_missing=True)
+
+
 # =============================================================================
 # Database Layer (using postgrest + storage3 directly)
 # =============================================================================
 
 class SupabaseClient:
-    """Lightweight Supabase client using postgrest + storage3 directly."""
+    """
+    Lightweight Supabase client using postgrest + storage3 directly.
+    
+    Meant to live for the whole container (see get_supabase_client): the
+    underlying httpx clients keep connections alive across jobs. Sync calls
+    go through table()/storage; independent calls can be issued concurrently
+    through atable()/astorage and gather(), which run on a private event
+    loop thread so the async connection pool also survives between jobs.
+    """
     
     def __init__(self, url: str, key: str):
-        from postgrest import SyncPostgrestClient
-        from storage3 import SyncStorageClient
+        import asyncio
+        import threading
+        from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+        from storage3 import AsyncStorageClient, SyncStorageClient
         
         self.url = url
         self.key = key
-        self._postgrest = SyncPostgrestClient(
-            f"{url}/rest/v1",
-            headers={"apikey": key, "Authorization": f"Bearer {key}"}
-        )
-        self._storage = SyncStorageClient(
-            f"{url}/storage/v1",
-            headers={"apikey": key, "Authorization": f"Bearer {key}"}
-        )
+        headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        self._postgrest = SyncPostgrestClient(f"{url}/rest/v1", headers=headers)
+        self._storage = SyncStorageClient(f"{url}/storage/v1", headers=headers)
+        self._apostgrest = AsyncPostgrestClient(f"{url}/rest/v1", headers=headers)
+        self._astorage = AsyncStorageClient(f"{url}/storage/v1", headers=headers)
+        
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
     
     def table(self, name: str):
         return self._postgrest.from_(name)
@@ -56,12 +83,63 @@ class SupabaseClient:
     @property
     def storage(self):
         return self._storage
+    
+    def rpc(self, fn: str, params: dict):
+        """Call a Postgres function (see supabase/migrations)."""
+        return self._postgrest.rpc(fn, params)
+    
+    def atable(self, name: str):
+        """Async table builder; await its execute() inside gather()."""
+        return self._apostgrest.from_(name)
+    
+    @property
+    def astorage(self):
+        return self._astorage
+    
+    def iter_download(self, bucket: str, path: str, chunk_bytes: int = 4 * 1024 * 1024):
+        """Yield a storage object's bytes as they arrive, chunk_bytes at a time."""
+        with self._storage.session.stream("GET", f"object/{bucket}/{path}") as response:
+            response.raise_for_status()
+            yield from response.iter_bytes(chunk_bytes)
+    
+    def read_head(self, bucket: str, path: str, n_bytes: int) -> tuple:
+        """(first n_bytes of a storage object, its total size), from one ranged request."""
+        with self._storage.session.stream(
+            "GET", f"object/{bucket}/{path}", headers={"Range": f"bytes=0-{n_bytes - 1}"}
+        ) as response:
+            response.raise_for_status()
+            head = b""
+            for chunk in response.iter_bytes():
+                head += chunk
+                if len(head) >= n_bytes:
+                    break
+            # "bytes 0-65535/<total>" when the range was honoured, else the whole object's length
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if not total.isdigit():
+                total = response.headers.get("Content-Length") or len(head)
+        return head[:n_bytes], int(total)
+    
+    def gather(self, *coros) -> list:
+        """Run coroutines concurrently on the client's loop and wait for all results."""
+        import asyncio
+        
+        async def _all():
+            return await asyncio.gather(*coros)
+        
+        return asyncio.run_coroutine_threadsafe(_all(), self._loop).result()
+
+
+_supabase_client = None
 
 
 def get_supabase_client() -> SupabaseClient:
-    """Create Supabase client with service role credentials."""
+    """Container-wide Supabase client with service role credentials (built on first use)."""
     import os
     
+    global _supabase_client
+    if _supabase_client is not None:
+        return _supabase_client
+    
     url = os.environ.get("SUPABASE_URL")
     key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
     
@@ -72,7 +150,8 @@ def get_supabase_client() -> SupabaseClient:
     if not url.startswith("https://"):
         raise RuntimeError(f"SUPABASE_URL must start with https://, got: {url[:50]}...")
     
-    return SupabaseClient(url, key)
+    _supabase_client = SupabaseClient(url, key)
+    return _supabase_client
 
 
 def _retry_supabase_call(fn, max_retries: int = 3, base_delay: float = 1.0):
@@ -100,114 +179,668 @@ def update_progress(supabase: SupabaseClient, job_id: str, progress: int):
     )
 
 
-def fail_job(supabase: SupabaseClient, job_id: str, error_message: str):
-    """Mark job as failed with error message, with retry."""
-    _retry_supabase_call(
-        lambda: supabase.table("jobs").update({
-            "status": "error",
-            "error_message": error_message,
-            "progress": 0,
-        }).eq("id", job_id).execute()
+class ProgressReporter:
+    """
+    Writes job progress from a background thread.
+    
+    Callers never block: report() only records the latest value, and the
+    thread flushes it at most once per min_interval (older unsent values are
+    dropped). close() flushes the last value and joins, so status/result
+    writes made after it always land after the final progress write.
+    """
+    
+    def __init__(self, supabase: SupabaseClient, job_id: str, min_interval: float = 1.0):
+        import threading
+        
+        self._supabase = supabase
+        self._job_id = job_id
+        self.min_interval = min_interval
+        self._latest = None
+        self._sent = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def report(self, progress: int):
+        with self._cond:
+            self._latest = progress
+            self._cond.notify()
+    
+    __call__ = report
+    
+    def close(self):
+        """Flush the latest value and stop the thread. Safe to call twice."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+    
+    def _run(self):
+        import time
+        
+        while True:
+            with self._cond:
+                while self._latest == self._sent and not self._closed:
+                    self._cond.wait()
+                if self._latest == self._sent:
+                    return
+                value = self._latest
+            
+            try:
+                update_progress(self._supabase, self._job_id, value)
+            except Exception as e:
+                # Progress is cosmetic; never let it fail the job
+                print(f"Progress update failed for job {self._job_id}: {e}")
+            self._sent = value
+            
+            # Rate limit, but wake immediately to flush on close()
+            deadline = time.monotonic() + self.min_interval
+            with self._cond:
+                while not self._closed and (remaining := deadline - time.monotonic()) > 0:
+                    self._cond.wait(remaining)
+
+
+def fail_job(supabase: SupabaseClient, job_id: str, error_message: str, worker_id: str = None, metrics: dict = None):
+    """
+    Mark job as failed with error message (and the stage metrics so far), with retry.
+    
+    With worker_id, only while that worker still holds the job, so a worker
+    whose lease was taken over cannot overwrite the new owner's run.
+    """
+    fields = {"status": "error", "error_message": error_message, "progress": 0}
+    if metrics is not None:
+        fields["metrics"] = metrics
+    
+    def write():
+        query = supabase.table("jobs").update(fields).eq("id", job_id)
+        if worker_id is not None:
+            query = query.eq("claimed_by", worker_id)
+        return query.execute()
+    
+    _retry_supabase_call(write)
+
+
+def complete_job(supabase: SupabaseClient, job_id: str, worker_id: str, fields: dict) -> bool:
+    """
+    Mark job done with fields, only while worker_id still holds it.
+    
+    Returns False when the lease was taken over by another worker; the
+    caller must then leave the job (and its upload) to the new owner.
+    """
+    response = supabase.table("jobs").update({
+        "status": "done",
+        "progress": 100,
+        **fields,
+    }).eq("id", job_id).eq("claimed_by", worker_id).execute()
+    if not response.data:
+        print(f"Job {job_id} is no longer held by {worker_id}; dropping this result and leaving the upload")
+        return False
+    return True
+
+
+def cleanup_upload(supabase: SupabaseClient, job_id: str, file_path: str):
+    """Delete the uploaded file and clear its path on the job, concurrently."""
+    supabase.gather(
+        supabase.astorage.from_("analysis-uploads").remove([file_path]),
+        supabase.atable("jobs").update({"input_file_path": None}).eq("id", job_id).execute(),
     )
 
 
+def find_cached_result(supabase: SupabaseClient, result_key: str, job_id: str):
+    """Most recent finished job (other than job_id) with the same result_key, or None."""
+    response = _retry_supabase_call(
+        lambda: supabase.table("jobs")
+        .select("id, result")
+        .eq("result_key", result_key)
+        .eq("status", "done")
+        .neq("id", job_id)
+        .order("updated_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return response.data[0] if response.data else None
+
+
+# A claimed job belongs to one worker until its lease expires. Workers
+# heartbeat while they hold jobs; expired leases are claimable again, but a
+# job whose lease expired MAX_ATTEMPTS times is failed instead of retried.
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+
+
+def new_worker_id() -> str:
+    """Identifier recorded in jobs.claimed_by for this processing run."""
+    import os
+    import uuid
+    
+    return f"{os.environ.get('MODAL_TASK_ID', 'local')}-{uuid.uuid4().hex[:8]}"
+
+
+def claim_jobs(
+    supabase: SupabaseClient, worker_id: str, max_jobs: int = 1, job_id: str = None, routes: list = None
+) -> list:
+    """
+    Atomically claim up to max_jobs claimable jobs (or just job_id) for worker_id.
+    
+    routes limits the claim to jobs trigger routed there (see ROUTES; jobs
+    never routed count as "standard"). Returns the claimed rows, already
+    marked running. Concurrent callers never receive the same job
+    (claim_jobs SQL function, FOR UPDATE SKIP LOCKED).
+    """
+    response = supabase.rpc("claim_jobs", {
+        "max_jobs": max_jobs,
+        "lease_seconds": LEASE_SECONDS,
+        "worker_id": worker_id,
+        "only_job_id": job_id,
+        "max_attempts": MAX_ATTEMPTS,
+        "routes": routes,
+    }).execute()
+    return response.data or []
+
+
+def release_jobs(supabase: SupabaseClient, worker_id: str, job_ids: list):
+    """Return claimed but unstarted jobs to the queue without counting an attempt."""
+    supabase.rpc("release_jobs", {"job_ids": job_ids, "worker_id": worker_id}).execute()
+
+
+class LeaseHeartbeat:
+    """Background thread that keeps extending the leases this worker holds."""
+    
+    def __init__(self, supabase: SupabaseClient, worker_id: str, job_ids: list):
+        import threading
+        
+        self._supabase = supabase
+        self._worker_id = worker_id
+        self._job_ids = set(job_ids)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def release(self, job_id: str):
+        """Stop extending job_id's lease (the job is finished)."""
+        with self._lock:
+            self._job_ids.discard(job_id)
+    
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            with self._lock:
+                job_ids = list(self._job_ids)
+            if not job_ids:
+                continue
+            try:
+                self._supabase.rpc("heartbeat_jobs", {
+                    "job_ids": job_ids,
+                    "lease_seconds": LEASE_SECONDS,
+                    "worker_id": self._worker_id,
+                }).execute()
+            except Exception as e:
+                # A missed beat only shortens the lease; the next one may succeed
+                print(f"Lease heartbeat failed for {len(job_ids)} jobs: {e}")
+
+
 # =============================================================================
 # Job Processor
 # =============================================================================
 
-@app.function(
+# Imported once per container by JobProcessor (and captured in the memory
+# snapshot), so jobs never pay for them
+PRELOAD_MODULES = (
+    "numpy",
+    "pandas",
+    "scipy.sparse",
+    "scipy.special",
+    "pyarrow",
+    "pyarrow.csv",
+    "pyarrow.parquet",
+    "postgrest",
+    "storage3",
+    "modal_app.jobs.nrr",
+    "modal_app.jobs.poisson",
+    "modal_app.jobs.propensity",
+    "modal_app.jobs.survival",
+    "modal_app.lib.artifacts",
+    "modal_app.lib.cache",
+    "modal_app.lib.ingest",
+    "modal_app.lib.memo",
+    "modal_app.lib.resources",
+    "modal_app.lib.spans",
+    "modal_app.lib.uploads",
+    "threadpoolctl",
+)
+
+# Jobs claimed per round trip by claim_worker
+CLAIM_BATCH_SIZE = 4
+
+# Modal timeout for one JobProcessor call. claim_worker fits its jobs into
+# it, assuming each needs at least MIN_JOB_SECONDS (or the longest one seen).
+JOB_TIMEOUT = 600
+MIN_JOB_SECONDS = 60
+
+# Where trigger sends a job, smallest first: the first route whose cores,
+# memory and max_seconds cover the job's estimated cost (HANDLER_RESOURCES;
+# see lib/resources.py). "inline" runs in the trigger call itself,
+# "standard" is JobProcessor and "large" large_processor(), each with a
+# Modal timeout of their own. Only large jobs are marked in the row (the
+# route column); the rest count as standard, so standard workers also
+# sweep up inline jobs whose trigger call died mid-job.
+ROUTES = {
+    "inline": {"cpus": 1, "memory_mb": 1024, "max_seconds": 2},
+    "standard": {"cpus": 4, "memory_mb": 8192, "max_seconds": JOB_TIMEOUT // 2, "timeout": JOB_TIMEOUT},
+    "large": {"cpus": 16, "memory_mb": 65536, "max_seconds": 3000, "timeout": 3600},
+}
+
+
+def preload_modules() -> float:
+    """Import PRELOAD_MODULES; returns the seconds it took."""
+    import importlib
+    import time
+    
+    start = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    return time.perf_counter() - start
+
+
+def route_env(route: str) -> dict:
+    """Environment for a route's containers: the cores it requests, for lib/resources.py."""
+    return {"ANALYSIS_CPUS": str(ROUTES[route]["cpus"])}
+
+
+@app.cls(
     image=image,
     secrets=[modal.Secret.from_name("supabase-secrets")],
-    timeout=600,
+    timeout=ROUTES["standard"]["timeout"],
+    cpu=float(ROUTES["standard"]["cpus"]),  # Rank sweep fans out across cores
+    memory=ROUTES["standard"]["memory_mb"],
+    env=route_env("standard"),
+    volumes={UPLOAD_CACHE_DIR: upload_cache_volume},
+    enable_memory_snapshot=MEMORY_SNAPSHOT,
 )
-def process_job(job_id: str) -> dict:
+class JobProcessor:
+    """
+    Job processing with startup work done once per container.
+    
+    Memory snapshots are on by default; deploy with
+    ANALYSIS_MEMORY_SNAPSHOT=0 to turn them off (see MEMORY_SNAPSHOT).
+    load() runs before the snapshot, so restored containers start with
+    numpy/pandas/scipy/pyarrow and the analysis modules already imported;
+    without snapshots it simply runs once per container. connect() runs
+    after every start or restore: the Supabase client owns sockets and an
+    event loop thread, which cannot be snapshotted, and the numeric thread
+    pools are sized to the cores this container was given.
+    """
+    
+    @modal.enter(snap=MEMORY_SNAPSHOT)
+    def load(self):
+        self.import_seconds = preload_modules()
+        print(f"Preloaded {len(PRELOAD_MODULES)} modules in {self.import_seconds:.2f}s")
+    
+    @modal.enter(snap=False)
+    def connect(self):
+        from modal_app.lib.resources import limit_threads
+        
+        self.supabase = get_supabase_client()
+        self.cpus = limit_threads()
+    
+    @modal.method()
+    def process_job(self, job_id: str) -> dict:
+        """
+        Claim and process a single analysis job.
+        
+        Returns without doing anything if the job is finished or another worker
+        holds its lease, so duplicate webhook deliveries cannot double-process.
+        """
+        return process_job_now(self.supabase, job_id)
+    
+    @modal.method()
+    def claim_worker(self, max_jobs: int = CLAIM_BATCH_SIZE, route: str = "standard") -> dict:
+        """
+        Drain the queue from one warm container.
+        
+        Repeatedly claims pending (or lease-expired) jobs of route (see
+        ROUTES) and processes them back-to-back, heartbeating the
+        leases of jobs still waiting in the batch. All jobs share the route's
+        Modal timeout, so each round claims only as many jobs (up to
+        max_jobs) as the remaining time covers at the longest job duration
+        seen so far; jobs that no longer fit are released back to the queue
+        rather than started and killed.
+        
+        Each job's stage metrics are written to its own row; the returned
+        summary lists every job's outcome and timings as well.
+        """
+        import time
+        from modal_app.lib.spans import Spans
+        
+        supabase = self.supabase
+        worker_id = new_worker_id()
+        deadline = time.monotonic() + ROUTES[route]["timeout"] - 30  # Leave room to write the last result
+        longest = MIN_JOB_SECONDS
+        processed = 0
+        outcomes = []
+        
+        while True:
+            n_jobs = min(max_jobs, int((deadline - time.monotonic()) // longest))
+            if n_jobs < 1:
+                break
+            claim = Spans()
+            with claim("claim") as claim_span:
+                jobs = claim_jobs(supabase, worker_id, max_jobs=n_jobs, routes=[route])
+            if not jobs:
+                break
+            claim_span["batch_jobs"] = len(jobs)  # One claim round trip, shared by the batch
+            
+            heartbeat = LeaseHeartbeat(supabase, worker_id, [job["id"] for job in jobs])
+            try:
+                for i, job in enumerate(jobs):
+                    if deadline - time.monotonic() < longest:
+                        unstarted = [j["id"] for j in jobs[i:]]
+                        print(f"Out of time budget, releasing {len(unstarted)} jobs")
+                        release_jobs(supabase, worker_id, unstarted)
+                        return {"status": "done", "worker_id": worker_id, "processed": processed, "jobs": outcomes}
+                    start = time.monotonic()
+                    outcomes.append(_process_claimed_job(supabase, job, worker_id, Spans(claim.records)))
+                    longest = max(longest, time.monotonic() - start)
+                    heartbeat.release(job["id"])
+                    processed += 1
+            finally:
+                heartbeat.close()
+        
+        return {"status": "done", "worker_id": worker_id, "processed": processed, "jobs": outcomes}
+
+
+def large_processor() -> JobProcessor:
+    """A JobProcessor with the "large" route's cores, memory and timeout."""
+    route = ROUTES["large"]
+    return JobProcessor.with_options(
+        cpu=float(route["cpus"]),
+        memory=route["memory_mb"],
+        timeout=route["timeout"],
+        env=route_env("large"),
+    )()
+
+
+def process_job_now(supabase: SupabaseClient, job_id: str) -> dict:
+    """Claim job_id and process it in this process (JobProcessor.process_job, inline jobs)."""
+    from modal_app.lib.spans import Spans
+    
+    worker_id = new_worker_id()
+    spans = Spans()
+    
+    try:
+        with spans("claim"):
+            claimed = claim_jobs(supabase, worker_id, job_id=job_id)
+    except Exception as e:
+        # Not ours to mark failed: the job stays claimable for the lease sweep
+        print(f"Could not claim job {job_id}: {type(e).__name__}: {e}")
+        return {"status": "error", "job_id": job_id, "error": f"Claim failed: {e}"}
+    
+    if not claimed:
+        return {"status": "skipped", "job_id": job_id, "message": "Job not found, already processed or claimed"}
+    
+    heartbeat = LeaseHeartbeat(supabase, worker_id, [job_id])
+    try:
+        return _process_claimed_job(supabase, claimed[0], worker_id, spans)
+    finally:
+        heartbeat.close()
+
+
+@app.function(image=image, secrets=[modal.Secret.from_name("supabase-secrets")], schedule=modal.Period(minutes=5))
+def sweep_expired_leases():
+    """Sweep up jobs whose lease expired (or whose trigger was lost), on the route each was sized for."""
+    JobProcessor().claim_worker.spawn()
+    
+    waiting = (
+        get_supabase_client().table("jobs").select("id")
+        .eq("route", "large").in_("status", ["pending", "running"]).limit(1).execute()
+    )
+    if waiting.data:
+        large_processor().claim_worker.spawn(route="large")
+
+
+def _process_claimed_job(supabase: SupabaseClient, job: dict, worker_id: str, spans=None) -> dict:
     """
-    Process an analysis job with progress updates.
+    Process a job this worker has claimed, with progress updates.
     
     All errors are caught and written to the job record so the client can display them.
+    
+    Every stage is timed as a span (wall time, CPU time, peak RSS; see
+    lib/spans.py) and the spans are written to the job's metrics column along
+    with its outcome, and returned. With "profile": true in column_config the
+    analysis stage also runs under the sampling profiler.
     """
-    import io
-    import pandas as pd
-    import traceback
+    import contextlib
+    from modal_app.lib.artifacts import store_artifacts
+    from modal_app.lib.memo import result_cache_key
+    from modal_app.lib.spans import SamplingProfiler, Spans
+    from modal_app.lib.uploads import spool
     
-    supabase = get_supabase_client()
+    job_id = job["id"]
+    progress = ProgressReporter(supabase, job_id)
+    spans = Spans() if spans is None else spans
+    token = spans.activate()
+    upload = None
     
     try:
-        # 1. Fetch job
-        update_progress(supabase, job_id, 5)
-        response = supabase.table("jobs").select("id, job_type, input_file_path, column_config, status").eq("id", job_id).single().execute()
-        job = response.data
+        progress(10)
         
-        if not job:
-            fail_job(supabase, job_id, f"Job {job_id} not found")
-            return {"status": "error", "message": f"Job {job_id} not found"}
+        file_path = job["input_file_path"]
+        column_config = job.get("column_config")
+        # Validated before the download: a bad analyses list fails the job straight away
+        job_types = analysis_types(job["job_type"], column_config)
+        handler_version = handler_version_for(job["job_type"], job_types)
         
-        if job["status"] not in ("pending", "running"):
-            return {"status": job["status"], "message": "Job already processed"}
+        def finish_from_cache(result_key: str):
+            """Reuse an identical earlier result, if any. Returns the job's outcome on a hit."""
+            with spans("cache_lookup"):
+                cached = find_cached_result(supabase, result_key, job_id)
+            if not cached:
+                return None
+            print(f"Result cache hit for job {job_id}: reusing job {cached['id']}")
+            progress.close()
+            metrics = spans.as_dict()
+            if not complete_job(supabase, job_id, worker_id, {
+                "result": {**cached["result"], "cached_from_job": cached["id"]},
+                "result_key": result_key,
+                "result_cache_hit": True,
+                "metrics": metrics,
+            }):
+                return {"status": "lost_lease", "job_id": job_id}
+            if file_path:
+                cleanup_upload(supabase, job_id, file_path)
+            return {"status": "done", "job_id": job_id, "cached": True, "metrics": metrics}
         
-        # 2. Update status to running
-        supabase.table("jobs").update({"status": "running", "progress": 10}).eq("id", job_id).execute()
+        # 1. Result cache: hash recorded at upload time means no download on a hit
+        result_key = None
+        if job.get("input_hash"):
+            result_key = result_cache_key(job["input_hash"], job["job_type"], column_config, handler_version)
+            if outcome := finish_from_cache(result_key):
+                return outcome
         
-        # 3. Download CSV
-        update_progress(supabase, job_id, 20)
-        file_path = job["input_file_path"]
+        # 2. Download the upload (CSV, gzip/zstd CSV or Parquet)
+        progress(20)
         
         if not file_path:
-            fail_job(supabase, job_id, "No input file path")
+            progress.close()
+            fail_job(supabase, job_id, "No input file path", worker_id=worker_id, metrics=spans.as_dict())
             return {"status": "error", "message": "No input file path"}
         
-        file_bytes = supabase.storage.from_("analysis-uploads").download(file_path)
+        # Streamed to local disk (gzip/zstd CSV decoded on the way), never held in memory
+        with spans("download") as download:
+            upload = spool(supabase.iter_download("analysis-uploads", file_path))
+        download.update(
+            bytes=upload.downloaded_bytes,
+            format=upload.format,
+            compression=upload.compression,
+            spooled_bytes=upload.size,
+        )
         
-        update_progress(supabase, job_id, 30)
-        df = pd.read_csv(io.BytesIO(file_bytes))
+        # The result is stored under the hash of the bytes actually downloaded:
+        # input_hash comes from the client and only serves the lookup above.
+        # Older uploads carry no hash at all.
+        upload_key = result_cache_key(upload.sha256, job["job_type"], column_config, handler_version)
+        if upload_key != result_key:
+            if result_key is not None:
+                print(f"input_hash of job {job_id} does not match its upload; keying its result on the upload")
+            result_key = upload_key
+            if outcome := finish_from_cache(result_key):
+                return outcome
         
-        # 4. Transform data based on column config
-        column_config = job.get("column_config")
-        if column_config:
-            df = transform_data(df, column_config)
-        
-        # 5. Run analysis
-        update_progress(supabase, job_id, 40)
-        result = run_analysis(
-            job["job_type"], 
-            df, 
-            on_progress=lambda p: update_progress(supabase, job_id, 40 + int(p * 50))
-        )
+        # 3. Parse + transform: only configured columns, via the upload cache
+        # (row-oriented analyses read just the columns they name instead)
+        progress(30)
+        with spans("parse"):
+            inputs = _read_inputs(upload, job_types, column_config)
+        
+        # 4. Run analysis (optionally profiled)
+        progress(40)
+        profiler = SamplingProfiler() if (column_config or {}).get("profile") else None
+        with spans("analysis"), profiler or contextlib.nullcontext():
+            if job["job_type"] == MULTI_ANALYSIS:
+                result = run_analyses(
+                    inputs,
+                    on_progress=lambda p: progress(40 + int(p * 50)),
+                    column_config=column_config,
+                    spans=spans,
+                    profiler=profiler,
+                )
+            else:
+                result = run_analysis(
+                    job["job_type"], 
+                    inputs[job["job_type"]], 
+                    on_progress=lambda p: progress(40 + int(p * 50)),
+                    column_config=column_config,
+                )
+        if profiler is not None:
+            spans.profile = profiler.summary()
+        
+        # Large arrays go to the results bucket; the row keeps pointers to them
+        with spans("artifacts"):
+            result = store_artifacts(supabase.storage, job_id, result)
         
-        # 5. Write results
-        update_progress(supabase, job_id, 95)
-        supabase.table("jobs").update({
-            "status": "done",
+        # 5. Write results (after the last progress write has landed).
+        # Only if we still hold the job: a reclaimed job belongs to its new worker.
+        progress(95)
+        progress.close()
+        metrics = spans.as_dict()
+        if not complete_job(supabase, job_id, worker_id, {
             "result": result,
-            "progress": 100,
-        }).eq("id", job_id).execute()
+            "result_key": result_key,
+            "result_cache_hit": False,
+            "metrics": metrics,
+        }):
+            return {"status": "lost_lease", "job_id": job_id, "metrics": metrics}
         
         # 6. Cleanup
-        supabase.storage.from_("analysis-uploads").remove([file_path])
-        supabase.table("jobs").update({"input_file_path": None}).eq("id", job_id).execute()
+        cleanup_upload(supabase, job_id, file_path)
         
-        return {"status": "done", "job_id": job_id}
+        return {"status": "done", "job_id": job_id, "metrics": metrics}
         
     except Exception as e:
-        # Capture full traceback for debugging
-        error_msg = f"{type(e).__name__}: {str(e)}"
-        print(f"Job {job_id} failed: {error_msg}")
-        print(traceback.format_exc())
-        
-        # Try to write error to job so client can display it
-        # This may also fail if Supabase is unreachable
-        try:
-            fail_job(supabase, job_id, error_msg)
-        except Exception as db_error:
-            # Double failure: can't reach Supabase at all
-            # Log it clearly so we can debug from Modal logs
-            print(f"CRITICAL: Failed to write error to database for job {job_id}")
-            print(f"Database error: {type(db_error).__name__}: {db_error}")
-            print("The job will appear stuck in the UI. Check Modal secrets configuration.")
-            # Re-raise original error so Modal logs show it
-            raise e
-        
-        return {"status": "error", "job_id": job_id, "error": error_msg}
+        progress.close()
+        return _record_failure(supabase, job_id, e, worker_id=worker_id, metrics=spans.as_dict())
+    finally:
+        if upload is not None:
+            upload.close()
+        spans.deactivate(token)
+
+
+def _read_inputs(upload, job_types: list, column_config: dict) -> dict:
+    """
+    Parse the upload for each job type: job_type -> input for run_analysis.
+    
+    Analyses needing the same kind of input share one parse: matrix analyses
+    one read_upload, row-oriented ones one table with the union of their
+    columns (streamed only when it is a single streaming analysis), of
+    which each analysis gets just the columns it names.
+    """
+    from modal_app.lib.ingest import read_upload_table
+    
+    if not column_config:
+        return dict.fromkeys(job_types, read_upload_table(upload))
+    
+    inputs = {}
+    tables = [t for t in job_types if t in TABLE_COLUMNS]
+    if tables:
+        wanted = [TABLE_COLUMNS[t](column_config) for t in tables]
+        columns = None if None in wanted else list(dict.fromkeys(c for cols in wanted for c in cols))
+        streamed = len(tables) == 1 and tables[0] in STREAMED_TABLES
+        table = read_upload_table(upload, columns, streamed=streamed)
+        for job_type, own in zip(tables, wanted):
+            # Each handler sees only its own columns, as in a job of its own
+            # (defaults such as survival's covariates depend on what is there)
+            keep = [c for c in table.columns if own is None or c in own]
+            inputs[job_type] = table if keep == list(table.columns) else table[keep]
+    matrix = [t for t in job_types if t not in TABLE_COLUMNS]
+    if matrix:
+        inputs.update(dict.fromkeys(matrix, _read_upload_cached(upload, column_config)))
+    return inputs
+
+
+def _read_upload_cached(upload, column_config: dict):
+    """
+    read_upload through the Volume-backed upload cache.
+    
+    The cache only saves parse time, so Volume or cache-directory failures
+    fall back to parsing without it instead of failing the job.
+    """
+    from modal_app.lib.cache import UploadCache
+    from modal_app.lib.ingest import read_upload
+    
+    if upload.format == "parquet":
+        # Already columnar: nothing for the Arrow cache to save
+        return read_upload(upload, column_config)
+    
+    try:
+        upload_cache_volume.reload()  # See entries committed by other containers
+        cache = UploadCache(UPLOAD_CACHE_DIR)
+    except Exception as e:
+        print(f"Upload cache unavailable, parsing without it: {type(e).__name__}: {e}")
+        return read_upload(upload, column_config)
+    
+    try:
+        df = read_upload(upload, column_config, cache=cache)
+    except OSError as e:
+        # e.g. the Volume is full or went away mid-write
+        print(f"Upload cache failed, parsing without it: {type(e).__name__}: {e}")
+        return read_upload(upload, column_config)
+    
+    try:
+        upload_cache_volume.commit()
+    except Exception as e:
+        print(f"Upload cache commit failed (entry stays local to this container): {type(e).__name__}: {e}")
+    return df
+
+
+def _record_failure(supabase: SupabaseClient, job_id: str, e: Exception, worker_id: str = None, metrics: dict = None) -> dict:
+    """Log a job failure and write it to the job record (if worker_id still holds it) for the client."""
+    import traceback
+    
+    # Capture full traceback for debugging
+    error_msg = f"{type(e).__name__}: {str(e)}"
+    print(f"Job {job_id} failed: {error_msg}")
+    print(traceback.format_exc())
+    
+    # Try to write error to job so client can display it
+    # This may also fail if Supabase is unreachable
+    try:
+        fail_job(supabase, job_id, error_msg, worker_id=worker_id, metrics=metrics)
+    except Exception as db_error:
+        # Double failure: can't reach Supabase at all
+        # Log it clearly so we can debug from Modal logs
+        print(f"CRITICAL: Failed to write error to database for job {job_id}")
+        print(f"Database error: {type(db_error).__name__}: {db_error}")
+        print("The job will appear stuck in the UI. Check Modal secrets configuration.")
+        # Re-raise original error so Modal logs show it
+        raise e
+    
+    return {"status": "error", "job_id": job_id, "error": error_msg, "metrics": metrics}
 
 
 # =============================================================================
@@ -220,9 +853,12 @@ def transform_data(df, column_config: dict):
     
     Supports two formats:
     - Wide: Each column is a feature (customer × features matrix)
-    - Long: Stacked rows with feature_name and feature_value columns
+    - Long: Stacked rows with feature_name and feature_value columns,
+      returned as SparseCounts
+    
+    process_job uses lib/ingest.py, which applies the same rules while parsing.
     """
-    import pandas as pd
+    from modal_app.lib.ingest import pivot_sparse
     
     format_type = column_config.get("format", "wide")
     customer_id_col = column_config.get("customerIdColumn")
@@ -243,10 +879,8 @@ def transform_data(df, column_config: dict):
         if missing:
             raise ValueError(f"Feature columns not found: {missing}")
         
-        # Select and return the subset
-        result = df[[customer_id_col] + feature_cols].copy()
-        result = result.set_index(customer_id_col)
-        return result
+        # Select and return the subset (set_index already returns a new frame)
+        return df[[customer_id_col] + feature_cols].set_index(customer_id_col)
         
     elif format_type == "long":
         # Long format: pivot to wide
@@ -258,16 +892,8 @@ def transform_data(df, column_config: dict):
         if not feature_value_col or feature_value_col not in df.columns:
             raise ValueError(f"Feature value column '{feature_value_col}' not found")
         
-        # Pivot from long to wide format
-        result = df.pivot_table(
-            index=customer_id_col,
-            columns=feature_name_col,
-            values=feature_value_col,
-            aggfunc="sum",  # Sum if duplicates
-            fill_value=0
-        )
-        
-        return result
+        # Pivot from long to wide as sparse CSR (duplicates are summed)
+        return pivot_sparse(df, customer_id_col, feature_name_col, feature_value_col)
     
     else:
         raise ValueError(f"Unknown format type: {format_type}")
@@ -277,142 +903,970 @@ def transform_data(df, column_config: dict):
 # Analysis Runners
 # =============================================================================
 
-def run_analysis(job_type: str, df, on_progress=None) -> dict:
+# Bump a handler's version whenever its output changes, so memoized results
+# from the old code are not reused (see lib/memo.py)
+HANDLER_VERSIONS = {
+    "poisson_factorization": "kl-5",
+    "poisson_scoring": "fold-in-2",
+    "survival_analysis": "km-cox-2",
+    "nrr_decomposition": "nrr-1",
+    "propensity_model": "sgd-logistic-2",
+}
+
+
+def run_analysis(job_type: str, df, on_progress=None, column_config: dict = None) -> dict:
     """Dispatch to analysis handler based on job_type."""
     import pandas as pd
     
-    base = {
-        "processed_at": pd.Timestamp.now().isoformat(),
-        "input_rows": len(df),
-        "input_columns": list(df.columns),
-    }
-    
     if on_progress:
         on_progress(0.1)
     
-    handlers = {
-        "poisson_factorization": _run_poisson,
-        "survival_analysis": _run_survival,
-        "nrr_decomposition": _run_nrr,
-        "propensity_model": _run_propensity,
-    }
-    
-    handler = handlers.get(job_type)
+    handler = HANDLERS.get(job_type)
     if handler:
-        result = handler(df)
+        result = handler(df, column_config or {})
     else:
         result = {"type": "unknown", "error": f"Unknown job type: {job_type}"}
     
     if on_progress:
         on_progress(1.0)
     
+    # After the handler: a streamed table (TableChunks) knows its length once read
+    base = {
+        "processed_at": pd.Timestamp.now().isoformat(),
+        "input_rows": len(df),
+        "input_columns": list(df.columns),
+    }
     return {**base, **result}
 
 
-def _run_poisson(df) -> dict:
+# Job type that runs several analyses on one upload: column_config "analyses"
+# lists their job types (see run_analyses)
+MULTI_ANALYSIS = "multi_analysis"
+
+
+def analysis_types(job_type: str, column_config: dict) -> list:
+    """Job types a job runs: its own, or for MULTI_ANALYSIS the validated analyses list."""
+    if job_type != MULTI_ANALYSIS:
+        return [job_type]
+    analyses = (column_config or {}).get("analyses")
+    if not isinstance(analyses, list) or not analyses:
+        raise ValueError(f"{MULTI_ANALYSIS} needs column_config.analyses, a list of job types")
+    unknown = [t for t in analyses if t not in HANDLERS]
+    if unknown:
+        raise ValueError(f"Unknown analyses: {unknown} (expected any of {list(HANDLERS)})")
+    return list(dict.fromkeys(analyses))
+
+
+def handler_version_for(job_type: str, job_types: list) -> str:
+    """HANDLER_VERSIONS entry for a job; a multi-analysis job combines its analyses' versions."""
+    if job_type != MULTI_ANALYSIS:
+        return HANDLER_VERSIONS.get(job_type, "unknown")
+    return ",".join(f"{t}={HANDLER_VERSIONS.get(t, 'unknown')}" for t in sorted(job_types))
+
+
+def run_analyses(inputs: dict, on_progress=None, column_config: dict = None, spans=None, profiler=None) -> dict:
+    """
+    Run several analyses concurrently, each on its parsed input (job_type -> input).
+    
+    Handlers run in threads over the shared inputs, which they only read:
+    NumPy releases the GIL in the heavy loops, and a thread needs no copy of
+    the matrix (a process pool would pickle it per handler). Each thread
+    runs in a copy of the caller's context with its own span collector,
+    adopted into spans under analysis.<job_type>; timings has each handler's
+    wall time and peak RSS. A handler that raises is
+    recorded as an error entry; if all of them raise, the first error is
+    re-raised and the job fails.
+    """
+    import concurrent.futures
+    import contextvars
+    import threading
+    import time
+    from modal_app.lib.spans import Spans
+    
+    finished = []
+    lock = threading.Lock()
+    
+    def run(job_type: str):
+        collector = Spans()
+        token = collector.activate()
+        if profiler is not None:
+            profiler.track()
+        try:
+            with collector(job_type):
+                return run_analysis(job_type, inputs[job_type], column_config=column_config), collector, None
+        except Exception as e:
+            print(f"Analysis {job_type} failed: {type(e).__name__}: {e}")
+            return {"type": job_type, "error": f"{type(e).__name__}: {e}"}, collector, e
+        finally:
+            collector.deactivate(token)
+            with lock:
+                finished.append(job_type)
+                if on_progress:
+                    on_progress(len(finished) / len(inputs))
+    
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(inputs)) as pool:
+        futures = {t: pool.submit(contextvars.copy_context().run, run, t) for t in inputs}
+        outcomes = {t: future.result() for t, future in futures.items()}
+    wall = time.perf_counter() - start
+    
+    errors = [e for _, _, e in outcomes.values() if e is not None]
+    if len(errors) == len(outcomes):
+        raise errors[0]
+    
+    timings = {}
+    for job_type, (_, collector, _) in outcomes.items():
+        if spans is not None:
+            spans.adopt(collector, "analysis")
+        record = collector.records[0]
+        timings[job_type] = {"seconds": record["seconds"], "peak_rss_mb": record["peak_rss_mb"]}
+    
+    return {
+        "type": MULTI_ANALYSIS,
+        "analyses": {job_type: result for job_type, (result, _, _) in outcomes.items()},
+        "timings": timings,
+        "wall_seconds": round(wall, 4),
+        # Roughly what running them one after another would have taken
+        "sequential_seconds": round(sum(t["seconds"] for t in timings.values()), 4),
+    }
+
+
+# Default upper bound on the number of factors tried (column_config maxFactors)
+POISSON_MAX_FACTORS = 50
+
+
+def _run_poisson(df, column_config: dict) -> dict:
     """
-    Poisson factorization using NMF with automatic factor selection.
+    Poisson factorization (KL-divergence NMF) with automatic factor selection.
     
-    Uses the elbow method: fit models with k=1..max_k factors, find where
-    the marginal improvement in reconstruction error drops below threshold.
+    Uses the elbow method: fit models with k=1, 2, ... factors and stop once
+    the marginal gain in Poisson log-likelihood has dropped below threshold
+    (jobs/poisson.py elbow_rank), so only a few ranks past the elbow are
+    fitted however high max_k is. max_k is column_config maxFactors (default
+    POISSON_MAX_FACTORS), capped by the number of features and half the
+    customers. The sweep runs across the container's cores, as many as the
+    memory budget (lib/budget.py) has room for.
+    
+    Inputs parsed to disk (DiskCounts), or whose fit would not fit the
+    memory budget, are factorized out of core: the sweep runs on a row
+    sample of about RANK_SAMPLE_CELLS cells, then the chosen k's loadings
+    are refined with mini-batch updates over every row block (refine_h)
+    and the customer scores are solved block by block (fold_in).
     """
-    from sklearn.decomposition import NMF
     import numpy as np
+    import pandas as pd
+    from modal_app.jobs.poisson import (
+        OUT_OF_CORE_EPOCHS, RANK_SAMPLE_CELLS, as_count_matrix, block_rows, elbow_rank,
+        fit_memory_bytes, fit_rank_sweep, fold_in, matrix_bytes, refine_h, sample_rows, solve_w,
+    )
+    from modal_app.lib.artifacts import Artifact
+    from modal_app.lib.budget import headroom, require
+    from modal_app.lib.ingest import DiskCounts, SparseCounts, dense_counts, numeric_columns
+    from modal_app.lib.resources import allocated_cpus
+    from modal_app.lib.spans import span
     
-    numeric_df = df.select_dtypes(include=["number"]).fillna(0).clip(lower=0)
+    if isinstance(df, SparseCounts):
+        # Long-format uploads stay sparse all the way into the factorization
+        X, features = as_count_matrix(df.X.maximum(0)), list(df.columns)
+    elif isinstance(df, DiskCounts):
+        # Memory-mapped and already cleaned; read in row blocks below
+        X, features = df.X, list(df.columns)
+    else:
+        # The parsed float32 block itself, cleaned in place
+        features = numeric_columns(df)
+        X = as_count_matrix(dense_counts(df))
     
-    if numeric_df.empty or numeric_df.shape[1] < 2:
+    if X.shape[0] == 0 or X.shape[1] < 2:
         return {"type": "poisson_factorization", "error": "Need at least 2 numeric columns"}
     
-    X = numeric_df.values
-    max_k = min(10, numeric_df.shape[1], numeric_df.shape[0] // 2)  # Reasonable upper bound
+    max_factors = column_config.get("maxFactors") or POISSON_MAX_FACTORS
+    if not isinstance(max_factors, int) or max_factors < 2:
+        return {"type": "poisson_factorization", "error": f"maxFactors must be an integer >= 2, got {max_factors!r}"}
+    max_k = min(max_factors, X.shape[1], X.shape[0] // 2)  # Reasonable upper bound
     max_k = max(2, max_k)  # At least try 2 factors
     
-    # Fit models for k=1..max_k and track reconstruction errors
-    errors = []
-    models = []
-    for k in range(1, max_k + 1):
-        model = NMF(n_components=k, max_iter=300, random_state=42, init='nndsvda')
-        model.fit(X)
-        errors.append(model.reconstruction_err_)
-        models.append(model)
-    
-    # Find optimal k using elbow method
-    # Look for where marginal improvement drops below 10% of first improvement
-    optimal_k = 1
-    if len(errors) >= 2:
-        improvements = [errors[i-1] - errors[i] for i in range(1, len(errors))]
-        if improvements:
-            threshold = improvements[0] * 0.1  # 10% of first improvement
-            for i, imp in enumerate(improvements):
-                if imp < threshold:
-                    optimal_k = i + 1  # k is 1-indexed
-                    break
-                optimal_k = i + 2  # Last k that had significant improvement
+    room = headroom()
+    out_of_core = isinstance(df, DiskCounts) or (room is not None and fit_memory_bytes(X) > room)
+    X_sweep = X
+    if out_of_core:
+        with span("rank_sample") as sample:
+            X_sweep = sample_rows(X, block_rows(X, RANK_SAMPLE_CELLS))
+        sample["rows"] = X_sweep.shape[0]
+        max_k = max(2, min(max_k, X_sweep.shape[0] // 2))
+    
+    # Each sweep worker holds its own fit temporaries, next to one shared copy of X
+    per_fit = fit_memory_bytes(X_sweep)
+    require(per_fit, f"Factorizing a {X_sweep.shape[0]:,} x {X_sweep.shape[1]:,} matrix")
+    n_jobs = allocated_cpus()
+    if (room := headroom()) is not None:
+        n_jobs = max(1, min(n_jobs, (room - matrix_bytes(X_sweep)) // per_fit))
+    
+    def elbow_confirmed(fits):
+        return elbow_rank([f["log_likelihood"] for f in fits])[1]
+    
+    # Fit k=1, 2, ... in parallel, warm-starting each k from k-1, until the elbow is confirmed
+    with span("rank_sweep") as sweep:
+        fits = fit_rank_sweep(X_sweep, max_k, n_jobs=n_jobs, stop=elbow_confirmed)
+    sweep["ranks_fitted"] = len(fits)
+    errors = [f["error"] for f in fits]
+    log_likelihoods = [f["log_likelihood"] for f in fits]
+    
+    # Elbow: last k before the marginal likelihood gain drops below 10% of the first gain
+    optimal_k, _ = elbow_rank(log_likelihoods)
     
     # Clamp to reasonable range
-    optimal_k = max(2, min(optimal_k, max_k))
+    optimal_k = max(2, min(optimal_k, len(fits)))
     
-    # Use the model with optimal k
-    best_model = models[optimal_k - 1]
-    W = best_model.fit_transform(X)  # Customer factor scores
+    # The sweep keeps only H per k; solve the customer scores for the winner
+    if out_of_core:
+        # Blocks shrink to what the budget has room for, next to the float32 scores
+        rows, scores_bytes = block_rows(X), X.shape[0] * optimal_k * 4
+        if (room := headroom()) is not None and room > scores_bytes:
+            rows = max(1, min(rows, int(rows * (room - scores_bytes) / fit_memory_bytes(X[:rows]))))
+        require(fit_memory_bytes(X[:rows]) + scores_bytes, f"Factorizing {X.shape[0]:,} customers in blocks")
+        with span("refine_h"):
+            H = refine_h(X, fits[optimal_k - 1]["H"], rows=rows)
+        with span("fold_in"):
+            best = fold_in(X, H, rows=rows)
+    else:
+        with span("solve_w"):
+            best = solve_w(X, fits[optimal_k - 1]["H"])
+    W = best["W"]  # Customer factor scores
     
     return {
         "type": "poisson_factorization",
         "n_factors": optimal_k,
-        "reconstruction_error": float(best_model.reconstruction_err_),
-        "factor_weights": best_model.components_.tolist(),
-        "factors_tested": list(range(1, max_k + 1)),
+        "reconstruction_error": best["error"],
+        "factor_weights": best["H"].tolist(),
+        "feature_names": features,  # Columns of factor_weights, for fold-in scoring
+        "factors_tested": list(range(1, len(fits) + 1)),
+        "max_factors": max_k,
         "errors_by_k": [float(e) for e in errors],
+        "log_likelihood": best["log_likelihood"],
+        "log_likelihood_by_k": [float(ll) for ll in log_likelihoods],
         "customer_scores_sample": W[:min(10, len(W))].tolist(),  # First 10 customers
+        # Out of core, the by-k fields above come from the sweep's row sample
+        "out_of_core": {
+            "rank_sample_rows": X_sweep.shape[0],
+            "block_rows": rows,
+            "epochs": OUT_OF_CORE_EPOCHS,
+        } if out_of_core else None,
+        "artifacts": {
+            "customer_scores": Artifact(
+                pd.DataFrame(
+                    W.astype(np.float32, copy=False),
+                    index=df.index,
+                    columns=[f"factor_{i + 1}" for i in range(optimal_k)],
+                ),
+                "Factor scores (W) for every customer",
+            ),
+        },
     }
 
 
-def _run_survival(df) -> dict:
-    """Survival analysis placeholder."""
+def _run_poisson_scoring(df, column_config: dict) -> dict:
+    """
+    Score new customers against the factors of an earlier Poisson factorization.
+    
+    column_config names referenceJobId, a finished poisson_factorization
+    job, plus the usual customer and feature columns (wide or long). The
+    reference's loadings H (factor_weights) are held fixed and only the
+    customer scores W are solved (fold-in; see jobs/poisson.py fold_in), so
+    scoring costs a fraction of a refit. Features are matched to the
+    reference by name: reference features missing from the upload are left
+    out of the fit rather than read as zero counts, and features the
+    reference did not have are ignored.
+    """
+    import numpy as np
+    import pandas as pd
+    from modal_app.jobs.poisson import as_count_matrix, block_rows, fit_memory_bytes, fold_in
+    from modal_app.lib.artifacts import Artifact
+    from modal_app.lib.budget import require
+    from modal_app.lib.ingest import DiskCounts, SparseCounts, dense_counts, numeric_columns
+    from modal_app.lib.spans import span
+    
+    reference_id = column_config.get("referenceJobId")
+    if not reference_id:
+        return {"type": "poisson_scoring", "error": "referenceJobId is required"}
+    
+    with span("load_reference"):
+        response = _retry_supabase_call(
+            lambda: get_supabase_client().table("jobs")
+            .select("job_type, status, result")
+            .eq("id", reference_id)
+            .limit(1)
+            .execute()
+        )
+    reference = response.data[0] if response.data else None
+    factors = (reference or {}).get("result") or {}
+    if not reference or reference["status"] != "done" or "factor_weights" not in factors:
+        return {"type": "poisson_scoring", "error": f"Reference job {reference_id} is not a finished Poisson factorization"}
+    
+    H = np.asarray(factors["factor_weights"], dtype=np.float64)
+    # Results from before feature_names was recorded: input_columns, when those were exactly the features
+    reference_features = factors.get("feature_names") or factors.get("input_columns") or []
+    if len(reference_features) != H.shape[1]:
+        return {"type": "poisson_scoring", "error": f"Reference job {reference_id} does not record the features of its factors"}
+    
+    if isinstance(df, SparseCounts):
+        X, features = df.X.maximum(0), list(df.columns)
+    elif isinstance(df, DiskCounts):
+        X, features = df.X, list(df.columns)
+    else:
+        features = numeric_columns(df)
+        X = dense_counts(df)
+    
+    # Upload column of every reference feature (-1 where the upload lacks it)
+    position = pd.Index(features).get_indexer(reference_features)
+    shared = position >= 0
+    if not shared.any():
+        return {"type": "poisson_scoring", "error": f"No features in common with reference job {reference_id}"}
+    columns = None
+    if not np.array_equal(position, np.arange(len(features))):
+        columns, H = position[shared], H[:, shared]
+    # A file-backed X is narrowed one block at a time inside fold_in
+    if not isinstance(df, DiskCounts):
+        X = as_count_matrix(X if columns is None else X[:, columns])
+        columns = None
+    
+    rows = block_rows(X)
+    require(fit_memory_bytes(X[:rows]), f"Scoring {X.shape[0]:,} customers")
+    with span("fold_in"):
+        scored = fold_in(X, H, rows=rows, columns=columns)
+    W = scored["W"]
+    
+    known = set(reference_features)
     return {
+        "type": "poisson_scoring",
+        "reference_job_id": reference_id,
+        "n_factors": H.shape[0],
+        "n_customers": X.shape[0],
+        "features_used": int(shared.sum()),
+        "features_missing": [f for f, present in zip(reference_features, shared) if not present],
+        "features_ignored": [f for f in features if f not in known],
+        "reconstruction_error": scored["error"],
+        "log_likelihood": scored["log_likelihood"],
+        "customer_scores_sample": W[:min(10, len(W))].tolist(),  # First 10 customers
+        "artifacts": {
+            "customer_scores": Artifact(
+                pd.DataFrame(
+                    W.astype(np.float32),
+                    index=df.index,
+                    columns=[f"factor_{i + 1}" for i in range(H.shape[0])],
+                ),
+                f"Factor scores (W) for every customer, against the factors of job {reference_id}",
+            ),
+        },
+    }
+
+
+# Points kept per survival curve in the result
+SURVIVAL_CURVE_POINTS = 200
+
+# Segments (largest first) that get their own survival curve
+SURVIVAL_MAX_SEGMENTS = 20
+
+
+def _survival_columns(column_config: dict):
+    """Columns _run_survival reads; None (every column) when covariates are left to it."""
+    covariates = column_config.get("covariateColumns") or column_config.get("featureColumns")
+    if not covariates:
+        return None
+    named = [column_config.get(k) for k in ("durationColumn", "eventColumn", "segmentColumn")]
+    return [c for c in named if c] + list(covariates)
+
+
+def _run_survival(df, column_config: dict) -> dict:
+    """
+    Time-to-churn: Kaplan-Meier curves and a Cox proportional hazards fit.
+    
+    column_config names durationColumn and eventColumn (non-zero = churned,
+    zero = still active), optionally segmentColumn (one curve per value) and
+    covariateColumns (default: every other numeric column). Rows with a
+    missing or negative duration, or a missing event or covariate, are
+    dropped. See jobs/survival.py for the vectorized estimators.
+    """
+    import numpy as np
+    import pandas as pd
+    from modal_app.jobs.survival import fit_cox, kaplan_meier, thin_curve
+    from modal_app.lib.artifacts import Artifact
+    from modal_app.lib.spans import span
+    from scipy.special import chdtrc, ndtr
+    
+    duration_col = column_config.get("durationColumn")
+    event_col = column_config.get("eventColumn")
+    segment_col = column_config.get("segmentColumn")
+    for key, col in (("durationColumn", duration_col), ("eventColumn", event_col), ("segmentColumn", segment_col)):
+        if (col or key != "segmentColumn") and col not in df.columns:
+            return {"type": "survival_analysis", "error": f"{key} '{col}' not found in data"}
+    
+    used = {duration_col, event_col, segment_col, column_config.get("customerIdColumn")}
+    covariates = column_config.get("covariateColumns") or [
+        c for c in df.select_dtypes(include=["number"]).columns if c not in used
+    ]
+    
+    durations = pd.to_numeric(df[duration_col], errors="coerce").to_numpy(dtype=np.float64)
+    events = pd.to_numeric(df[event_col], errors="coerce").to_numpy(dtype=np.float64)
+    X = np.empty((len(df), len(covariates)), dtype=np.float64)
+    for j, col in enumerate(covariates):
+        X[:, j] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+    
+    keep = np.isfinite(durations) & (durations >= 0) & ~np.isnan(events) & np.isfinite(X).all(axis=1)
+    durations, events, X = durations[keep], events[keep] != 0, X[keep]
+    if not events.any():
+        return {"type": "survival_analysis", "error": "No events (churns) in the data"}
+    
+    with span("kaplan_meier"):
+        overall = kaplan_meier(durations, events)[0]
+    result = {
         "type": "survival_analysis",
-        "message": "Implement with lifelines CoxPHFitter",
-        "columns_found": list(df.columns),
+        "duration_column": duration_col,
+        "event_column": event_col,
+        "n_subjects": int(len(durations)),
+        "n_events": int(events.sum()),
+        "rows_dropped": int((~keep).sum()),
+        "median_survival": overall["median"],
+        "survival_curve": thin_curve(overall, SURVIVAL_CURVE_POINTS),
+    }
+    full_curves = [("all", overall)]
+    
+    if segment_col:
+        codes, labels = pd.factorize(df[segment_col][keep], use_na_sentinel=False)
+        with span("kaplan_meier_segments"):
+            curves = sorted(kaplan_meier(durations, events, codes), key=lambda c: -c["n"])
+        full_curves += [(str(labels[c["segment"]]), c) for c in curves]
+        result["segment_column"] = segment_col
+        result["segment_curves"] = [
+            {
+                "segment": str(labels[c["segment"]]),
+                "n_subjects": c["n"],
+                "n_events": c["events"],
+                "median_survival": c["median"],
+                "curve": thin_curve(c, SURVIVAL_CURVE_POINTS),
+            }
+            for c in curves[:SURVIVAL_MAX_SEGMENTS]
+        ]
+        result["segments_omitted"] = max(0, len(curves) - SURVIVAL_MAX_SEGMENTS)
+    
+    # Every step of every curve, including segments left out above
+    fields = ("time", "at_risk", "deaths", "survival", "lower", "upper")
+    result["artifacts"] = {
+        "survival_curves": Artifact(
+            pd.DataFrame({
+                "segment": np.repeat([name for name, _ in full_curves], [len(c["time"]) for _, c in full_curves]),
+                **{f: np.concatenate([c[f] for _, c in full_curves]) for f in fields},
+            }),
+            "Kaplan-Meier curves at full resolution; segment 'all' is the overall curve",
+        ),
     }
+    
+    # Constant covariates carry no information and make the Hessian singular
+    varying = X.std(axis=0) > 0 if len(X) else np.zeros(len(covariates), dtype=bool)
+    result["covariates_dropped"] = [c for c, v in zip(covariates, varying) if not v]
+    covariates = [c for c, v in zip(covariates, varying) if v]
+    if covariates:
+        with span("cox") as cox_span:
+            cox = fit_cox(durations, events, X[:, varying])
+        cox_span["iterations"] = cox["iterations"]
+        lr_stat = 2 * (cox["log_likelihood"] - cox["log_likelihood_null"])
+        
+        def finite(values):
+            # JSONB has no NaN/inf (e.g. a standard error of a collinear covariate)
+            return [float(v) if np.isfinite(v) else None for v in values]
+        
+        result["cox"] = {
+            "covariates": covariates,
+            "coefficients": finite(cox["coef"]),
+            "hazard_ratios": finite(np.exp(cox["coef"])),
+            "standard_errors": finite(cox["se"]),
+            "p_values": finite(2 * ndtr(-np.abs(cox["z"]))),
+            "log_likelihood": cox["log_likelihood"],
+            "log_likelihood_null": cox["log_likelihood_null"],
+            "likelihood_ratio_p_value": float(chdtrc(len(covariates), max(lr_stat, 0.0))),
+            "iterations": cox["iterations"],
+            "converged": cox["converged"],
+        }
+    
+    return result
+
+
+# Rows per chunk read from the upload, and per block of whole customers in
+# the NRR decomposition
+NRR_CHUNK_ROWS = 1_000_000
+NRR_BLOCK_ROWS = 2_000_000
 
+# On-disk parts the NRR rows are split into by customer (jobs/nrr.py CustomerParts)
+NRR_PARTS = 16
 
-def _run_nrr(df) -> dict:
-    """NRR decomposition placeholder."""
+# Longest span of periods the NRR cohort × period grid is built for
+NRR_MAX_PERIODS = 600
+
+
+def _nrr_columns(column_config: dict) -> list:
+    """Columns _run_nrr reads."""
+    keys = ("customerIdColumn", "periodColumn", "revenueColumn")
+    return [column_config[k] for k in keys if column_config.get(k)] or None
+
+
+def _run_nrr(df, column_config: dict) -> dict:
+    """
+    Net revenue retention split into expansion, contraction, churn and reactivation.
+    
+    column_config names customerIdColumn, periodColumn (dates, or integer
+    period numbers) and revenueColumn, and optionally periodFrequency
+    (month, quarter or year; default month). Each row is revenue from one
+    customer in one period; repeated rows are summed. Results are given per
+    period and per cohort (the customer's first period with revenue).
+    
+    df is a DataFrame or a streamed table (TableChunks), read in chunks of
+    rows in any order. The rows are spilled to disk in parts of whole
+    customers, and each part is decomposed over blocks of customers whose
+    partial sums are merged (see jobs/nrr.py), so memory is bounded by a
+    part rather than the upload.
+    """
+    import numpy as np
+    import pandas as pd
+    from modal_app.jobs.nrr import (
+        COMPONENTS, CustomerParts, customer_keys, decompose_in_blocks, period_ordinals, rates,
+    )
+    from modal_app.lib.ingest import SPILL_DIR, iter_chunks
+    from modal_app.lib.spans import span
+    
+    customer_col = column_config.get("customerIdColumn")
+    period_col = column_config.get("periodColumn")
+    revenue_col = column_config.get("revenueColumn")
+    for key, col in (("customerIdColumn", customer_col), ("periodColumn", period_col), ("revenueColumn", revenue_col)):
+        if col not in df.columns:
+            return {"type": "nrr_decomposition", "error": f"{key} '{col}' not found in data"}
+    
+    frequency = column_config.get("periodFrequency", "month")
+    with CustomerParts(NRR_PARTS, SPILL_DIR) as parts:
+        rows_kept = rows_dropped = 0
+        first = last = label = None
+        with span("encode"):
+            for chunk in iter_chunks(df, NRR_CHUNK_ROWS):
+                periods, valid, chunk_label = period_ordinals(chunk[period_col], frequency)
+                customers = customer_keys(chunk[customer_col])
+                revenue = pd.to_numeric(chunk[revenue_col], errors="coerce").to_numpy(dtype=np.float64)
+                valid &= customers.is_valid().to_numpy(zero_copy_only=False) & ~np.isnan(revenue)
+                rows_dropped += int((~valid).sum())
+                if not valid.any():
+                    continue
+                periods = periods[valid]
+                parts.add(customers.take(np.flatnonzero(valid)), periods, revenue[valid])
+                rows_kept += len(periods)
+                first = int(periods.min()) if first is None else min(first, int(periods.min()))
+                last = int(periods.max()) if last is None else max(last, int(periods.max()))
+                label = label or chunk_label
+        
+        if not rows_kept:
+            return {"type": "nrr_decomposition", "error": "No rows with a customer, period and revenue"}
+        if last - first + 1 > NRR_MAX_PERIODS:
+            return {
+                "type": "nrr_decomposition",
+                "error": f"Periods span {last - first + 1} {frequency}s; at most {NRR_MAX_PERIODS} are supported",
+            }
+        
+        n_customers = 0
+        with span("decompose"):
+            total = None
+            for customers, periods, revenue in parts:
+                if not len(customers):
+                    continue
+                partial = decompose_in_blocks(customers, periods, revenue, first, last, NRR_BLOCK_ROWS)
+                total = partial if total is None else total.merge(partial)
+                n_customers += int(customers.max()) + 1
+        grid = total.values
+    labels = [label(p) for p in range(first, last + 1)]
+    
+    def column(values):
+        # JSONB has no NaN: rates are null where there was no starting revenue
+        return [round(float(v), 6) if np.isfinite(v) else None for v in values]
+    
+    def table(values) -> dict:
+        """Components, end revenue, NRR and GRR over the period axis of a (periods, components) array."""
+        out = {name: column(values[:, i]) for i, name in enumerate(COMPONENTS)}
+        out["end"] = column(values[:, 0] + values[:, 1] - values[:, 2] - values[:, 3] + values[:, 4] + values[:, 5])
+        out.update({name: column(v) for name, v in rates(values).items()})
+        return out
+    
+    by_cohort = []
+    for i in np.flatnonzero(grid[:, :, COMPONENTS.index("new")].sum(axis=1) > 0):
+        by_cohort.append({
+            "cohort": labels[i],
+            "periods": labels[i:],
+            **table(grid[i, i:]),
+        })
+    
     return {
         "type": "nrr_decomposition",
-        "message": "Implement with interpret-ml EBM",
-        "columns_found": list(df.columns),
+        "period_frequency": frequency,
+        "n_customers": n_customers,
+        "rows_dropped": rows_dropped,
+        "periods": labels,
+        "by_period": table(grid.sum(axis=0)),
+        "by_cohort": by_cohort,
     }
 
 
-def _run_propensity(df) -> dict:
-    """Propensity model placeholder."""
+# Rows per chunk and per SGD step, and passes over the training rows
+PROPENSITY_CHUNK_ROWS = 200_000
+PROPENSITY_BATCH_ROWS = 4_096
+PROPENSITY_EPOCHS = 3
+
+
+def _propensity_columns(column_config: dict):
+    """Columns _run_propensity reads; None (every column) when features are left to it."""
+    features = column_config.get("featureColumns")
+    if not features:
+        return None
+    named = [column_config.get("dealIdColumn") or column_config.get("customerIdColumn"), column_config.get("outcomeColumn")]
+    return [c for c in named if c] + list(features)
+
+
+def _run_propensity(df, column_config: dict) -> dict:
+    """
+    Win probability for every deal, learned from won/lost history.
+    
+    column_config names outcomeColumn (won: 1/true/yes/won, lost:
+    0/false/no/lost; anything else, such as a blank for an open deal, is
+    scored but not trained on), and optionally dealIdColumn (default
+    customerIdColumn) and featureColumns (default: every other column).
+    Text columns are one-hot encoded by hashing and numeric ones
+    standardized. The table is streamed in chunks: one pass for column
+    statistics, PROPENSITY_EPOCHS of mini-batch SGD, and one scoring pass
+    that also evaluates the hold-out rows (see jobs/propensity.py).
+    """
+    import numpy as np
+    import pandas as pd
+    from modal_app.jobs.propensity import (
+        FeatureEncoder, LogisticSGD, RunningMoments, auc, calibration,
+        holdout_mask, numeric_block, outcome_labels,
+    )
+    from modal_app.lib.artifacts import Artifact
+    from modal_app.lib.ingest import iter_chunks
+    from modal_app.lib.spans import span
+    
+    outcome_col = column_config.get("outcomeColumn")
+    if outcome_col not in df.columns:
+        return {"type": "propensity_model", "error": f"outcomeColumn '{outcome_col}' not found in data"}
+    id_col = column_config.get("dealIdColumn") or column_config.get("customerIdColumn")
+    id_col = id_col if id_col in df.columns else None
+    features = [c for c in (column_config.get("featureColumns") or df.columns) if c not in (outcome_col, id_col)]
+    if not features:
+        return {"type": "propensity_model", "error": "No feature columns"}
+    
+    def chunks():
+        """(first row number, chunk, outcome labels) per chunk of the table."""
+        offset = 0
+        for chunk in iter_chunks(df, PROPENSITY_CHUNK_ROWS):
+            yield offset, chunk, outcome_labels(chunk[outcome_col])
+            offset += len(chunk)
+    
+    # Pass 1: column kinds (from the first chunk), numeric moments, label counts
+    numeric, moments = None, None
+    labelled = won = 0
+    with span("statistics"):
+        for _, chunk, y in chunks():
+            if numeric is None:
+                numeric = [c for c in features if pd.api.types.is_numeric_dtype(chunk[c]) and not pd.api.types.is_bool_dtype(chunk[c])]
+                moments = RunningMoments(len(numeric))
+            moments.update(numeric_block(chunk, numeric))
+            labelled += int((~np.isnan(y)).sum())
+            won += int(np.nansum(y))
+    if not labelled or won in (0, labelled):
+        return {"type": "propensity_model", "error": "Need both won and lost deals to train"}
+    
+    categorical = [c for c in features if c not in numeric]
+    encoder = FeatureEncoder(categorical, numeric, moments.mean, moments.std)
+    model = LogisticSGD(encoder.n_features)
+    rng = np.random.default_rng(0)
+    
+    # Training passes over labelled, non-hold-out rows, shuffled within each chunk
+    with span("train"):
+        for _ in range(PROPENSITY_EPOCHS):
+            for offset, chunk, y in chunks():
+                train = ~np.isnan(y) & ~holdout_mask(np.arange(offset, offset + len(chunk)))
+                if not train.any():
+                    continue
+                X, y = encoder.transform(chunk[train]), y[train]
+                order = rng.permutation(len(y))
+                for start in range(0, len(order), PROPENSITY_BATCH_ROWS):
+                    batch = order[start:start + PROPENSITY_BATCH_ROWS]
+                    model.partial_fit(X[batch], y[batch])
+    
+    # Scoring pass: every deal, plus hold-out labels for evaluation
+    ids, scores, held_y, held_p = [], [], [], []
+    with span("score"):
+        for offset, chunk, y in chunks():
+            rows = np.arange(offset, offset + len(chunk))
+            p = model.predict(encoder.transform(chunk))
+            held = ~np.isnan(y) & holdout_mask(rows)
+            held_y.append(y[held])
+            held_p.append(p[held])
+            scores.append(p.astype(np.float32))
+            ids.append(chunk[id_col].to_numpy() if id_col else rows)
+    held_y, held_p = np.concatenate(held_y), np.concatenate(held_p)
+    deal_scores = pd.DataFrame({id_col or "row": np.concatenate(ids), "win_probability": np.concatenate(scores)})
+    
     return {
         "type": "propensity_model",
-        "message": "Implement win probability model",
-        "columns_found": list(df.columns),
+        "n_deals": len(deal_scores),
+        "n_labelled": labelled,
+        "n_holdout": int(len(held_y)),
+        "win_rate": won / labelled,
+        "categorical_features": categorical,
+        "numeric_features": numeric,
+        # Change in log-odds per standard deviation of each numeric feature
+        "numeric_coefficients": dict(zip(numeric, model.w[encoder.n_buckets:encoder.n_buckets + len(numeric)].tolist())),
+        "holdout": {
+            "auc": auc(held_y, held_p) if len(held_y) else None,
+            **(calibration(held_y, held_p) if len(held_y) else {}),
+        },
+        "deal_scores_sample": deal_scores.head(10).to_dict(orient="records"),
+        "artifacts": {
+            "deal_scores": Artifact(deal_scores, "Win probability for every deal"),
+        },
     }
 
 
+# job_type -> handler(df, column_config) -> result fields
+HANDLERS = {
+    "poisson_factorization": _run_poisson,
+    "poisson_scoring": _run_poisson_scoring,
+    "survival_analysis": _run_survival,
+    "nrr_decomposition": _run_nrr,
+    "propensity_model": _run_propensity,
+}
+
+# Row-oriented job types: column_config -> columns to parse (None = all),
+# parsed as a plain table (lib/ingest.py read_table) instead of the
+# customer × feature matrix
+TABLE_COLUMNS = {
+    "survival_analysis": _survival_columns,
+    "nrr_decomposition": _nrr_columns,
+    "propensity_model": _propensity_columns,
+}
+
+# Row-oriented job types that stream their table in chunks (TableChunks)
+# instead of parsing it whole
+STREAMED_TABLES = {"nrr_decomposition", "propensity_model"}
+
+# job_type -> resource hints for routing (lib/resources.py estimate_cost):
+# seconds and peak MB per million cells (rows × features read) on one core,
+# measured download to result on synthetic uploads; parallel handlers
+# spread their time across cores
+HANDLER_RESOURCES = {
+    "poisson_factorization": {"seconds_per_mcell": 11.0, "mb_per_mcell": 90, "parallel": True},
+    "poisson_scoring": {"seconds_per_mcell": 1.0, "mb_per_mcell": 60},
+    "survival_analysis": {"seconds_per_mcell": 0.15, "mb_per_mcell": 80},
+    "nrr_decomposition": {"seconds_per_mcell": 0.17, "mb_per_mcell": 10},
+    "propensity_model": {"seconds_per_mcell": 0.3, "mb_per_mcell": 40},
+}
+
+
+def input_cells(job_type: str, column_config: dict, size: dict) -> float:
+    """Cells (rows × features read) job_type's handler works through, for an estimate_input() size."""
+    if size["rows"] is None:
+        return size["cells"]
+    column_config = column_config or {}
+    if job_type in TABLE_COLUMNS:
+        columns = TABLE_COLUMNS[job_type](column_config) if column_config else None
+        features = len(columns) if columns else size["columns"]
+    elif column_config.get("format") == "long":
+        features = 1  # One count per row
+    else:
+        features = len(column_config.get("featureColumns") or []) or size["columns"]
+    return size["rows"] * features
+
+
+def route_job(supabase: SupabaseClient, job: dict) -> tuple:
+    """
+    (route, estimate) for a pending job, sized from the head of its upload.
+    
+    estimate has the upload's size (estimate_input) and the expected cost
+    on the chosen route. A large route is written to the job row, so that
+    only large workers claim it.
+    """
+    from modal_app.lib.resources import HEAD_BYTES, choose_route, estimate_cost, estimate_input
+    
+    column_config = job.get("column_config")
+    job_types = analysis_types(job["job_type"], column_config)
+    head, total_bytes = supabase.read_head("analysis-uploads", job["input_file_path"], HEAD_BYTES)
+    size = estimate_input(head, total_bytes)
+    work = [(HANDLER_RESOURCES[t], input_cells(t, column_config, size)) for t in job_types]
+    
+    route = choose_route(ROUTES, lambda cpus: estimate_cost(work, cpus))
+    if route == "large":
+        supabase.table("jobs").update({"route": route}).eq("id", job["id"]).eq("status", "pending").execute()
+    
+    estimate = {**size, "bytes": total_bytes, **estimate_cost(work, ROUTES[route]["cpus"])}
+    return route, estimate
+
+
 # =============================================================================
 # Web Endpoint
 # =============================================================================
 
-@app.function(image=image)
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("supabase-secrets")],
+    cpu=float(ROUTES["inline"]["cpus"]),
+    memory=ROUTES["inline"]["memory_mb"],
+    env=route_env("inline"),
+)
 @modal.fastapi_endpoint(method="POST")
 def trigger(payload: dict) -> dict:
     """
     Webhook to trigger job processing.
     
-    Called from Next.js server action. Spawns job asynchronously and returns immediately.
+    Called from Next.js server action. Sizes the job from the head of its
+    upload (route_job), then by route:
+    
+      inline    processes it here, before returning: no spawn, no cold start
+      standard  spawns JobProcessor.claim_worker, which claims this job along
+                with any others waiting, so bursts of uploads share warm
+                containers
+      large     spawns process_job for it on a large_processor()
+    
+    A job that cannot be sized goes the standard way, where its worker
+    reports whatever is wrong with it.
     """
     job_id = payload.get("jobId")
     
     if not job_id:
         return {"error": "jobId required", "status": "error"}
     
+    supabase = get_supabase_client()
+    route, estimate = "standard", None
+    try:
+        job = (
+            supabase.table("jobs").select("id, job_type, status, column_config, input_file_path")
+            .eq("id", job_id).limit(1).execute().data
+        )
+        if job and job[0]["status"] == "pending" and job[0]["input_file_path"]:
+            route, estimate = route_job(supabase, job[0])
+    except Exception as e:
+        print(f"Could not size job {job_id}, routing it as standard: {type(e).__name__}: {e}")
+    
+    if route == "inline":
+        from modal_app.lib.resources import limit_threads
+        
+        limit_threads()
+        outcome = process_job_now(supabase, job_id)
+        return {"status": "triggered", "jobId": job_id, "route": route, "estimate": estimate, "outcome": outcome["status"]}
+    
     # Fire and forget
-    process_job.spawn(job_id)
+    if route == "large":
+        large_processor().process_job.spawn(job_id)
+    else:
+        JobProcessor().claim_worker.spawn()
+    
+    return {"status": "triggered", "jobId": job_id, "route": route, "estimate": estimate}
+
+
+# Columns the status endpoint serves: never the result
+STATUS_FIELDS = "id, status, progress, created_at, updated_at"
+
+# Longest long-poll (seconds), under Modal's 150 s web request limit with
+# room for proxies that cut idle requests sooner
+STATUS_MAX_WAIT = 25
+
+# Re-read interval while long-polling: starts short so a change right
+# after the request is seen quickly, then backs off
+STATUS_POLL_MIN = 0.25
+STATUS_POLL_MAX = 2.0
+
+
+def status_etag(row: dict) -> str:
+    """ETag of a job's status fields: changes with every write to the row."""
+    import hashlib
+    
+    digest = hashlib.sha1(f"{row['status']}|{row['progress']}|{row['updated_at']}".encode()).hexdigest()
+    return f'"{digest[:16]}"'
+
+
+def wait_for_status_change(supabase: SupabaseClient, job_id: str, etag: str = None, wait: float = 0):
+    """
+    The job's status fields, once their ETag differs from etag or wait seconds pass.
     
-    return {"status": "triggered", "jobId": job_id}
+    Re-reads only STATUS_FIELDS, backing off from STATUS_POLL_MIN to
+    STATUS_POLL_MAX. A finished job returns at once: it will not change
+    again. None if there is no such job.
+    """
+    import time
+    
+    deadline = time.monotonic() + min(max(wait, 0), STATUS_MAX_WAIT)
+    delay = STATUS_POLL_MIN
+    while True:
+        rows = supabase.table("jobs").select(STATUS_FIELDS).eq("id", job_id).limit(1).execute().data
+        if not rows:
+            return None
+        row = rows[0]
+        remaining = deadline - time.monotonic()
+        if status_etag(row) != etag or row["status"] in ("done", "error") or remaining <= 0:
+            return row
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, STATUS_POLL_MAX)
+
+
+def status_app():
+    """
+    FastAPI app behind job_status: GET /?jobId=<id>[&wait=<seconds>].
+    
+    Answers with id, status, progress, created_at and updated_at plus an ETag. A request
+    whose If-None-Match still matches gets 304 Not Modified; with wait > 0
+    it first blocks (up to STATUS_MAX_WAIT) until the job changes. Open to
+    browsers (CORS), like the demo's job rows.
+    """
+    import uuid
+    from fastapi import FastAPI, Header, Query, Response
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+    
+    web_app = FastAPI()
+    web_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["GET"],
+        allow_headers=["If-None-Match"],
+        expose_headers=["ETag"],
+    )
+    
+    @web_app.get("/")
+    def job_status(
+        jobId: str,
+        wait: float = Query(0, ge=0),
+        if_none_match: str = Header(None),
+    ):
+        try:
+            uuid.UUID(jobId)
+        except ValueError:
+            return JSONResponse({"error": "jobId must be a UUID", "status": "error"}, status_code=400)
+        
+        row = wait_for_status_change(get_supabase_client(), jobId, if_none_match, wait)
+        if row is None:
+            return JSONResponse({"error": "Job not found", "status": "error"}, status_code=404)
+        
+        headers = {"ETag": status_etag(row), "Cache-Control": "no-cache"}
+        if headers["ETag"] == if_none_match:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(row, headers=headers)
+    
+    return web_app
+
+
+@app.function(image=image, secrets=[modal.Secret.from_name("supabase-secrets")])
+@modal.concurrent(max_inputs=40)  # Long polls mostly sleep; FastAPI runs sync routes on 40 threads
+@modal.asgi_app()
+def job_status():
+    """
+    Cheap job status for the web UI, next to trigger (see status_app).
+    
+    Polling the jobs row pulls the whole result with every request; this
+    serves only the status fields, and its long poll turns a stream of
+    polls into one request per change (or per STATUS_MAX_WAIT). Clients
+    read the full row once, when the status is done or error.
+    """
+    return status_app()
+
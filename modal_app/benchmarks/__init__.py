@@ -0,0 +1,2 @@
+# Local benchmarks for modal_app (not deployed as Modal functions)
+
@@ -0,0 +1,371 @@
+"""
+In-process HTTP stand-in for the parts of Supabase that process_job uses.
+
+Serves the PostgREST `jobs` table (/rest/v1/jobs), the claim_jobs,
+heartbeat_jobs and release_jobs functions (/rest/v1/rpc/...) and the storage bucket
+(/storage/v1/object/<bucket>/..., including result artifact uploads and
+ranged reads) from memory, with optional per-request
+latency and a separate delay for each new connection (standing in for the
+TCP + TLS handshake). Counts requests and TCP connections so benchmarks can see what
+connection reuse saves, and keeps a per-job timeline of the requests that
+mark pipeline stages (claim, download, final status, cleanup) so load tests
+can measure stage latency from the server's side.
+
+    server = FakeSupabase(latency=0.02).start()
+    client = SupabaseClient(server.url, "service-key")
+"""
+
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+
+def _matches(row: dict, column: str, expr: str) -> bool:
+    op, _, value = expr.partition(".")
+    current = row.get(column)
+    if op == "eq":
+        return str(current) == value
+    if op == "neq":
+        return str(current) != value
+    if op == "is":
+        return current is None if value == "null" else str(current).lower() == value
+    if op == "in":
+        return str(current) in value.strip("()").split(",")
+    if op == "lt":
+        return current is not None and str(current) < value
+    raise ValueError(f"Unsupported filter: {column}={expr}")
+
+
+class FakeSupabase:
+    """Threaded HTTP server holding `jobs` rows and bucket objects in memory."""
+
+    def __init__(self, latency: float = 0.0, connect_latency: float = 0.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.rows = {}       # job id -> row
+        self.objects = {}    # (bucket, path) -> bytes
+        self.object_jobs = {}  # (bucket, path) -> job id that uploaded it
+        self.requests = 0
+        self.connections = 0
+        self.requests_by_job = {}
+        self.first_progress_at = {}  # job id -> time.time() of its first progress write
+        self.timeline = {}  # job id -> [(time.time(), event)], in the order the server answered
+        self._lock = threading.Lock()
+        self._server = None
+
+    # -- setup -----------------------------------------------------------------
+
+    def add_job(self, job_type: str, file_bytes: bytes, **fields) -> str:
+        job_id = str(uuid.uuid4())
+        path = f"{job_type}/{job_id}.csv"
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with self._lock:
+            self.objects[("analysis-uploads", path)] = file_bytes
+            self.object_jobs[("analysis-uploads", path)] = job_id
+            self.timeline[job_id] = [(time.time(), "submit")]
+            self.rows[job_id] = {
+                "id": job_id,
+                "created_at": now,
+                "updated_at": now,
+                "status": "pending",
+                "job_type": job_type,
+                "input_file_path": path,
+                "result": None,
+                "error_message": None,
+                "progress": 0,
+                "column_config": None,
+                "input_hash": None,
+                "result_key": None,
+                "result_cache_hit": None,
+                "claimed_by": None,
+                "lease_expires_at": None,
+                "attempts": 0,
+                "route": None,
+                **fields,
+            }
+        return job_id
+
+    def start(self):
+        fake = self
+
+        class Handler(_Handler):
+            server_state = fake
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    # -- Postgres functions (mirror supabase/migrations/007_add_job_leases.sql, 010_add_job_routes.sql) --
+
+    def claim_jobs(
+        self, max_jobs: int, lease_seconds: int, worker_id: str, only_job_id: str = None, max_attempts: int = 3,
+        routes: list = None,
+    ) -> list:
+        now = datetime.now(timezone.utc)
+        claimed = []
+        with self._lock:
+            for row in self.rows.values():
+                lease = row.get("lease_expires_at")
+                expired = row["status"] == "running" and (lease is None or datetime.fromisoformat(lease) < now)
+                if expired and row["attempts"] >= max_attempts:
+                    row.update({
+                        "status": "error",
+                        "error_message": f"Job abandoned after {row['attempts']} attempts "
+                                         "(the worker timed out or crashed each time)",
+                        "progress": 0,
+                        "claimed_by": None,
+                        "lease_expires_at": None,
+                    })
+                    continue
+                if len(claimed) >= max_jobs:
+                    continue
+                if only_job_id is not None and row["id"] != only_job_id:
+                    continue
+                if routes is not None and (row.get("route") or "standard") not in routes:
+                    continue
+                if row["status"] == "pending" or expired:
+                    row.update({
+                        "status": "running",
+                        "claimed_by": worker_id,
+                        "lease_expires_at": (now + timedelta(seconds=lease_seconds)).isoformat(),
+                        "attempts": row["attempts"] + 1,
+                    })
+                    claimed.append(dict(row))
+        return claimed
+
+    def heartbeat_jobs(self, job_ids: list, lease_seconds: int, worker_id: str) -> int:
+        lease = (datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)).isoformat()
+        extended = 0
+        with self._lock:
+            for job_id in job_ids:
+                row = self.rows.get(job_id)
+                if row and row.get("claimed_by") == worker_id and row["status"] == "running":
+                    row["lease_expires_at"] = lease
+                    extended += 1
+        return extended
+
+    def release_jobs(self, job_ids: list, worker_id: str) -> int:
+        released = 0
+        with self._lock:
+            for job_id in job_ids:
+                row = self.rows.get(job_id)
+                if row and row.get("claimed_by") == worker_id and row["status"] == "running":
+                    row.update({
+                        "status": "pending",
+                        "claimed_by": None,
+                        "lease_expires_at": None,
+                        "attempts": max(row["attempts"] - 1, 0),
+                    })
+                    released += 1
+        return released
+
+    # -- request accounting ----------------------------------------------------
+
+    def _count(self, job_id: str = None):
+        with self._lock:
+            self.requests += 1
+            if job_id:
+                self.requests_by_job[job_id] = self.requests_by_job.get(job_id, 0) + 1
+
+    def _event(self, job_id: str, event: str):
+        if job_id:
+            with self._lock:
+                self.timeline.setdefault(job_id, []).append((time.time(), event))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    server_state: FakeSupabase = None
+
+    def setup(self):
+        super().setup()
+        with self.server_state._lock:
+            self.server_state.connections += 1
+        if self.server_state.connect_latency:
+            time.sleep(self.server_state.connect_latency)
+
+    def log_message(self, *args):
+        pass
+
+    # -- plumbing --------------------------------------------------------------
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, payload=None, raw: bytes = None, content_type="application/json", headers=None):
+        data = raw if raw is not None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _range(self, size: int):
+        """(start, stop) of a "Range: bytes=a-b" request header, or None for the whole object."""
+        spec = self.headers.get("Range") or ""
+        if not spec.startswith("bytes="):
+            return None
+        first, _, last = spec[len("bytes="):].partition("-")
+        return int(first), min(int(last) + 1 if last else size, size)
+
+    def _route(self):
+        # Always drain the body so the next request on this connection parses cleanly
+        self.body = self._body()
+        if self.server_state.latency:
+            time.sleep(self.server_state.latency)
+        parts = urlsplit(self.path)
+        return unquote(parts.path), parse_qsl(parts.query, keep_blank_values=True)
+
+    # -- PostgREST -------------------------------------------------------------
+
+    def _select(self, query):
+        state = self.server_state
+        filters = [(k, v) for k, v in query if k not in ("select", "order", "limit", "offset")]
+        options = dict(query)
+        with state._lock:
+            rows = [dict(r) for r in state.rows.values() if all(_matches(r, k, v) for k, v in filters)]
+        if "order" in options:
+            column, _, direction = options["order"].partition(".")
+            rows.sort(key=lambda r: str(r.get(column)), reverse=direction.startswith("desc"))
+        if "limit" in options:
+            rows = rows[: int(options["limit"])]
+        columns = options.get("select", "*")
+        if columns != "*":
+            keep = [c.strip() for c in columns.split(",")]
+            rows = [{c: r.get(c) for c in keep} for r in rows]
+        return rows, filters
+
+    def _job_id(self, filters):
+        return next((v[3:] for k, v in filters if k == "id" and v.startswith("eq.")), None)
+
+    def _reply_rows(self, rows):
+        if "vnd.pgrst.object" in (self.headers.get("Accept") or ""):
+            if len(rows) != 1:
+                return self._send(406, {"message": "JSON object requested, multiple (or no) rows returned"})
+            return self._send(200, rows[0])
+        return self._send(200, rows)
+
+    def do_GET(self):
+        path, query = self._route()
+        if path == "/rest/v1/jobs":
+            rows, filters = self._select(query)
+            self.server_state._count(self._job_id(filters))
+            return self._reply_rows(rows)
+        if path.startswith("/storage/v1/object/"):
+            bucket, _, key = path[len("/storage/v1/object/"):].partition("/")
+            job_id = self.server_state.object_jobs.get((bucket, key))
+            self.server_state._count(job_id)
+            data = self.server_state.objects.get((bucket, key))
+            if data is None:
+                return self._send(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+            ranged = self._range(len(data))
+            if ranged is None:
+                self.server_state._event(job_id, "download")
+                return self._send(200, raw=data, content_type="text/csv")
+            start, stop = ranged
+            return self._send(
+                206, raw=data[start:stop], content_type="text/csv",
+                headers={"Content-Range": f"bytes {start}-{stop - 1}/{len(data)}"},
+            )
+        self._send(404, {"message": "no route"})
+
+    def do_PATCH(self):
+        path, query = self._route()
+        body = json.loads(self.body or b"{}")
+        if path != "/rest/v1/jobs":
+            return self._send(404, {"message": "no route"})
+        state = self.server_state
+        filters = [(k, v) for k, v in query if k != "select"]
+        with state._lock:
+            updated = []
+            for row in state.rows.values():
+                if all(_matches(row, k, v) for k, v in filters):
+                    row.update(body)
+                    row["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+                    updated.append(dict(row))
+            job_id = self._job_id(filters)
+            if "progress" in body and job_id:
+                state.first_progress_at.setdefault(job_id, time.time())
+        state._count(job_id)
+        if updated and body.get("status") in ("done", "error"):
+            state._event(job_id, body["status"])
+        elif updated and "input_file_path" in body:
+            state._event(job_id, "clear_path")
+        if "return=representation" in (self.headers.get("Prefer") or ""):
+            return self._reply_rows(updated)
+        self._send(200, [])
+
+    def do_POST(self):
+        path, _ = self._route()
+        if path.startswith("/storage/v1/object/"):
+            return self._upload(path)
+        body = json.loads(self.body or b"{}")
+        if path.startswith("/rest/v1/rpc/"):
+            fn = getattr(self.server_state, path.rsplit("/", 1)[1], None)
+            if fn is None:
+                return self._send(404, {"message": "no such function"})
+            self.server_state._count(body.get("only_job_id"))
+            result = fn(**body)
+            if fn.__name__ == "claim_jobs":
+                for row in result:
+                    self.server_state._event(row["id"], "claim")
+            return self._send(200, result)
+        self._send(404, {"message": "no route"})
+
+    def _upload(self, path: str):
+        """Multipart object upload (result artifacts), filed under the job named by the path's first segment."""
+        from email.parser import BytesParser
+        from email.policy import HTTP
+
+        bucket, _, key = path[len("/storage/v1/object/"):].partition("/")
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + self.body
+        )
+        data = next(part.get_payload(decode=True) for part in message.iter_parts() if part.get_filename())
+        state = self.server_state
+        job_id = key.split("/", 1)[0] if key.split("/", 1)[0] in state.rows else None
+        with state._lock:
+            if (bucket, key) in state.objects and self.headers.get("x-upsert") != "true":
+                conflict = True
+            else:
+                conflict = False
+                state.objects[(bucket, key)] = data
+                state.object_jobs[(bucket, key)] = job_id
+        state._count(job_id)
+        if conflict:
+            return self._send(400, {"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"})
+        state._event(job_id, "artifact")
+        return self._send(200, {"Key": f"{bucket}/{key}"})
+
+    def do_DELETE(self):
+        path, _ = self._route()
+        body = json.loads(self.body or b"{}")
+        if path.startswith("/storage/v1/object/"):
+            bucket = path[len("/storage/v1/object/"):].strip("/")
+            state = self.server_state
+            with state._lock:
+                removed = [p for p in body.get("prefixes", []) if state.objects.pop((bucket, p), None) is not None]
+            job_ids = {state.object_jobs.get((bucket, p)) for p in removed}
+            state._count(job_ids.pop() if len(job_ids) == 1 else None)
+            for p in removed:
+                state._event(state.object_jobs.get((bucket, p)), "delete_upload")
+            return self._send(200, [{"name": p} for p in removed])
+        self._send(404, {"message": "no route"})
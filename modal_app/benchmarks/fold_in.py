@@ -0,0 +1,51 @@
+"""
+Wall-clock for scoring new customers: full refit (adaptive rank sweep +
+solve_w) vs fold-in against the loadings of a fit on a reference sample.
+
+Run: python -m modal_app.benchmarks.fold_in [n_customers ...] [--features 50] [--reference 50000]
+"""
+
+import argparse
+import time
+
+
+def main(argv=None):
+    from modal_app.benchmarks.synthetic import count_matrix
+    from modal_app.jobs.poisson import as_count_matrix, elbow_rank, fit_rank_sweep, fold_in, solve_w
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("customers", type=int, nargs="*", default=[100_000, 1_000_000, 4_000_000])
+    parser.add_argument("--features", type=int, default=50)
+    parser.add_argument("--reference", type=int, default=50_000, help="customers in the reference fit")
+    parser.add_argument("--max-k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    def confirmed(fits):
+        return elbow_rank([f["log_likelihood"] for f in fits])[1]
+
+    reference = as_count_matrix(count_matrix(args.reference, args.features, seed=1))
+    fits = fit_rank_sweep(reference, args.max_k, stop=confirmed)
+    k = max(2, elbow_rank([f["log_likelihood"] for f in fits])[0])
+    H = fits[k - 1]["H"]
+    print(f"reference: {args.reference:,} customers x {args.features} features, k={k}")
+
+    for n in args.customers:
+        X = as_count_matrix(count_matrix(n, args.features, seed=2))
+
+        start = time.perf_counter()
+        scored = fold_in(X, H)
+        fold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        refit = fit_rank_sweep(X, args.max_k, stop=confirmed)
+        solve_w(X, refit[min(k, len(refit)) - 1]["H"])
+        full = time.perf_counter() - start
+
+        print(
+            f"{n:>10,} customers: fold-in {fold:7.2f}s ({n / fold:>12,.0f} customers/s)  "
+            f"refit {full:7.2f}s  ({full / fold:.1f}x)  loglik/customer {scored['log_likelihood'] / n:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Parse time and peak RSS: full read_csv + transform_data vs chunked ingestion.
+
+Each path runs in a fresh spawned process so peak RSS is not shared.
+
+Run: python -m modal_app.benchmarks.ingest [target_mb] [wide|long]
+"""
+
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+N_FEATURES = 50
+N_EXTRA = 10  # Unused columns that column pruning should skip
+
+
+def write_csv(path: str, target_mb: int, format_type: str):
+    """Write a synthetic upload of roughly target_mb megabytes."""
+    rng = np.random.default_rng(0)
+    rows = 200_000
+    header = True
+    customer = 0
+    with open(path, "w") as f:
+        while f.tell() < target_mb * 1024 * 1024:
+            if format_type == "wide":
+                chunk = pd.DataFrame(
+                    rng.poisson(0.5, size=(rows, N_FEATURES)),
+                    columns=[f"f{i}" for i in range(N_FEATURES)],
+                )
+                chunk.insert(0, "customer_id", np.arange(customer, customer + rows))
+                customer += rows
+            else:
+                chunk = pd.DataFrame({
+                    "customer_id": rng.integers(0, 500_000, rows),
+                    "event": rng.choice([f"event_{i}" for i in range(2_000)], rows),
+                    "count": rng.poisson(2.0, rows),
+                })
+            for i in range(N_EXTRA):
+                chunk[f"note_{i}"] = "lorem ipsum"
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+
+
+def _config(format_type: str) -> dict:
+    if format_type == "wide":
+        return {"format": "wide", "customerIdColumn": "customer_id",
+                "featureColumns": [f"f{i}" for i in range(N_FEATURES)]}
+    return {"format": "long", "customerIdColumn": "customer_id",
+            "featureNameColumn": "event", "featureValueColumn": "count"}
+
+
+def _run(path: str, format_type: str, chunked: bool, queue):
+    from modal_app.app import transform_data
+    from modal_app.lib.ingest import read_csv_transformed
+
+    with open(path, "rb") as f:
+        file_bytes = f.read()  # process_job holds the download as bytes too
+
+    start = time.perf_counter()
+    if chunked:
+        read_csv_transformed(io.BytesIO(file_bytes), _config(format_type))
+    else:
+        transform_data(pd.read_csv(io.BytesIO(file_bytes)), _config(format_type))
+    elapsed = time.perf_counter() - start
+
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def measure(path: str, format_type: str, chunked: bool):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(path, format_type, chunked, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main(target_mb: int = 1024, format_type: str = "wide"):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload.csv")
+        write_csv(path, target_mb, format_type)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+
+        print(f"{format_type} CSV: {size_mb:.0f} MB")
+        for label, chunked in (("read_csv + transform_data", False), ("chunked ingestion", True)):
+            elapsed, peak_mb = measure(path, format_type, chunked)
+            print(f"{label:28s} {elapsed:8.2f}s  peak RSS {peak_mb:8.0f} MB")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 1024, *args[1:])
@@ -0,0 +1,60 @@
+"""
+Per-job latency of process_job against a local Supabase stand-in.
+
+Compares a fresh SupabaseClient per job (the old behaviour) with the
+container-wide pooled client. The stand-in charges a handshake delay on every
+new TCP connection. Jobs are survival_analysis uploads without a
+column_config, which the handler rejects straight away, so the numbers are
+dominated by HTTP round-trips rather than analysis.
+
+Run: python -m modal_app.benchmarks.job_latency [n_jobs] [latency_ms]
+"""
+
+import statistics
+import sys
+import time
+
+import modal_app.app as modal_app
+from modal_app.benchmarks.fake_supabase import FakeSupabase
+
+
+def make_csv(seed: int) -> bytes:
+    """Small upload; the seed row makes every file distinct so the result cache never hits."""
+    rows = "".join(f"{i},{i % 7},{i % 3}\n" for i in range(200))
+    return f"customer_id,logins,purchases\n-1,{seed},0\n{rows}".encode()
+
+
+def run(server: FakeSupabase, n_jobs: int, pooled: bool):
+    job_ids = [server.add_job("survival_analysis", make_csv(time.perf_counter_ns())) for _ in range(n_jobs)]
+    connections_before = server.connections
+    timings = []
+    processor = None
+    for job_id in job_ids:
+        if not pooled or processor is None:
+            modal_app._supabase_client = modal_app.SupabaseClient(server.url, "service-key")
+            processor = modal_app.JobProcessor()
+        start = time.perf_counter()
+        processor.process_job.local(job_id)
+        timings.append(time.perf_counter() - start)
+    return timings, server.connections - connections_before
+
+
+def main(n_jobs: int = 20, latency_ms: int = 20):
+    # New connections pay ~2 extra round-trips, like a TCP + TLS handshake
+    server = FakeSupabase(latency=latency_ms / 1000, connect_latency=2 * latency_ms / 1000).start()
+    try:
+        print(f"{n_jobs} jobs, {latency_ms} ms per request")
+        for label, pooled in (("client per job", False), ("pooled client", True)):
+            modal_app._supabase_client = None
+            timings, connections = run(server, n_jobs, pooled)
+            print(
+                f"{label:16s} median {statistics.median(timings) * 1000:7.1f} ms  "
+                f"max {max(timings) * 1000:7.1f} ms  "
+                f"TCP connections/job {connections / n_jobs:5.1f}"
+            )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
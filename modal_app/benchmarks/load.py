@@ -0,0 +1,244 @@
+"""
+End-to-end load test: many jobs through JobProcessor against FakeSupabase.
+
+Worker processes stand in for containers. Each one builds its own pooled
+SupabaseClient and JobProcessor, pointed at an in-process FakeSupabase that
+holds the `jobs` table and the `analysis-uploads` bucket. Jobs arrive at a
+fixed rate (or all at once) with distinct synthetic CSVs, so the result
+cache never short-circuits the pipeline.
+
+In "process_job" mode every arrival is handed to a worker, as the per-job
+webhook would. In "claim_worker" mode workers poll the queue with
+claim_worker, as the batch claimer does.
+
+Stage latencies come from the server's timeline of each job:
+
+  queue     submit -> claimed
+  download  claimed -> upload served
+  compute   upload served -> final status written (parse + analysis)
+  finish    final status -> last cleanup request
+  total     submit -> last request
+
+The report gives throughput, p50/p99/max per stage, and HTTP requests per
+job, plus the worker's own view: the spans each job wrote to its metrics
+column (download, parse, analysis and its steps; see lib/spans.py). Requests that name one job (claim, progress, download, status, cleanup)
+are attributed to it; the rest (result-cache lookups by key, heartbeats,
+batch claims) are reported as a per-job average on the side.
+
+Run: python -m modal_app.benchmarks.load [--jobs 200] [--workers 4] [--rate 20] [--json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+STAGES = (
+    ("queue", "submit", "claim"),
+    ("download", "claim", "download"),
+    ("compute", "download", "final"),
+    ("finish", "final", "last"),
+    ("total", "submit", "last"),
+)
+
+
+def make_upload(format_type: str, n_customers: int, n_features: int, seed: int) -> tuple:
+    """(CSV bytes, column_config) for one job; every seed gives different bytes."""
+    from modal_app.benchmarks.synthetic import count_matrix, long_frame, wide_frame
+
+    X = count_matrix(n_customers, n_features, seed=seed)
+    df, config = (wide_frame if format_type == "wide" else long_frame)(X)
+    return df.to_csv(index=False).encode(), config
+
+
+def _worker(url: str, mode: str, job_queue, stop, verbose: bool):
+    import warnings
+
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    warnings.filterwarnings("ignore", message=".*executing locally.*")
+
+    import modal_app.app as modal_app
+
+    modal_app._supabase_client = modal_app.SupabaseClient(url, "service-key")
+    processor = modal_app.JobProcessor()
+
+    if mode == "process_job":
+        while (job_id := job_queue.get()) is not None:
+            processor.process_job.local(job_id)
+        return
+
+    while not stop.is_set():
+        if not processor.claim_worker.local()["processed"]:
+            stop.wait(0.05)
+
+
+def _percentiles(values: list) -> dict:
+    import numpy as np
+
+    if not values:
+        return {}
+    a = np.asarray(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(a, 50)), 1),
+        "p99_ms": round(float(np.percentile(a, 99)), 1),
+        "max_ms": round(float(a.max()), 1),
+        "mean_ms": round(float(a.mean()), 1),
+    }
+
+
+def stage_latencies(timeline: list) -> dict:
+    """Seconds per stage from one job's (time, event) timeline."""
+    marks = {}
+    for t, event in timeline:
+        if event in ("submit", "claim", "download"):
+            marks.setdefault(event, t)
+        if event in ("done", "error"):
+            marks["final"] = t
+        marks["last"] = t
+    return {name: marks[end] - marks[start] for name, start, end in STAGES if start in marks and end in marks}
+
+
+def summarize(server, job_ids: list, started: float, finished: float, n_workers: int) -> dict:
+    per_stage = {name: [] for name, _, _ in STAGES}
+    per_span = {}
+    statuses = {}
+    for job_id in job_ids:
+        statuses[server.rows[job_id]["status"]] = statuses.get(server.rows[job_id]["status"], 0) + 1
+        for name, seconds in stage_latencies(server.timeline[job_id]).items():
+            per_stage[name].append(seconds)
+        for span in (server.rows[job_id].get("metrics") or {}).get("spans", []):
+            per_span.setdefault(span["name"], []).append(span["seconds"])
+
+    attributed = [server.requests_by_job.get(job_id, 0) for job_id in job_ids]
+    completed = statuses.get("done", 0) + statuses.get("error", 0)
+    return {
+        "jobs": len(job_ids),
+        "workers": n_workers,
+        "statuses": statuses,
+        "wall_seconds": round(finished - started, 3),
+        "throughput_jobs_per_s": round(completed / (finished - started), 3),
+        "stages": {name: _percentiles(values) for name, values in per_stage.items()},
+        "worker_spans": {name: _percentiles(values) for name, values in per_span.items()},
+        "http_per_job": round(sum(attributed) / len(job_ids), 2),
+        "http_unattributed_per_job": round((server.requests - sum(attributed)) / len(job_ids), 2),
+        "tcp_connections": server.connections,
+    }
+
+
+def run(
+    n_jobs: int = 200,
+    n_workers: int = 4,
+    rate: float = 0.0,
+    mode: str = "process_job",
+    job_type: str = "survival_analysis",
+    format_type: str = "wide",
+    n_customers: int = 200,
+    n_features: int = 10,
+    latency_ms: float = 5.0,
+    verbose: bool = False,
+) -> dict:
+    from modal_app.benchmarks.fake_supabase import FakeSupabase
+    from modal_app.lib.cache import content_hash
+
+    server = FakeSupabase(latency=latency_ms / 1000, connect_latency=2 * latency_ms / 1000).start()
+    ctx = multiprocessing.get_context("spawn")
+    job_queue, stop = ctx.Queue(), ctx.Event()
+    workers = [ctx.Process(target=_worker, args=(server.url, mode, job_queue, stop, verbose)) for _ in range(n_workers)]
+    try:
+        uploads = [make_upload(format_type, n_customers, n_features, seed) for seed in range(n_jobs)]
+        for w in workers:
+            w.start()
+        time.sleep(2.0)  # Let workers import and connect; startup is benchmarks/startup.py's job
+
+        job_ids = []
+        started = time.time()
+        for i, (csv, config) in enumerate(uploads):
+            if rate:
+                time.sleep(max(0.0, started + i / rate - time.time()))
+            job_id = server.add_job(job_type, csv, column_config=config, input_hash=content_hash(csv))
+            job_ids.append(job_id)
+            if mode == "process_job":
+                job_queue.put(job_id)
+
+        while any(server.rows[j]["status"] not in ("done", "error") for j in job_ids):
+            if not any(w.is_alive() for w in workers):
+                raise RuntimeError("All workers exited before the jobs finished")
+            time.sleep(0.05)
+        finished = max(server.timeline[j][-1][0] for j in job_ids)
+    finally:
+        stop.set()
+        for _ in workers:
+            job_queue.put(None)
+        for w in workers:
+            w.join(timeout=30)
+        server.stop()
+
+    return {
+        "mode": mode,
+        "job_type": job_type,
+        "format": format_type,
+        "customers": n_customers,
+        "features": n_features,
+        "latency_ms": latency_ms,
+        "rate": rate,
+        **summarize(server, job_ids, started, finished, n_workers),
+    }
+
+
+def _print_report(report: dict):
+    print(
+        f"{report['jobs']} {report['job_type']} jobs ({report['format']} {report['customers']}x{report['features']}), "
+        f"{report['workers']} workers, mode={report['mode']}, {report['latency_ms']} ms/request"
+    )
+    print(f"throughput      {report['throughput_jobs_per_s']:8.2f} jobs/s   statuses {report['statuses']}")
+    for name, stats in report["stages"].items():
+        if stats:
+            print(f"{name:9s} p50 {stats['p50_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms  max {stats['max_ms']:9.1f} ms")
+    if report["worker_spans"]:
+        print("worker spans (from jobs.metrics):")
+        for name, stats in report["worker_spans"].items():
+            print(f"  {name:28s} p50 {stats['p50_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms")
+    print(
+        f"HTTP/job        {report['http_per_job']:8.2f}  "
+        f"(+{report['http_unattributed_per_job']:.2f} not tied to one job)  TCP connections {report['tcp_connections']}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.0, help="arrivals per second (0 = all at once)")
+    parser.add_argument("--mode", choices=("process_job", "claim_worker"), default="process_job")
+    parser.add_argument("--job-type", default="survival_analysis")
+    parser.add_argument("--format", choices=("wide", "long"), default="wide")
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--features", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep worker logs")
+    args = parser.parse_args(argv)
+
+    report = run(
+        n_jobs=args.jobs,
+        n_workers=args.workers,
+        rate=args.rate,
+        mode=args.mode,
+        job_type=args.job_type,
+        format_type=args.format,
+        n_customers=args.customers,
+        n_features=args.features,
+        latency_ms=args.latency_ms,
+        verbose=args.verbose,
+    )
+    if args.json:
+        print(json.dumps(report))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
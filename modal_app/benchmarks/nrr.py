@@ -0,0 +1,62 @@
+"""
+Wall-clock and peak memory of _run_nrr on customer-month revenue rows, 10M
+rows by default.
+
+With --csv the rows are written to a CSV file and streamed through
+TableChunks, the path process_job takes; otherwise _run_nrr reads the
+in-memory DataFrame (as in a multi-analysis job). Each size runs in a fresh
+spawned process, and the peak RSS is that of the handler alone.
+
+Run: python -m modal_app.benchmarks.nrr [n_rows ...] [--months 24] [--csv]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+
+def _case(n_rows: int, n_months: int, path, queue):
+    from modal_app.app import _nrr_columns, _run_nrr
+    from modal_app.benchmarks.suite import _measure
+    from modal_app.benchmarks.synthetic import revenue_frame
+    from modal_app.lib.ingest import TableChunks
+
+    df, config = revenue_frame(n_rows, n_months)
+    n_rows = len(df)
+    if path is None:
+        result, fields = _measure(lambda: _run_nrr(df, config))
+    else:
+        df.to_csv(path, index=False)
+        del df
+        with open(path, "rb") as source:
+            table = TableChunks(source, _nrr_columns(config))
+            result, fields = _measure(lambda: _run_nrr(table, config))
+    queue.put({"n_rows": n_rows, "n_customers": result["n_customers"], **fields})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("rows", type=int, nargs="*", default=[10_000_000])
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--csv", action="store_true", help="stream the rows from a CSV file")
+    args = parser.parse_args(argv)
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            path = os.path.join(tmp, "revenue.csv") if args.csv else None
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_case, args=(n, args.months, path, queue))
+            proc.start()
+            r = queue.get()
+            proc.join()
+            print(
+                f"{r['n_rows']:>11,} rows, {args.months} months: _run_nrr {r['seconds']:7.2f}s  "
+                f"peak {r['peak_rss_mb']:6.0f} MB (from {r['rss_before_mb']:.0f} MB)  "
+                f"({r['n_customers']:,} customers)"
+            )
+
+
+if __name__ == "__main__":
+    main()
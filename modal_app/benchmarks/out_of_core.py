@@ -0,0 +1,73 @@
+"""
+Peak memory and wall-clock of a wide upload too large for memory, end to end:
+CSV file -> read_csv_transformed (parsed to disk) -> _run_poisson (out of
+core), with the per-stage spans process_job would record.
+
+The CSV is rendered once from synthetic.count_matrix, chunk by chunk, into
+the temporary directory and reused by later runs of the same shape.
+
+Run: python -m modal_app.benchmarks.out_of_core [--customers 2000000] [--features 50] [--budget-mb 0]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+# Customers rendered per count_matrix call while writing the CSV
+RENDER_ROWS = 200_000
+
+
+def render_csv(path: str, n_customers: int, n_features: int):
+    from modal_app.benchmarks.synthetic import count_matrix, wide_frame
+
+    with open(path, "w") as f:
+        for i, start in enumerate(range(0, n_customers, RENDER_ROWS)):
+            rows = min(RENDER_ROWS, n_customers - start)
+            df, _ = wide_frame(count_matrix(rows, n_features, seed=i))
+            df["customer_id"] += start
+            df.to_csv(f, index=False, header=i == 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=2_000_000)
+    parser.add_argument("--features", type=int, default=50)
+    parser.add_argument("--budget-mb", type=int, default=0, help="ANALYSIS_MEMORY_BUDGET_MB for the run (0: none)")
+    args = parser.parse_args(argv)
+    if args.budget_mb:
+        os.environ["ANALYSIS_MEMORY_BUDGET_MB"] = str(args.budget_mb)
+
+    from modal_app.app import _run_poisson
+    from modal_app.lib.ingest import read_csv_transformed
+    from modal_app.lib.spans import Spans
+
+    path = os.path.join(tempfile.gettempdir(), f"out_of_core_{args.customers}x{args.features}.csv")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        render_csv(path, args.customers, args.features)
+        print(f"rendered {path} ({os.path.getsize(path) / 2**20:,.0f} MB) in {time.perf_counter() - start:.0f}s")
+
+    config = {"customerIdColumn": "customer_id"}
+    spans = Spans()
+    token = spans.activate()
+    try:
+        with spans("parse"):
+            with open(path, "rb") as source:
+                parsed = read_csv_transformed(source, config)
+        with spans("analysis"):
+            result = _run_poisson(parsed, config)
+    finally:
+        spans.deactivate(token)
+
+    print(
+        f"{args.customers:,} x {args.features} ({args.customers * args.features / 1e6:,.0f}M cells), "
+        f"{type(parsed).__name__}: k={result['n_factors']} of {len(result['factors_tested'])} tried, "
+        f"out_of_core={result['out_of_core']}"
+    )
+    for record in spans.records:
+        print(f"  {record['name']:<28} {record['seconds']:8.1f}s  peak {record['peak_rss_mb'] or float('nan'):8,.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Wall-clock comparison: sequential cold sweep + refit vs parallel warm sweep,
+and the full parallel sweep vs the adaptive search that stops at the elbow
+(with max_k raised to 50).
+
+Run: python -m modal_app.benchmarks.poisson_sweep [n_customers] [n_features]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+
+def sequential_sweep(X, max_k: int):
+    """The original path: cold fit per k, then refit the winner."""
+    from sklearn.decomposition import NMF
+
+    models = []
+    for k in range(1, max_k + 1):
+        model = NMF(n_components=k, max_iter=300, random_state=42, init="nndsvda")
+        model.fit(X)
+        models.append(model)
+    models[-1].fit_transform(X)
+    return models
+
+
+def main(n_customers: int = 20_000, n_features: int = 200, max_k: int = 10):
+    from modal_app.jobs.poisson import available_cpus, elbow_rank, fit_rank_sweep
+
+    rng = np.random.default_rng(0)
+    X = rng.poisson(rng.gamma(0.3, 2.0, size=(n_customers, n_features))).astype(float)
+
+    start = time.perf_counter()
+    sequential_sweep(X, max_k)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fits = fit_rank_sweep(X, max_k)
+    parallel = time.perf_counter() - start
+
+    def confirmed(fits):
+        return elbow_rank([f["log_likelihood"] for f in fits])[1]
+
+    start = time.perf_counter()
+    adaptive_fits = fit_rank_sweep(X, 50, stop=confirmed)
+    adaptive = time.perf_counter() - start
+
+    print(f"X: {n_customers} x {n_features}, k=1..{max_k}, cores={available_cpus()}")
+    print(f"sequential cold + refit: {sequential:8.2f}s")
+    print(f"parallel warm sweep:     {parallel:8.2f}s  ({sequential / parallel:.1f}x)")
+    print(f"  elbow k={elbow_rank([f['log_likelihood'] for f in fits])[0]} from {len(fits)} fits")
+    print(f"adaptive search to 50:   {adaptive:8.2f}s  ({parallel / adaptive:.1f}x vs full sweep)")
+    print(f"  elbow k={elbow_rank([f['log_likelihood'] for f in adaptive_fits])[0]} from {len(adaptive_fits)} fits")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
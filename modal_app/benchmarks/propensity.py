@@ -0,0 +1,54 @@
+"""
+Throughput and peak memory of _run_propensity as the number of deals grows.
+
+Each size runs in a fresh spawned process: the deals are written to a CSV
+file, then streamed through TableChunks as process_job does. The peak RSS of
+the handler alone (kernel high-water mark reset before it starts) should stay
+roughly flat apart from the 8-16 bytes of score and id kept per deal.
+
+Run: python -m modal_app.benchmarks.propensity [n_deals ...]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+
+def _case(n_deals: int, path: str, queue):
+    from modal_app.app import _propensity_columns, _run_propensity
+    from modal_app.benchmarks.suite import _measure
+    from modal_app.benchmarks.synthetic import deals_frame
+    from modal_app.lib.ingest import TableChunks
+
+    df, config = deals_frame(n_deals)
+    df.to_csv(path, index=False)
+    del df
+
+    with open(path, "rb") as source:
+        table = TableChunks(source, _propensity_columns(config))
+        result, fields = _measure(lambda: _run_propensity(table, config))
+    queue.put({"n_deals": n_deals, "auc": result["holdout"]["auc"], **fields})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("deals", type=int, nargs="*", default=[100_000, 1_000_000, 4_000_000])
+    args = parser.parse_args(argv)
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.deals:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_case, args=(n, os.path.join(tmp, "deals.csv"), queue))
+            proc.start()
+            r = queue.get()
+            proc.join()
+            print(
+                f"{r['n_deals']:>10,} deals: {r['seconds']:7.2f}s ({r['n_deals'] / r['seconds']:>9,.0f} deals/s)  "
+                f"peak {r['peak_rss_mb']:6.0f} MB (from {r['rss_before_mb']:.0f} MB)  hold-out AUC {r['auc']:.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
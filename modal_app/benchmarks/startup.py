@@ -0,0 +1,75 @@
+"""
+Container startup cost for JobProcessor against a local Supabase stand-in.
+
+Reports, for three paths, the time from "container starts handling the job"
+to the job's first progress write:
+
+  cold       fresh interpreter: Python start, imports, client, claim, download
+  preloaded  modules already imported, new client (what a memory snapshot
+             restore looks like: JobProcessor.load ran before the snapshot)
+  warm       second job in the same container
+
+plus the import time of PRELOAD_MODULES on its own.
+
+Run: python -m modal_app.benchmarks.startup [latency_ms]
+"""
+
+import json
+import subprocess
+import sys
+import time
+
+from modal_app.benchmarks.fake_supabase import FakeSupabase
+from modal_app.benchmarks.job_latency import make_csv
+
+CHILD = """
+import json, sys, time
+url, cold_job, preloaded_job, warm_job = sys.argv[1:5]
+
+import modal_app.app as modal_app
+modal_app._supabase_client = modal_app.SupabaseClient(url, "service-key")
+cold = modal_app.JobProcessor()
+cold.process_job.local(cold_job)
+
+# Same process, fresh processor + client: imports are already in memory
+modal_app._supabase_client = modal_app.SupabaseClient(url, "service-key")
+preloaded = modal_app.JobProcessor()
+preloaded_start = time.time()
+preloaded.process_job.local(preloaded_job)
+
+warm_start = time.time()
+preloaded.process_job.local(warm_job)
+print(json.dumps({
+    "import_seconds": cold.import_seconds,
+    "preloaded_start": preloaded_start,
+    "warm_start": warm_start,
+}))
+"""
+
+
+def main(latency_ms: int = 20):
+    server = FakeSupabase(latency=latency_ms / 1000).start()
+    try:
+        jobs = [server.add_job("survival_analysis", make_csv(time.perf_counter_ns())) for _ in range(3)]
+        start = time.time()
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, server.url, *jobs],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        child = json.loads(out.strip().splitlines()[-1])
+        first = server.first_progress_at
+        
+        print(f"{latency_ms} ms per request")
+        print(f"import PRELOAD_MODULES   {child['import_seconds'] * 1000:8.1f} ms")
+        for label, job_id, t0 in (
+            ("cold", jobs[0], start),
+            ("preloaded", jobs[1], child["preloaded_start"]),
+            ("warm", jobs[2], child["warm_start"]),
+        ):
+            print(f"{label:10s} first progress {(first[job_id] - t0) * 1000:8.1f} ms")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
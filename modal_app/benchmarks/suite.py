@@ -0,0 +1,271 @@
+"""
+Micro-benchmarks for ingestion, transform_data, run_analysis and each handler.
+
+Every case (format × customers × features) runs in a fresh spawned process on
+seeded synthetic data (benchmarks/synthetic.py). read_upload (the path
+process_job uses) spools and parses the case rendered as CSV; transform_data
+and the handlers start from the in-memory frame. Each stage records wall time,
+CPU time, resident memory before the stage and the stage's peak RSS (the
+kernel high-water mark is reset before every stage), plus the peak RSS of any
+worker processes it forked.
+
+Results are JSON lines: one "run" record (commit, versions, cores) followed by
+one "result" record per stage, so runs from different commits can be diffed.
+
+Run:     python -m modal_app.benchmarks.suite [--preset quick|full] [--out FILE]
+Compare: python -m modal_app.benchmarks.suite compare BASE.jsonl HEAD.jsonl
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+PRESETS = {
+    "quick": {"customers": [1_000, 100_000], "features": [10, 500]},
+    "full": {"customers": [1_000, 100_000, 1_000_000], "features": [10, 100, 1_000, 5_000]},
+}
+
+FORMATS = ("wide", "long")
+
+# Wide cases build a dense DataFrame; larger ones are recorded as skipped
+MAX_DENSE_CELLS = 50_000_000
+
+
+# -- memory --------------------------------------------------------------------
+
+def _status_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _reset_peak_rss():
+    """Reset VmHWM so the next reading covers only what follows (Linux >= 4.0)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass  # Peak then includes everything before the stage
+
+
+def _measure(fn) -> tuple:
+    """(fn(), timing/memory fields) for one stage."""
+    rss_before = _status_mb("VmRSS")
+    workers_before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    _reset_peak_rss()
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    out = fn()
+    seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - cpu_start
+
+    workers_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return out, {
+        "seconds": round(seconds, 4),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(_status_mb("VmHWM"), 1),
+        "worker_peak_rss_mb": round(workers_peak / 1024, 1) if workers_peak > workers_before else None,
+    }
+
+
+# -- cases ---------------------------------------------------------------------
+
+def _stage_selected(stage: str, stages) -> bool:
+    return not stages or any(stage == s or stage.startswith(s + ":") for s in stages)
+
+
+def _run_case(case: dict, stages, seed: int, queue):
+    """Put one record per stage on queue as it finishes, then None."""
+    from modal_app import app
+    from modal_app.benchmarks.synthetic import count_matrix, long_frame, wide_frame
+    from modal_app.lib.ingest import read_upload
+    from modal_app.lib.uploads import spool
+
+    emit = queue.put  # Stream records, so a crash loses only the running stage
+    try:
+        X = count_matrix(case["n_customers"], case["n_features"], seed=seed)
+        df, config = (wide_frame if case["format"] == "wide" else long_frame)(X)
+        del X
+
+        if _stage_selected("read_upload", stages):
+            csv = df.to_csv(index=False).encode()
+            def parse():
+                with spool([csv]) as upload:
+                    return read_upload(upload, config)
+
+            _, fields = _measure(parse)
+            emit({**case, "stage": "read_upload", "input_bytes": len(csv), **fields})
+            del csv
+
+        data, fields = _measure(lambda: app.transform_data(df, config))
+        if _stage_selected("transform_data", stages):
+            emit({**case, "stage": "transform_data", "input_rows": len(df), **fields})
+        del df
+
+        for job_type, handler in app.HANDLERS.items():
+            for stage, fn in (
+                (f"handler:{job_type}", lambda: handler(data, config)),
+                (f"run_analysis:{job_type}", lambda: app.run_analysis(job_type, data, column_config=config)),
+            ):
+                if not _stage_selected(stage, stages):
+                    continue
+                try:
+                    result, fields = _measure(fn)
+                    emit({**case, "stage": stage, **fields, "error": result.get("error")})
+                except Exception as e:
+                    emit({**case, "stage": stage, "error": f"{type(e).__name__}: {e}"})
+    except Exception as e:
+        emit({**case, "stage": "setup", "error": f"{type(e).__name__}: {e}"})
+
+    queue.put(None)
+
+
+def run_case(case: dict, stages=None, seed: int = 0) -> list:
+    """Result records for one case, measured in a fresh process."""
+    import queue as queue_module
+
+    if case["format"] == "wide" and case["n_customers"] * case["n_features"] > MAX_DENSE_CELLS:
+        return [{**case, "stage": "setup", "skipped": f"dense frame over {MAX_DENSE_CELLS:,} cells"}]
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(case, stages, seed, queue))
+    proc.start()
+
+    records = []
+    while True:
+        try:
+            record = queue.get(timeout=1.0)
+        except queue_module.Empty:
+            if proc.is_alive():
+                continue
+            # Died without its end marker, e.g. OOM-killed: drain what it sent, then report
+            try:
+                while (record := queue.get(timeout=1.0)) is not None:
+                    records.append(record)
+                break
+            except queue_module.Empty:
+                records.append({
+                    **case,
+                    "stage": "crash",
+                    "error": f"case process exited with code {proc.exitcode} (killed, e.g. out of memory?)",
+                })
+                break
+        if record is None:
+            break
+        records.append(record)
+
+    proc.join()
+    return records
+
+
+def run_info(preset: str, seed: int) -> dict:
+    import numpy as np
+    import pandas as pd
+    import scipy
+
+    from modal_app.jobs.poisson import available_cpus
+
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "kind": "run",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "preset": preset,
+        "seed": seed,
+        "cpus": available_cpus(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--customers", type=int, nargs="+", help="override the preset's customer counts")
+    parser.add_argument("--features", type=int, nargs="+", help="override the preset's feature counts")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--stages", nargs="+", help="e.g. read_upload transform_data handler:poisson_factorization run_analysis")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="append JSON lines here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    grid = PRESETS[args.preset]
+    out = open(args.out, "a") if args.out else sys.stdout
+
+    def emit(record):
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    try:
+        emit(run_info(args.preset, args.seed))
+        for format_type in args.formats:
+            for n_customers in args.customers or grid["customers"]:
+                for n_features in args.features or grid["features"]:
+                    case = {"kind": "result", "format": format_type, "n_customers": n_customers, "n_features": n_features}
+                    for record in run_case(case, args.stages, args.seed):
+                        emit(record)
+                        if out is not sys.stdout:
+                            _print_record(record)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def _print_record(r: dict):
+    label = f"{r['format']:4s} {r['n_customers']:>9,} x {r['n_features']:<5,} {r['stage']:34s}"
+    if "seconds" in r:
+        print(f"{label} {r['seconds']:9.3f}s  peak {r['peak_rss_mb']:8.0f} MB", file=sys.stderr)
+    else:
+        print(f"{label} {r.get('skipped') or r.get('error')}", file=sys.stderr)
+
+
+# -- comparison ----------------------------------------------------------------
+
+def _load(path: str) -> dict:
+    results = {}
+    with open(path) as f:
+        for line in f:
+            r = json.loads(line)
+            if r.get("kind") == "result" and "seconds" in r:
+                # Later runs in the same file win
+                results[(r["format"], r["n_customers"], r["n_features"], r["stage"])] = r
+    return results
+
+
+def compare(base_path: str, head_path: str):
+    """Print time and peak-memory ratios (head / base) for stages in both files."""
+    base, head = _load(base_path), _load(head_path)
+    print(f"{'case':52s} {'base s':>9s} {'head s':>9s} {'time':>7s} {'peak MB':>15s}")
+    for key in sorted(base.keys() & head.keys()):
+        b, h = base[key], head[key]
+        format_type, n_customers, n_features, stage = key
+        ratio = h["seconds"] / b["seconds"] if b["seconds"] else float("nan")
+        print(
+            f"{format_type:4s} {n_customers:>9,} x {n_features:<5,} {stage:30s} "
+            f"{b['seconds']:9.3f} {h['seconds']:9.3f} {ratio:6.2f}x "
+            f"{b['peak_rss_mb']:7.0f}->{h['peak_rss_mb']:<7.0f}"
+        )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["compare"]:
+        compare(*sys.argv[2:4])
+    else:
+        main()
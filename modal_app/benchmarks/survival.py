@@ -0,0 +1,33 @@
+"""
+Wall-clock for _run_survival (Kaplan-Meier per segment + Cox fit) by row count.
+
+Run: python -m modal_app.benchmarks.survival [n_customers ...] [--covariates 10]
+"""
+
+import argparse
+import time
+
+
+def main(argv=None):
+    from modal_app.app import _run_survival
+    from modal_app.benchmarks.synthetic import survival_frame
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("customers", type=int, nargs="*", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--covariates", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    for n in args.customers:
+        df, config = survival_frame(n, args.covariates)
+        start = time.perf_counter()
+        result = _run_survival(df, config)
+        seconds = time.perf_counter() - start
+        cox = result.get("cox", {})
+        print(
+            f"{n:>10,} customers x {args.covariates} covariates: {seconds:7.2f}s  "
+            f"({result['n_events']:,} events, Cox {cox.get('iterations')} Newton steps)"
+        )
+
+
+if __name__ == "__main__":
+    main()
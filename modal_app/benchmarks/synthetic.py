@@ -0,0 +1,175 @@
+"""
+Seeded synthetic inputs for the benchmarks.
+
+count_matrix draws a customers × features count matrix shaped like usage
+data: customer activity is gamma distributed, feature popularity follows a
+power law, and each customer touches a bounded number of features, so the
+matrix stays sparse at any width. wide_frame and long_frame render it the
+way the two upload formats look after parsing, with matching column_configs.
+
+The same (shape, seed) always produces the same data.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Average distinct features per customer (capped by the number of features)
+NNZ_PER_CUSTOMER = 20
+
+CUSTOMER_ID = "customer_id"
+
+
+def count_matrix(n_customers: int, n_features: int, nnz_per_customer: int = NNZ_PER_CUSTOMER, seed: int = 0):
+    """CSR int32 matrix of event counts with power-law feature popularity."""
+    import scipy.sparse as sp
+
+    rng = np.random.default_rng(seed)
+    per_row = min(nnz_per_customer, n_features)
+
+    popularity = 1.0 / np.arange(1, n_features + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+    activity = rng.gamma(0.5, 4.0, size=n_customers).astype(np.float32)
+
+    rows = np.repeat(np.arange(n_customers, dtype=np.int32), per_row)
+    cols = rng.choice(n_features, size=rows.size, p=popularity).astype(np.int32)
+    values = 1 + rng.poisson(activity[rows]).astype(np.int32)
+
+    X = sp.csr_matrix((values, (rows, cols)), shape=(n_customers, n_features), dtype=np.int32)
+    X.sum_duplicates()
+    return X
+
+
+def feature_names(n_features: int) -> list:
+    return [f"f{j}" for j in range(n_features)]
+
+
+def wide_frame(X) -> tuple:
+    """(DataFrame, column_config) for a wide upload: one column per feature."""
+    df = pd.DataFrame(X.toarray(), columns=feature_names(X.shape[1]))
+    df.insert(0, CUSTOMER_ID, np.arange(X.shape[0]))
+    config = {"format": "wide", "customerIdColumn": CUSTOMER_ID, "featureColumns": list(df.columns[1:])}
+    return df, config
+
+
+def long_frame(X) -> tuple:
+    """
+    (DataFrame, column_config) for a long upload: one row per nonzero cell.
+
+    Feature names are categorical so million-customer cases fit in memory;
+    factorizing them costs the same as for parsed strings.
+    """
+    coo = X.tocoo()
+    order = np.random.default_rng(0).permutation(coo.nnz)  # uploads are not sorted
+    df = pd.DataFrame({
+        CUSTOMER_ID: coo.row[order],
+        "feature": pd.Categorical.from_codes(coo.col[order], categories=feature_names(X.shape[1])),
+        "count": coo.data[order],
+    })
+    config = {
+        "format": "long",
+        "customerIdColumn": CUSTOMER_ID,
+        "featureNameColumn": "feature",
+        "featureValueColumn": "count",
+    }
+    return df, config
+
+
+def survival_frame(n_customers: int, n_covariates: int = 10, n_segments: int = 5, seed: int = 0) -> tuple:
+    """
+    (DataFrame, column_config) for a survival upload: one row per customer.
+
+    Churn times are exponential with a log-linear hazard in the covariates
+    (true coefficients spread over -0.5..0.5), censored by an independent
+    observation window, and rounded to whole days so tied times are common.
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_customers, n_covariates)).astype(np.float32)
+    beta = np.linspace(-0.5, 0.5, n_covariates)
+    churn = rng.exponential(1.0 / np.exp(X @ beta))
+    window = rng.exponential(2.0, size=n_customers)
+
+    df = pd.DataFrame(X, columns=[f"x{j}" for j in range(n_covariates)])
+    df.insert(0, CUSTOMER_ID, np.arange(n_customers))
+    df["tenure_days"] = np.round(np.minimum(churn, window) * 365)
+    df["churned"] = (churn <= window).astype(np.int8)
+    df["plan"] = pd.Categorical.from_codes(rng.integers(0, n_segments, n_customers), [f"plan_{s}" for s in range(n_segments)])
+    config = {
+        "customerIdColumn": CUSTOMER_ID,
+        "durationColumn": "tenure_days",
+        "eventColumn": "churned",
+        "segmentColumn": "plan",
+    }
+    return df, config
+
+
+def revenue_frame(n_rows: int, n_months: int = 24, seed: int = 0) -> tuple:
+    """
+    (DataFrame, column_config) for an NRR upload: customer-month revenue rows.
+
+    Customers start in a random month, then each month either churn (3%),
+    pause (2%, reactivating later) or change revenue by a lognormal factor.
+    Enough customers are drawn to give about n_rows rows; rows are shuffled.
+    """
+    rng = np.random.default_rng(seed)
+    n_customers = max(1, int(n_rows / (n_months * 0.25)))  # Over-draw, then keep n_rows
+    signup = rng.integers(0, n_months, n_customers)
+    months = np.arange(n_months)
+
+    # Per customer-month: active unless churned; revenue follows a random walk
+    churned = np.cumsum(rng.random((n_customers, n_months)) < 0.03, axis=1) > 0
+    paused = rng.random((n_customers, n_months)) < 0.02
+    growth = np.cumsum(rng.normal(0.0, 0.1, (n_customers, n_months)), axis=1)
+    active = (months >= signup[:, None]) & ~churned & ~paused
+
+    rows, cols = np.nonzero(active)
+    keep = rng.permutation(len(rows))[:n_rows]
+    rows, cols = rows[keep], cols[keep]
+    base = rng.gamma(2.0, 50.0, n_customers)
+    revenue = np.round(base[rows] * np.exp(growth[rows, cols]), 2)
+
+    df = pd.DataFrame({
+        CUSTOMER_ID: rows,
+        "month": (np.datetime64("2022-01", "M") + cols).astype("datetime64[ns]"),
+        "revenue": revenue,
+    })
+    config = {"customerIdColumn": CUSTOMER_ID, "periodColumn": "month", "revenueColumn": "revenue"}
+    return df, config
+
+
+def deals_frame(n_deals: int, seed: int = 0) -> tuple:
+    """
+    (DataFrame, column_config) for a propensity upload: one row per deal.
+
+    Win probability is logistic in deal size, sales cycle, source, region and
+    a high-cardinality owner column; 10% of deals are still open (blank outcome).
+    """
+    from scipy.special import expit
+
+    rng = np.random.default_rng(seed)
+    sources = np.array(["inbound", "outbound", "partner", "event"])
+    regions = np.array(["na", "emea", "apac", "latam"])
+    source, region = rng.integers(0, 4, n_deals), rng.integers(0, 4, n_deals)
+    owner = rng.integers(0, 500, n_deals)
+    amount = rng.lognormal(9.0, 1.0, n_deals)
+    cycle_days = rng.gamma(2.0, 30.0, n_deals)
+
+    logit = (
+        -0.5 - 0.4 * (np.log(amount) - 9.0) - 0.01 * (cycle_days - 60)
+        + np.array([0.8, -0.6, 0.4, 0.0])[source] + np.array([0.2, 0.0, -0.3, -0.1])[region]
+        + rng.normal(0.0, 0.5, 500)[owner]
+    )
+    won = rng.random(n_deals) < expit(logit)
+    outcome = np.where(won, "won", "lost").astype(object)
+    outcome[rng.random(n_deals) < 0.1] = None
+
+    df = pd.DataFrame({
+        "deal_id": np.arange(n_deals),
+        "amount": np.round(amount, 2),
+        "cycle_days": np.round(cycle_days),
+        "source": sources[source],
+        "region": regions[region],
+        "owner": np.char.add("rep_", owner.astype(str)),
+        "outcome": outcome,
+    })
+    config = {"dealIdColumn": "deal_id", "outcomeColumn": "outcome"}
+    return df, config
@@ -0,0 +1,100 @@
+"""
+Spool and parse throughput per upload format: CSV, gzip CSV, zstd CSV, Parquet.
+
+The same synthetic upload (benchmarks/ingest.py write_csv, with its unused
+columns) is encoded in each format, then fed to lib/uploads.py spool in
+download-sized chunks and parsed with read_upload, as process_job does. Each
+format runs in a fresh spawned process so peak RSS is not shared. Throughput
+is CSV-equivalent megabytes per second of spool + parse; "download" is what
+would cross the network.
+
+Run: python -m modal_app.benchmarks.upload_formats [target_mb] [wide|long]
+"""
+
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+FORMATS = ("csv", "gzip", "zstd", "parquet")
+
+# Bytes per chunk fed to spool, like SupabaseClient.iter_download
+DOWNLOAD_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def encode(csv_path: str, fmt: str) -> str:
+    """Write csv_path in fmt next to it; returns the new path."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    if fmt == "csv":
+        return csv_path
+    path = f"{csv_path}.{fmt}"
+    if fmt == "parquet":
+        reader = pacsv.open_csv(csv_path)
+        with pq.ParquetWriter(path, reader.schema, compression="zstd") as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+        return path
+    with open(csv_path, "rb") as source, pa.CompressedOutputStream(path, fmt) as out:
+        while block := source.read(DOWNLOAD_CHUNK_BYTES):
+            out.write(block)
+    return path
+
+
+def _run(path: str, format_type: str, queue):
+    from modal_app.benchmarks.ingest import _config
+    from modal_app.lib.ingest import read_upload
+    from modal_app.lib.uploads import spool
+
+    def chunks():
+        with open(path, "rb") as f:
+            while chunk := f.read(DOWNLOAD_CHUNK_BYTES):
+                yield chunk
+
+    start = time.perf_counter()
+    upload = spool(chunks())
+    spooled = time.perf_counter() - start
+    with upload:
+        start = time.perf_counter()
+        read_upload(upload, _config(format_type))
+        parsed = time.perf_counter() - start
+    queue.put((spooled, parsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def measure(path: str, format_type: str):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(path, format_type, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main(target_mb: int = 512, format_type: str = "wide"):
+    from modal_app.benchmarks.ingest import write_csv
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "upload.csv")
+        write_csv(csv_path, target_mb, format_type)
+        csv_mb = os.path.getsize(csv_path) / 1024 / 1024
+
+        print(f"{format_type} upload: {csv_mb:.0f} MB as CSV")
+        for fmt in FORMATS:
+            path = encode(csv_path, fmt)
+            download_mb = os.path.getsize(path) / 1024 / 1024
+            spooled, parsed, peak_mb = measure(path, format_type)
+            total = spooled + parsed
+            print(
+                f"{fmt:8s} download {download_mb:7.0f} MB  spool {spooled:6.2f}s  parse {parsed:6.2f}s  "
+                f"{csv_mb / total:7.0f} MB/s  peak RSS {peak_mb:6.0f} MB"
+            )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 512, *args[1:])
@@ -0,0 +1,280 @@
+"""
+Net revenue retention decomposed by cohort and period.
+
+Input is revenue per (customer, period) row, with periods as integer
+ordinals (consecutive periods differ by 1). Rows are sorted once by
+(customer, period) and duplicates summed; after that each customer's move
+from one period to the next is a comparison with the neighbouring row, so
+every component is a masked array expression. Amounts are accumulated with
+a single bincount onto a dense cohort × period × component grid.
+
+Components at period p, relative to p - 1 (cohort = first period with revenue):
+
+  start         revenue at p - 1 of customers active at p - 1
+  expansion     increase from customers active at p - 1 and p
+  contraction   decrease from customers active at p - 1 and p
+  churn         revenue at p - 1 of customers with none at p
+  reactivation  revenue at p of customers active before p - 1 but not at it
+  new           revenue at p of customers in their first active period
+
+  NRR(p) = (start + expansion - contraction - churn) / start
+  GRR(p) = (start - contraction - churn) / start
+
+Partials are plain sums over customers, so decomposing disjoint sets of
+customers separately and merging (NRRPartial.merge) gives the same grid as
+one pass over everything. Every row of a customer must be in the same part.
+Uploads arrive in no particular order, so rows read in chunks are first
+spilled to disk by a hash of the customer id (CustomerParts): each part then
+holds all rows of its customers, and is decomposed with only it in memory.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+COMPONENTS = ("start", "expansion", "contraction", "churn", "reactivation", "new")
+_START, _EXPANSION, _CONTRACTION, _CHURN, _REACTIVATION, _NEW = range(len(COMPONENTS))
+
+
+class NRRPartial:
+    """
+    Component sums on a dense grid: values[cohort - first, period - first, component].
+
+    Periods run from first to first + width - 1 on both axes.
+    """
+
+    def __init__(self, first: int, values):
+        self.first = first
+        self.values = values
+
+    @property
+    def width(self) -> int:
+        return self.values.shape[0]
+
+    @classmethod
+    def empty(cls, first: int, last: int) -> "NRRPartial":
+        width = last - first + 1
+        return cls(first, np.zeros((width, width, len(COMPONENTS))))
+
+    def merge(self, other: "NRRPartial") -> "NRRPartial":
+        """Sum of two partials, widened to cover both period ranges."""
+        first = min(self.first, other.first)
+        last = max(self.first + self.width, other.first + other.width) - 1
+        merged = NRRPartial.empty(first, last)
+        for part in (self, other):
+            lo = part.first - first
+            merged.values[lo:lo + part.width, lo:lo + part.width] += part.values
+        return merged
+
+
+def decompose(customers, periods, revenue, first: int, last: int) -> NRRPartial:
+    """
+    NRRPartial for these rows, on the grid first..last.
+
+    customers: integer codes; periods: integer ordinals within first..last;
+    revenue: floats. Net negative revenue in a period counts as none. No
+    churn is recorded after last, where the data ends.
+    """
+    order = np.lexsort((periods, customers))
+    c, t, r = customers[order], periods[order], revenue[order].astype(np.float64)
+
+    # One row per (customer, period), keeping only periods with revenue
+    if len(c):
+        starts = np.flatnonzero(np.r_[True, (c[1:] != c[:-1]) | (t[1:] != t[:-1])])
+        c, t, r = c[starts], t[starts], np.add.reduceat(r, starts)
+    active = r > 0
+    c, t, r = c[active], t[active], r[active]
+    n = len(c)
+
+    first_row = np.r_[True, c[1:] != c[:-1]] if n else np.zeros(0, dtype=bool)
+    cohort = t[np.maximum.accumulate(np.where(first_row, np.arange(n), 0))] if n else t
+    # Row i is followed by the same customer in the very next period
+    continues = np.r_[(c[1:] == c[:-1]) & (t[1:] == t[:-1] + 1), False] if n else first_row
+    continued = np.r_[False, continues[:-1]] if n else first_row
+    before_end = t < last
+
+    delta = np.zeros(n)
+    delta[continues] = r[1:][continues[:-1]] - r[continues]
+
+    entries = (
+        (_START, before_end, 1, r),
+        (_EXPANSION, continues & (delta > 0), 1, delta),
+        (_CONTRACTION, continues & (delta < 0), 1, -delta),
+        (_CHURN, ~continues & before_end, 1, r),
+        (_NEW, first_row, 0, r),
+        (_REACTIVATION, ~first_row & ~continued, 0, r),
+    )
+
+    width = last - first + 1
+    index, weights = [], []
+    for component, mask, shift, amount in entries:
+        cell = (cohort[mask] - first) * width + (t[mask] + shift - first)
+        index.append(cell * len(COMPONENTS) + component)
+        weights.append(amount[mask])
+
+    values = np.bincount(
+        np.concatenate(index),
+        weights=np.concatenate(weights),
+        minlength=width * width * len(COMPONENTS),
+    )
+    return NRRPartial(first, values.reshape(width, width, len(COMPONENTS)))
+
+
+def decompose_in_blocks(customers, periods, revenue, first: int, last: int, block_rows: int) -> NRRPartial:
+    """
+    decompose over blocks of whole customers (about block_rows rows each), merged.
+
+    Bounds the sort and mask temporaries to one block instead of every row.
+    """
+    order = np.argsort(customers, kind="stable")
+    sorted_customers = customers[order]
+    boundaries = np.flatnonzero(np.r_[True, sorted_customers[1:] != sorted_customers[:-1]])
+
+    total = NRRPartial.empty(first, last)
+    start = 0
+    while start < len(order):
+        # End on the first customer boundary at or past block_rows
+        cut = np.searchsorted(boundaries, start + block_rows)
+        end = boundaries[cut] if cut < len(boundaries) else len(order)
+        rows = order[start:end]
+        total = total.merge(decompose(customers[rows], periods[rows], revenue[rows], first, last))
+        start = end
+    return total
+
+
+def customer_keys(values):
+    """
+    Customer ids as an Arrow string array, whichever dtype a chunk of the
+    column was parsed with: 12 in an integer chunk and 12.0 in a chunk with
+    gaps are both "12". Missing ids are null.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    values = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_float_dtype(values):
+        present = values.dropna()
+        if (present == np.round(present)).all():
+            values = values.astype("Int64")
+    return pa.array(values, from_pandas=True).cast(pa.string())
+
+
+class CustomerParts:
+    """
+    (customer, period, revenue) rows spilled to n_parts Arrow files on disk,
+    split by a hash of the customer key so that every row of a customer is
+    in the same part. Iterating yields each part as (customer codes,
+    periods, revenue) arrays, one part in memory at a time.
+    """
+
+    def __init__(self, n_parts: int, directory: str = None):
+        import pyarrow as pa
+
+        self.n_parts = n_parts
+        self.schema = pa.schema([("customer", pa.string()), ("period", pa.int64()), ("revenue", pa.float64())])
+        self._dir = tempfile.TemporaryDirectory(prefix="nrr-", dir=directory)
+        self.paths = [os.path.join(self._dir.name, f"{i}.arrow") for i in range(n_parts)]
+        self._sinks = [pa.OSFile(path, "wb") for path in self.paths]
+        self._writers = [pa.ipc.new_stream(sink, self.schema) for sink in self._sinks]
+
+    def add(self, customers, periods, revenue):
+        """Append rows; customers are non-null customer_keys."""
+        import pandas as pd
+        import pyarrow as pa
+
+        hashes = pd.util.hash_array(customers.to_numpy(zero_copy_only=False), categorize=False)
+        part = hashes % np.uint64(self.n_parts)
+        order = np.argsort(part, kind="stable")
+        bounds = np.searchsorted(part[order], np.arange(self.n_parts + 1))
+        for i in np.flatnonzero(np.diff(bounds)):
+            rows = order[bounds[i]:bounds[i + 1]]
+            self._writers[i].write_batch(pa.record_batch(
+                [
+                    customers.take(pa.array(rows)),
+                    pa.array(periods[rows], pa.int64()),
+                    pa.array(revenue[rows], pa.float64()),
+                ],
+                schema=self.schema,
+            ))
+
+    def __iter__(self):
+        import pyarrow as pa
+
+        self._finish()
+        for path in self.paths:
+            table = pa.ipc.open_stream(pa.memory_map(path)).read_all()
+            customers = table.column("customer").combine_chunks().dictionary_encode().indices
+            yield customers.to_numpy(), table.column("period").to_numpy(), table.column("revenue").to_numpy()
+
+    def _finish(self):
+        for writer, sink in zip(self._writers, self._sinks):
+            writer.close()
+            sink.close()
+        self._writers = self._sinks = []
+
+    def close(self):
+        self._finish()
+        self._dir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rates(values) -> dict:
+    """NRR and GRR for component sums with a trailing component axis (NaN where start is 0)."""
+    start = values[..., _START]
+    kept = start - values[..., _CONTRACTION] - values[..., _CHURN]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "nrr": np.where(start > 0, (kept + values[..., _EXPANSION]) / start, np.nan),
+            "grr": np.where(start > 0, kept / start, np.nan),
+        }
+
+
+# Period units for date columns; integer period columns are used as they are
+FREQUENCIES = ("month", "quarter", "year")
+
+
+def period_ordinals(values, frequency: str = "month") -> tuple:
+    """
+    (integer ordinals, valid mask, label function) for a column of periods.
+
+    Dates are parsed once per distinct value rather than once per row, then
+    numbered so that consecutive months (quarters, years) differ by 1.
+    Integer columns are already ordinals. Missing or unparseable values are
+    marked invalid.
+    """
+    import pandas as pd
+
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown periodFrequency '{frequency}' (expected one of {list(FREQUENCIES)})")
+
+    codes, uniques = pd.factorize(values)
+    if not len(uniques):
+        return np.zeros(len(codes), dtype=np.int64), np.zeros(len(codes), dtype=bool), str
+    if pd.api.types.is_numeric_dtype(uniques) and not pd.api.types.is_bool_dtype(uniques):
+        numbers = np.asarray(uniques, dtype=np.float64)
+        valid_unique = np.isfinite(numbers) & (numbers == np.round(numbers))
+        ordinals_unique = np.where(valid_unique, numbers, 0).astype(np.int64)
+        label = str
+    else:
+        dates = pd.DatetimeIndex(pd.to_datetime(uniques, errors="coerce", format="mixed"))
+        valid_unique = ~dates.isna()
+        year = np.where(valid_unique, dates.year, 0).astype(np.int64)
+        month = np.where(valid_unique, dates.month, 1).astype(np.int64)
+        if frequency == "month":
+            ordinals_unique = year * 12 + month - 1
+            label = lambda o: f"{o // 12}-{o % 12 + 1:02d}"
+        elif frequency == "quarter":
+            ordinals_unique = year * 4 + (month - 1) // 3
+            label = lambda o: f"{o // 4}-Q{o % 4 + 1}"
+        else:
+            ordinals_unique = year
+            label = str
+
+    valid = (codes >= 0) & valid_unique[codes]
+    return ordinals_unique[codes], valid, label
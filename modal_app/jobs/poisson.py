@@ -0,0 +1,538 @@
+"""
+Poisson (KL-divergence) factorization and the rank sweep around it.
+
+X ~ Poisson(W @ H) is fitted with Lee-Seung multiplicative updates on one of
+two layouts, picked by density (as_count_matrix). Dense X may be float32, as
+parsed, and is then used without a copy; factors, rates and sums are float64. Sparse X is kept as CSR and
+the updates only touch its nonzero entries: the ratio X / (W @ H) is built on
+X's sparsity pattern, never as a dense n x m array. Dense-ish X (typical wide
+uploads) stays a dense array, where X / (W @ H) is a couple of BLAS products
+and beats per-nonzero gathers by a wide margin.
+
+The rank sweep fits one model per k in 1..max_k. The k range is split into
+contiguous chunks, one per worker process; inside a chunk each k warm-starts
+from the k-1 solution, and a chunk's first k from the highest rank already
+finished (or the exact rank-1 fit), grown by random components. With a stop
+rule (e.g. elbow_rank) the range is fitted in rounds of a few ranks per
+worker, and the sweep ends at the first round after which the rule is
+satisfied, so a high max_k costs little when the elbow comes early. X is
+copied once into shared memory and every worker maps it read-only. Workers
+come from a forkserver rather than a plain fork, because the caller has live
+threads (Supabase loop, progress, heartbeat) whose locks a forked child
+could inherit mid-acquire. Workers send back only H and the fit statistics;
+W is re-solved for the chosen k (solve_w).
+
+Scoring new customers against loadings H from an earlier fit (fold_in) only
+solves for W. With H fixed every customer's row is an independent problem,
+so rows are solved in blocks that bound the temporaries, and the cost is
+linear in the number of customers.
+
+Matrices too large for memory (a memory-mapped file from ingestion, or
+anything over the memory budget) are factorized out of core: the rank is
+chosen on a row sample (sample_rows), H is refined over row blocks with
+online multiplicative updates (refine_h), and W is folded in block by
+block. Only one block of X and its temporaries is in memory at a time.
+"""
+
+import os
+
+import numpy as np
+
+# Set in each worker by _attach: X mapped from the parent's shared memory.
+_SHARED_X = None
+_SHARED_BLOCKS = []
+
+# Below this much work (nonzeros, or cells of dense X) the pool start-up costs more than it saves.
+PARALLEL_MIN_NNZ = 200_000
+
+# Fraction of nonzero cells from which the dense updates are faster than CSR
+DENSE_MIN_DENSITY = 0.1
+
+# Sparse inputs are only densified up to this many cells (8 bytes each)
+DENSE_MAX_CELLS = 50_000_000
+
+# Cells of dense X (nonzeros of CSR X) per row block, when X is processed
+# block by block: fold-in and the out-of-core fit
+BLOCK_CELLS = 5_000_000
+
+# Out-of-core fit: cells in the row sample the rank is chosen on, passes of
+# mini-batch H updates, and W updates per block before each H update
+RANK_SAMPLE_CELLS = 5_000_000
+OUT_OF_CORE_EPOCHS = 3
+OUT_OF_CORE_W_ITER = 20
+
+# Ranks per worker per round when the sweep can stop early
+ROUND_KS_PER_WORKER = 2
+
+# W updates that fit a chunk's seed loadings before the chunk's first rank
+SEED_W_ITER = 20
+
+# Elbow rule: a rank must add at least this fraction of the k=1 -> 2 log-likelihood gain
+ELBOW_THRESHOLD = 0.1
+
+# Nonzeros per block when evaluating W @ H on X's pattern (bounds nnz x k temporaries).
+RATE_BLOCK = 1_000_000
+
+# Peak temporaries of one fit, per cell of dense X (rate, mask and the
+# per-nonzero log-likelihood arrays) and per nonzero of CSR X (rate, row
+# index, ratio and the log-likelihood arrays); see fit_memory_bytes
+DENSE_FIT_BYTES_PER_CELL = 40
+SPARSE_FIT_BYTES_PER_NNZ = 48
+
+EPS = 1e-10
+
+
+def available_cpus() -> int:
+    """Number of cores this container may actually run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def as_count_matrix(X):
+    """
+    Return X in the layout the updates run fastest on.
+
+    Dense enough inputs become (or stay) a C-contiguous array; C-contiguous
+    float32 or float64 input is returned without a copy. Everything else
+    becomes float64 CSR with duplicates summed and zeros dropped.
+    """
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        X = sp.csr_matrix(X, dtype=np.float64)
+        X.sum_duplicates()
+        X.eliminate_zeros()
+        cells = X.shape[0] * X.shape[1]
+        if X.nnz >= DENSE_MIN_DENSITY * cells and cells <= DENSE_MAX_CELLS:
+            return X.toarray()
+        return X
+
+    X = np.asarray(X)
+    X = np.ascontiguousarray(X, dtype=X.dtype if X.dtype in (np.float32, np.float64) else np.float64)
+    if np.count_nonzero(X) >= DENSE_MIN_DENSITY * X.size:
+        return X
+    return as_count_matrix(sp.csr_matrix(X))
+
+
+def fit_memory_bytes(X) -> int:
+    """Rough peak of one fit's temporaries on X (from as_count_matrix), excluding X itself."""
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        return X.nnz * SPARSE_FIT_BYTES_PER_NNZ
+    return X.size * DENSE_FIT_BYTES_PER_CELL
+
+
+def matrix_bytes(X) -> int:
+    """Bytes held by X's arrays (what a shared-memory copy of it takes)."""
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+def _work(X) -> int:
+    """Cells an update pass touches: nonzeros for CSR, every cell for dense X."""
+    import scipy.sparse as sp
+
+    return X.nnz if sp.issparse(X) else X.size
+
+
+def _rate_on_pattern(X, W, Ht):
+    """(W @ H)[i, j] for every stored (i, j) of X, in bounded blocks."""
+    rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+    cols = X.indices
+    rate = np.empty(X.nnz)
+    for start in range(0, X.nnz, RATE_BLOCK):
+        end = start + RATE_BLOCK
+        rate[start:end] = np.einsum("ik,ik->i", W[rows[start:end]], Ht[cols[start:end]])
+    return np.maximum(rate, EPS)
+
+
+def _rate(X, W, H):
+    """W @ H where the updates need it: on X's pattern for CSR, every cell for dense X."""
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        return _rate_on_pattern(X, W, np.ascontiguousarray(H.T))
+    rate = W @ H
+    return np.maximum(rate, EPS, out=rate)
+
+
+def _ratio(X, rate):
+    """X / (W @ H); CSR with X's sparsity pattern, or dense (overwriting rate)."""
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        return sp.csr_matrix((X.data / rate, X.indices, X.indptr), shape=X.shape)
+    return np.divide(X, rate, out=rate)
+
+
+def _observed(X, rate) -> tuple:
+    """(x, rate) over X's nonzero cells, x as float64; zero cells only enter through the total rate."""
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        return X.data, rate
+    nonzero = X > 0
+    return X[nonzero].astype(np.float64, copy=False), rate[nonzero]
+
+
+def poisson_log_likelihood(X, W, H, rate=None) -> float:
+    """Sum of log Poisson(x_ij | (W @ H)_ij) over all cells of X."""
+    from scipy.special import gammaln
+
+    if rate is None:
+        rate = _rate(X, W, H)
+    x, rate = _observed(X, rate)
+    total_rate = float(W.sum(axis=0) @ H.sum(axis=1))
+    return float(x @ np.log(rate)) - total_rate - float(gammaln(x + 1).sum())
+
+
+def kl_divergence(X, W, H, rate=None) -> float:
+    """Generalized KL divergence D(X || W @ H)."""
+    if rate is None:
+        rate = _rate(X, W, H)
+    x, rate = _observed(X, rate)
+    total_rate = float(W.sum(axis=0) @ H.sum(axis=1))
+    return float(x @ np.log(x / rate)) - float(x.sum()) + total_rate
+
+
+def _init_factors(X, k: int, W=None, H=None, seed: int = 42):
+    """
+    Copies of the given factors, with any missing one drawn as random
+    positive values scaled so W @ H matches X's mean.
+    """
+    rng = np.random.default_rng(seed)
+    scale = np.sqrt(max(X.sum(dtype=np.float64) / (X.shape[0] * X.shape[1]), EPS) / k)
+    W = scale * rng.uniform(0.5, 1.5, size=(X.shape[0], k)) if W is None else W.copy()
+    H = scale * rng.uniform(0.5, 1.5, size=(k, X.shape[1])) if H is None else H.copy()
+    return W, H
+
+
+def fit_kl(X, k: int, W=None, H=None, max_iter: int = 300, tol: float = 1e-4, update_h: bool = True) -> dict:
+    """
+    Fit X ~ Poisson(W @ H) with multiplicative updates.
+
+    X must come from as_count_matrix (CSR or dense). W and H, if given, are the warm
+    start; missing factors are initialised randomly. With update_h=False H
+    is held fixed and only W is solved for. Stops when the log-likelihood
+    improves by less than tol (relative) between checks.
+    """
+    W, H = _init_factors(X, k, W, H)
+
+    import scipy.sparse as sp
+
+    sparse = sp.issparse(X)
+    prev = None
+    for it in range(max_iter):
+        if update_h:
+            R = _ratio(X, _rate(X, W, H))
+            WtR = (R.T @ W).T if sparse else W.T @ R
+            H *= WtR / np.maximum(W.sum(axis=0), EPS)[:, None]
+
+        R = _ratio(X, _rate(X, W, H))
+        W *= (R @ H.T) / np.maximum(H.sum(axis=1), EPS)[None, :]
+
+        if it % 10 == 9:
+            loglik = poisson_log_likelihood(X, W, H)
+            if prev is not None and abs(loglik - prev) <= tol * abs(prev):
+                break
+            prev = loglik
+
+    rate = _rate(X, W, H)
+    return {
+        "k": k,
+        "W": W,
+        "H": H,
+        "log_likelihood": poisson_log_likelihood(X, W, H, rate=rate),
+        "error": kl_divergence(X, W, H, rate=rate),
+    }
+
+
+def solve_w(X, H, max_iter: int = 300, tol: float = 1e-4) -> dict:
+    """Fit only W for a fixed H; same result fields as fit_kl."""
+    return fit_kl(X, H.shape[0], H=H, max_iter=max_iter, tol=tol, update_h=False)
+
+
+def elbow_rank(log_likelihoods: list, threshold: float = ELBOW_THRESHOLD) -> tuple:
+    """
+    (k, confirmed) by the elbow rule, for log-likelihoods of k = 1, 2, ...
+
+    k is the last rank before the first one whose gain over k - 1 falls
+    below threshold times the k=1 -> 2 gain (or the last rank given, if none
+    does). confirmed is True once such a rank exists: fitting more ranks
+    cannot change k then.
+    """
+    improvements = [b - a for a, b in zip(log_likelihoods, log_likelihoods[1:])]
+    if not improvements:
+        return 1, False
+    cutoff = improvements[0] * threshold
+    for i, improvement in enumerate(improvements):
+        if improvement < cutoff:
+            return i + 1, True
+    return len(log_likelihoods), False
+
+
+def block_rows(X, cells: int = BLOCK_CELLS) -> int:
+    """Rows holding about cells cells (dense X) or nonzeros (CSR X)."""
+    per_row = _work(X) / max(X.shape[0], 1)
+    return max(1, int(cells / max(per_row, 1)))
+
+
+def _row_block(X, start: int, stop: int, columns=None):
+    """
+    Rows start:stop of X (and only columns, if given), ready for the updates.
+
+    Slices of in-memory X are used as they are; slices of a memory-mapped
+    X are read into memory and laid out by as_count_matrix.
+    """
+    block = X[start:stop]
+    mapped = isinstance(block, np.memmap)
+    if columns is not None:
+        block = block[:, columns]
+    return as_count_matrix(np.array(block)) if mapped else block
+
+
+def sample_rows(X, n_rows: int, seed: int = 0):
+    """A random n_rows-row sample of X (in file order), in memory and laid out by as_count_matrix."""
+    if n_rows >= X.shape[0]:
+        return as_count_matrix(np.array(X) if isinstance(X, np.memmap) else X)
+    rows = np.sort(np.random.default_rng(seed).choice(X.shape[0], size=n_rows, replace=False))
+    return as_count_matrix(np.array(X[rows]) if isinstance(X, np.memmap) else X[rows])
+
+
+def _fold_in_block(block, H, max_iter: int, tol: float) -> dict:
+    """fit_kl for W only, from W proportional to the row totals (all-zero rows stay 0)."""
+    k = H.shape[0]
+    totals = np.asarray(block.sum(axis=1, dtype=np.float64)).ravel()
+    W0 = np.repeat((totals / max(float(H.sum()), EPS))[:, None], k, axis=1)
+    return fit_kl(block, k, W=W0, H=H, max_iter=max_iter, tol=tol, update_h=False)
+
+
+def fold_in(X, H, rows: int = None, columns=None, max_iter: int = 300, tol: float = 1e-4) -> dict:
+    """
+    Non-negative scores W for the rows of X against fixed loadings H.
+
+    X is in-memory (from as_count_matrix) or memory-mapped; columns, if
+    given, picks X's columns matching H's. Each block of rows (default
+    block_rows(X)) runs the W multiplicative updates from W proportional to
+    the row totals, so that W @ H matches them. Returns W (float32, the
+    precision scores are stored in) with the log-likelihood and KL error
+    summed over blocks.
+    """
+    k = H.shape[0]
+    rows = rows or block_rows(X)
+    W = np.empty((X.shape[0], k), dtype=np.float32)
+    log_likelihood = error = 0.0
+    for start in range(0, X.shape[0], rows):
+        fit = _fold_in_block(_row_block(X, start, start + rows, columns), H, max_iter, tol)
+        W[start:start + rows] = fit["W"]
+        log_likelihood += fit["log_likelihood"]
+        error += fit["error"]
+    return {"k": k, "W": W, "H": H, "log_likelihood": log_likelihood, "error": error}
+
+
+def refine_h(X, H, rows: int = None, epochs: int = OUT_OF_CORE_EPOCHS, w_iter: int = OUT_OF_CORE_W_ITER, seed: int = 0):
+    """
+    Mini-batch H updates over row blocks of X (online multiplicative updates).
+
+    For each block, W is fitted against the current H (w_iter updates, as
+    in fold_in), then the H update's numerator H * (W' (X / WH)) and
+    denominator W' 1, both sums over rows, are added to running totals
+    that decay by 1 - 1/blocks per block. H is their ratio after every
+    block, so it moves within a pass while weighing about one pass of data.
+    Blocks are visited in a new random order each epoch.
+    """
+    import scipy.sparse as sp
+
+    rows = rows or block_rows(X)
+    starts = np.arange(0, X.shape[0], rows)
+    forget = 1.0 - 1.0 / len(starts)
+    rng = np.random.default_rng(seed)
+
+    H = H.copy()
+    numerator = np.zeros_like(H)
+    denominator = np.zeros((H.shape[0], 1))
+    for _ in range(epochs):
+        for start in rng.permutation(starts):
+            block = _row_block(X, start, start + rows)
+            W = _fold_in_block(block, H, max_iter=w_iter, tol=0.0)["W"]
+            R = _ratio(block, _rate(block, W, H))
+            WtR = (R.T @ W).T if sp.issparse(block) else W.T @ R
+            numerator = forget * numerator + H * WtR
+            denominator = forget * denominator + W.sum(axis=0)[:, None]
+            H = numerator / np.maximum(denominator, EPS)
+    return H
+
+
+def _chunk_ks(ks: list, n_chunks: int) -> list:
+    """Split consecutive ranks ks into n_chunks contiguous runs of near-equal length."""
+    n_chunks = max(1, min(n_chunks, len(ks)))
+    size, extra = divmod(len(ks), n_chunks)
+    chunks, start = [], 0
+    for i in range(n_chunks):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(ks[start:end])
+        start = end
+    return chunks
+
+
+def _grow(X, W, H):
+    """Pad a rank-k solution with one extra component for a k+1 warm start."""
+    k = W.shape[1] + 1
+    fill = np.sqrt(max(X.sum(dtype=np.float64) / (X.shape[0] * X.shape[1]), EPS) / k)
+    rng = np.random.default_rng(k)
+    W0 = np.hstack([W, fill * rng.uniform(0.5, 1.5, size=(W.shape[0], 1))])
+    H0 = np.vstack([H, fill * rng.uniform(0.5, 1.5, size=(1, H.shape[1]))])
+    return W0, H0
+
+
+def _rank_one(X) -> tuple:
+    """The exact rank-1 fit: W proportional to row totals, H to column totals over the grand total."""
+    rows = np.asarray(X.sum(axis=1, dtype=np.float64)).reshape(-1, 1)
+    columns = np.asarray(X.sum(axis=0, dtype=np.float64)).reshape(1, -1)
+    return np.maximum(rows, EPS), np.maximum(columns / max(float(rows.sum()), EPS), EPS)
+
+
+def _seed_factors(X, k: int, H=None) -> tuple:
+    """
+    Warm start for rank k: grown from loadings H of a lower rank, if given,
+    with W re-solved for them in SEED_W_ITER updates (as in fold_in), or
+    else from the exact rank-1 fit.
+    """
+    if H is None:
+        W, H = _rank_one(X)
+    else:
+        W = _fold_in_block(X, H, max_iter=SEED_W_ITER, tol=0.0)["W"]
+    while W.shape[1] < k:
+        W, H = _grow(X, W, H)
+    return W, H
+
+
+def _fit_chain(ks: list, seed_h=None, X=None, stop=None) -> list:
+    """
+    Fit consecutive ranks, warm-starting each from the previous one.
+
+    The first rank starts from _seed_factors(seed_h): the loadings of the
+    nearest lower rank fitted so far, if any. W only seeds the next rank
+    and is dropped from the returned fits. With stop, the chain ends after
+    the first fit for which stop(fits) is true.
+    """
+    X = _SHARED_X if X is None else X
+    fits = []
+    W, H = _seed_factors(X, ks[0], seed_h)
+    for k in ks:
+        if W.shape[1] < k:
+            W, H = _grow(X, W, H)
+        fit = fit_kl(X, k, W, H)
+        W, H = fit.pop("W"), fit["H"]
+        fits.append(fit)
+        if stop is not None and stop(fits):
+            break
+    return fits
+
+
+def _share(X) -> tuple:
+    """Copy X's arrays into shared memory; returns (spec for _attach, blocks to unlink)."""
+    from multiprocessing import shared_memory
+
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        arrays = {"data": X.data, "indices": X.indices, "indptr": X.indptr}
+    else:
+        arrays = {"dense": X}
+
+    spec = {"shape": X.shape, "arrays": {}}
+    blocks = []
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        spec["arrays"][name] = (block.name, array.shape, array.dtype.str)
+        blocks.append(block)
+    return spec, blocks
+
+
+def _attach(spec: dict):
+    """Worker initializer: rebuild X over the parent's shared memory, without copying."""
+    global _SHARED_X
+    import scipy.sparse as sp
+    from multiprocessing import shared_memory
+
+    try:
+        from threadpoolctl import threadpool_limits
+
+        threadpool_limits(1)  # The pool already runs one worker per core
+    except ImportError:
+        pass
+
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec["arrays"].items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _SHARED_BLOCKS.append(block)  # Keep the mapping alive for the worker's lifetime
+        arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+    if "dense" in arrays:
+        _SHARED_X = arrays["dense"]
+    else:
+        _SHARED_X = sp.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]), shape=spec["shape"], copy=False
+        )
+
+
+def fit_rank_sweep(X, max_k: int, n_jobs: int = None, stop=None) -> list:
+    """
+    Fit k = 1..max_k and return one dict per k with H, log-likelihood and error.
+
+    X may be dense or scipy.sparse. W is not returned (it is n x k per rank);
+    call solve_w(X, fit["H"]) for the rank you keep. Small inputs and
+    single-core containers run one warm-started chain in-process.
+
+    In parallel, each worker's chunk of ranks is a warm-started chain
+    whose first rank grows from the highest rank of the earlier rounds
+    (k = 1's exact fit in the first round), so no rank starts from random
+    factors.
+
+    stop(fits), if given, is checked as ranks complete (after every rank in
+    process, after every round of ROUND_KS_PER_WORKER ranks per worker in
+    parallel); once it is true no further ranks are fitted, and the fits
+    cover k = 1..j for some j <= max_k. In parallel the whole round that
+    satisfies it is fitted, so up to a round more ranks than in process:
+    the extra ranks run on cores that would otherwise idle.
+    """
+    X = as_count_matrix(X)
+    n_jobs = n_jobs or available_cpus()
+    n_jobs = min(n_jobs, max_k)
+    ks = list(range(1, max_k + 1))
+
+    if n_jobs <= 1 or _work(X) < PARALLEL_MIN_NNZ:
+        return _fit_chain(ks, X=X, stop=stop)
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload([__name__])  # Workers fork from a server with numpy/scipy loaded
+
+    round_size = len(ks) if stop is None else n_jobs * ROUND_KS_PER_WORKER
+    fits = []
+    spec, blocks = _share(X)
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=ctx, initializer=_attach, initargs=(spec,)) as pool:
+            for start in range(0, len(ks), round_size):
+                chunks = _chunk_ks(ks[start:start + round_size], n_jobs)
+                # Every chunk starts from the highest rank finished in earlier rounds
+                seed_h = fits[-1]["H"] if fits else None
+                results = pool.map(_fit_chain, chunks, [seed_h] * len(chunks))
+                fits = sorted(fits + [fit for chunk in results for fit in chunk], key=lambda f: f["k"])
+                if stop is not None and stop(fits):
+                    break
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return fits
@@ -0,0 +1,198 @@
+"""
+Win-probability model: logistic regression trained by streaming mini-batch SGD.
+
+The input is consumed in row chunks and nothing proportional to the number
+of rows is kept except the final scores, so training memory stays flat.
+
+Features are one-hot encoded with the hashing trick: each categorical value
+is hashed, salted by its column, into one of 2**HASH_BITS buckets, so no vocabulary
+pass is needed and the model size does not grow with the number of distinct
+values. Numeric columns are standardized with statistics from a first pass
+and clipped. Every row has the same number of nonzeros (one per feature
+column plus the intercept), so a chunk's CSR matrix is built directly from
+stacked column indices.
+
+Training uses AdaGrad steps on mini-batches, updating only the coordinates
+a batch touches (lazy L2), so a step costs O(batch × columns), not
+O(buckets). Rows are split into train and hold-out by a hash of their
+position, which is stable across the passes.
+"""
+
+import numpy as np
+
+HASH_BITS = 18
+
+# Fraction of labelled rows held out for AUC and calibration
+HOLDOUT_FRACTION = 0.2
+
+# Standardized numeric features are clipped to this many standard deviations
+CLIP_SD = 5.0
+
+
+def holdout_mask(row_numbers):
+    """Deterministic ~HOLDOUT_FRACTION sample of rows, by a multiplicative hash of the row number."""
+    hashed = (row_numbers.astype(np.uint64) * np.uint64(0x9E3779B1)) & np.uint64(0xFFFFFFFF)
+    return hashed < np.uint64(HOLDOUT_FRACTION * 2**32)
+
+
+class RunningMoments:
+    """Per-column count, mean and variance, merged chunk by chunk (Chan et al.)."""
+
+    def __init__(self, n_columns: int):
+        self.count = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def update(self, values):
+        """Fold in a (rows × columns) block; NaNs are skipped."""
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        mean = np.where(count > 0, np.nansum(values, axis=0) / np.maximum(count, 1), 0.0)
+        m2 = np.nansum((values - mean) ** 2, axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0.0)
+            self.m2 = self.m2 + m2 + np.where(total > 0, delta**2 * self.count * count / total, 0.0)
+        self.count = total
+
+    @property
+    def std(self):
+        std = np.sqrt(self.m2 / np.maximum(self.count, 1))
+        return np.where(std > 0, std, 1.0)
+
+
+class FeatureEncoder:
+    """Frame chunk -> CSR design matrix with a fixed column count."""
+
+    def __init__(self, categorical: list, numeric: list, mean, std, hash_bits: int = HASH_BITS):
+        import pandas as pd
+
+        self.categorical = categorical
+        self.numeric = numeric
+        self.mean = mean
+        self.std = std
+        self.n_buckets = 2**hash_bits
+        # Per-column salt, so equal values in different columns land in different buckets
+        self.salts = pd.util.hash_array(np.array(categorical, dtype=object)).astype(np.uint64)
+        self.n_features = self.n_buckets + len(numeric) + 1  # + intercept
+
+    def transform(self, frame):
+        import pandas as pd
+        import scipy.sparse as sp
+
+        n = len(frame)
+        indices, values = [], []
+        for col, salt in zip(self.categorical, self.salts):
+            hashed = pd.util.hash_array(frame[col].astype(str).to_numpy(dtype=object))
+            indices.append(((hashed ^ salt) % np.uint64(self.n_buckets)).astype(np.int64))
+            values.append(np.ones(n))
+        if self.numeric:
+            z = (numeric_block(frame, self.numeric) - self.mean) / self.std
+            z = np.clip(np.nan_to_num(z, nan=0.0), -CLIP_SD, CLIP_SD)  # Missing -> the mean
+            for j in range(len(self.numeric)):
+                indices.append(np.full(n, self.n_buckets + j))
+                values.append(z[:, j])
+        indices.append(np.full(n, self.n_features - 1))
+        values.append(np.ones(n))
+
+        per_row = len(indices)
+        return sp.csr_matrix(
+            (np.column_stack(values).ravel(), np.column_stack(indices).ravel(), np.arange(n + 1) * per_row),
+            shape=(n, self.n_features),
+        )
+
+
+def numeric_block(frame, columns: list):
+    """Columns coerced to a float64 (rows × columns) array, NaN where not numeric."""
+    import pandas as pd
+
+    out = np.empty((len(frame), len(columns)))
+    for j, col in enumerate(columns):
+        out[:, j] = pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return out
+
+
+class LogisticSGD:
+    """L2-regularized logistic regression with sparse AdaGrad mini-batch updates."""
+
+    def __init__(self, n_features: int, learning_rate: float = 0.1, l2: float = 1e-6):
+        self.w = np.zeros(n_features)
+        self.g2 = np.zeros(n_features)
+        self.learning_rate = learning_rate
+        self.l2 = l2
+
+    def decision(self, X):
+        return X @ self.w
+
+    def predict(self, X):
+        from scipy.special import expit
+
+        return expit(self.decision(X))
+
+    def partial_fit(self, X, y):
+        """One step on the batch (X CSR, y 0/1); only columns present in X move."""
+        residual = (self.predict(X) - y) / len(y)
+        touched, slot = np.unique(X.indices, return_inverse=True)
+        grad = np.bincount(slot, weights=X.data * np.repeat(residual, np.diff(X.indptr)), minlength=len(touched))
+        grad += self.l2 * self.w[touched]
+        self.g2[touched] += grad**2
+        self.w[touched] -= self.learning_rate * grad / (np.sqrt(self.g2[touched]) + 1e-8)
+
+
+def auc(y, scores):
+    """Area under the ROC curve (Mann-Whitney, ties counted half); None without both classes."""
+    from scipy.stats import rankdata
+
+    positives = int(y.sum())
+    negatives = len(y) - positives
+    if not positives or not negatives:
+        return None
+    ranks = rankdata(scores)
+    return float((ranks[y == 1].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def calibration(y, scores, n_bins: int = 10) -> dict:
+    """Reliability table over equal-width probability bins, plus Brier score, log loss and ECE."""
+    bins = np.minimum((scores * n_bins).astype(np.int64), n_bins - 1)
+    count = np.bincount(bins, minlength=n_bins)
+    predicted = np.bincount(bins, weights=scores, minlength=n_bins)
+    observed = np.bincount(bins, weights=y, minlength=n_bins)
+    nonempty = count > 0
+
+    p = np.clip(scores, 1e-15, 1 - 1e-15)
+    return {
+        "bins": [
+            {
+                "lower": i / n_bins,
+                "upper": (i + 1) / n_bins,
+                "n": int(count[i]),
+                "mean_predicted": float(predicted[i] / count[i]),
+                "observed_rate": float(observed[i] / count[i]),
+            }
+            for i in np.flatnonzero(nonempty)
+        ],
+        "brier": float(np.mean((scores - y) ** 2)),
+        "log_loss": float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))),
+        "expected_calibration_error": float(np.abs(predicted - observed)[nonempty].sum() / len(y)),
+    }
+
+
+WON_LABELS = {"1", "true", "yes", "won", "win", "closed won"}
+LOST_LABELS = {"0", "false", "no", "lost", "loss", "closed lost"}
+
+
+def outcome_labels(values):
+    """1.0 for won, 0.0 for lost, NaN for anything else (open deals, blanks)."""
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(values):
+        numbers = pd.to_numeric(values).to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(np.isnan(numbers), np.nan, (numbers != 0).astype(np.float64))
+
+    # Map each distinct label once
+    codes, uniques = pd.factorize(values)
+    words = pd.Index(uniques).astype(str).str.strip().str.lower()
+    mapped = np.where(words.isin(WON_LABELS), 1.0, np.where(words.isin(LOST_LABELS), 0.0, np.nan))
+    return np.where(codes >= 0, mapped[np.maximum(codes, 0)] if len(mapped) else np.nan, np.nan)
@@ -0,0 +1,106 @@
+"""
+Binary result artifacts: large arrays go to storage instead of jobs.result.
+
+Handlers put Artifact objects under the "artifacts" key of their result.
+store_artifacts uploads each one to the analysis-results bucket (tables as
+zstd-compressed Parquet, bare arrays as compressed .npz) and replaces it with
+a small pointer: bucket, path, format, size and shape. jobs.result then holds
+only summaries and pointers, so every poll of the row stays small, and
+clients fetch full per-customer scores only when they need them
+(load_artifact, or a signed URL from the web app).
+"""
+
+import io
+
+import numpy as np
+
+RESULTS_BUCKET = "analysis-results"
+
+CONTENT_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "npz": "application/octet-stream",
+}
+
+
+class Artifact:
+    """
+    A table (DataFrame) or ndarray to be written to storage with the result.
+
+    Tables keep their column names (and a named index, e.g. customer IDs);
+    arrays keep their dtype and shape.
+    """
+
+    def __init__(self, data, description: str = ""):
+        self.data = data
+        self.description = description
+
+    @property
+    def format(self) -> str:
+        return "npz" if isinstance(self.data, np.ndarray) else "parquet"
+
+    def encode(self) -> tuple:
+        """(file bytes, pointer fields describing the contents)."""
+        buffer = io.BytesIO()
+        if self.format == "npz":
+            np.savez_compressed(buffer, data=self.data)
+            fields = {"shape": list(self.data.shape), "dtype": str(self.data.dtype)}
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(self.data, preserve_index=self.data.index.name is not None)
+            pq.write_table(table, buffer, compression="zstd")
+            fields = {"rows": table.num_rows, "columns": table.column_names}
+        return buffer.getvalue(), fields
+
+
+def store_artifacts(storage, job_id: str, result: dict) -> dict:
+    """
+    Upload result["artifacts"] and return the result with pointers in their place.
+
+    Paths are <job_id>/<name>.<format>; uploads overwrite, so a job that is
+    retried or reclaimed replaces its earlier files. A multi-analysis result
+    stores each analysis's artifacts under <job_id>/<job_type>/.
+    """
+    if "analyses" in result:
+        result = {
+            **result,
+            "analyses": {
+                job_type: store_artifacts(storage, f"{job_id}/{job_type}", analysis)
+                for job_type, analysis in result["analyses"].items()
+            },
+        }
+    artifacts = result.get("artifacts")
+    if not artifacts:
+        return result
+
+    pointers = {}
+    for name, artifact in artifacts.items():
+        data, fields = artifact.encode()
+        path = f"{job_id}/{name}.{artifact.format}"
+        storage.from_(RESULTS_BUCKET).upload(
+            path,
+            data,
+            file_options={"content-type": CONTENT_TYPES[artifact.format], "upsert": "true"},
+        )
+        pointers[name] = {
+            "bucket": RESULTS_BUCKET,
+            "path": path,
+            "format": artifact.format,
+            "bytes": len(data),
+            "description": artifact.description,
+            **fields,
+        }
+    return {**result, "artifacts": pointers}
+
+
+def load_artifact(storage, pointer: dict):
+    """Download an artifact by its pointer: a DataFrame for Parquet, an ndarray for npz."""
+    data = storage.from_(pointer["bucket"]).download(pointer["path"])
+    if pointer["format"] == "npz":
+        with np.load(io.BytesIO(data)) as archive:
+            return archive["data"]
+
+    import pyarrow.parquet as pq
+
+    return pq.read_table(io.BytesIO(data)).to_pandas()
@@ -0,0 +1,80 @@
+"""
+Peak-memory budget for a job.
+
+Steps that allocate in proportion to the input (the parsed feature block,
+the factorization's temporaries, one more sweep worker) first check that
+the allocation fits: require() raises MemoryBudgetExceeded, which fails the
+job with a readable message, instead of letting the kernel OOM-kill the
+container and leave the job to time out.
+
+The budget is ANALYSIS_MEMORY_BUDGET_MB if set (0 turns the checks off),
+otherwise BUDGET_FRACTION of the container's cgroup memory limit. Without
+either there is no budget. Only resident memory of this process counts as
+used; estimates of what a step will allocate are the caller's.
+"""
+
+import os
+
+# Share of the cgroup limit jobs may plan for; the rest covers the
+# interpreter, client threads and estimation error
+BUDGET_FRACTION = 0.85
+
+_CGROUP_LIMITS = (
+    "/sys/fs/cgroup/memory.max",  # cgroup v2
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",  # cgroup v1
+)
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """A step would take the job past its memory budget."""
+
+
+def _cgroup_limit():
+    for path in _CGROUP_LIMITS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # "max" (v2) or a huge sentinel (v1) mean no limit
+        if value.isdigit() and int(value) < 2**60:
+            return int(value)
+    return None
+
+
+def budget_bytes():
+    """The job's memory budget in bytes, or None for no limit."""
+    configured = os.environ.get("ANALYSIS_MEMORY_BUDGET_MB")
+    if configured is not None:
+        mb = float(configured)
+        return int(mb * 1024 * 1024) if mb > 0 else None
+    limit = _cgroup_limit()
+    return int(limit * BUDGET_FRACTION) if limit else None
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def headroom():
+    """Bytes that may still be allocated under the budget, or None for no limit."""
+    budget = budget_bytes()
+    return None if budget is None else budget - rss_bytes()
+
+
+def require(nbytes: int, what: str):
+    """Raise MemoryBudgetExceeded unless nbytes more fit in the budget."""
+    room = headroom()
+    if room is None or nbytes <= room:
+        return
+    mb = 1024 * 1024
+    raise MemoryBudgetExceeded(
+        f"{what} needs about {nbytes / mb:,.0f} MB but only {max(room, 0) / mb:,.0f} MB "
+        f"of the {budget_bytes() / mb:,.0f} MB memory budget is free. "
+        "Select fewer feature columns or split the upload."
+    )
@@ -0,0 +1,94 @@
+"""
+Content-addressed cache of parsed uploads.
+
+Each upload is stored once, keyed by the SHA-256 of its bytes, as an
+uncompressed Arrow IPC file that later jobs memory-map instead of re-parsing
+the CSV. The directory is bounded by total size; the least recently used
+entries (by mtime, refreshed on every hit) are evicted first.
+
+In Modal the root is a Volume mount; locally any directory works.
+"""
+
+import hashlib
+import os
+import tempfile
+
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+SUFFIX = ".arrow"
+
+
+def content_hash(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class UploadCache:
+    """Directory of <sha256>.arrow files with size-based LRU eviction."""
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key + SUFFIX)
+
+    def get(self, key: str):
+        """Path of the cached entry, or None. Marks the entry as recently used."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, write) -> str:
+        """
+        Create the entry by calling write(tmp_path), then evict down to max_bytes.
+
+        The file is written under a temporary name and renamed into place, so
+        concurrent readers never see a partial entry.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, self.path_for(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.evict(keep=key)
+        return self.path_for(key)
+
+    def get_or_put(self, key: str, write):
+        """(path, hit) for key, creating the entry with write on a miss."""
+        path = self.get(key)
+        if path is not None:
+            return path, True
+        return self.put(key, write), False
+
+    def evict(self, keep: str = None):
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(SUFFIX) or name == f"{keep}{SUFFIX}":
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and os.path.exists(self.path_for(keep)):
+            total += os.path.getsize(self.path_for(keep))
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= size
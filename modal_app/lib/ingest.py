@@ -0,0 +1,617 @@
+"""
+CSV ingestion driven by column_config.
+
+Only the columns transform_data would keep are parsed (usecols), features are
+stored as float32, and the file is read in bounded-size chunks that are folded
+into the transformed matrix as they arrive. Wide uploads become one
+contiguous float32 block that dense_counts hands to the factorization as is.
+Blocks larger than the free memory budget (lib/budget.py), or over
+OUT_OF_CORE_CELLS where there is no budget, are written to a memory-mapped
+temporary file instead and returned as DiskCounts, which the analyses read
+in row blocks. Long-format
+uploads are accumulated straight into sparse triplets, so the full long
+frame never exists in memory.
+
+With an UploadCache (lib/cache.py), the CSV is converted once to an Arrow
+IPC file and every job memory-maps that instead of parsing text again.
+
+Uploads arrive as SpooledUploads (lib/uploads.py): CSV text or Parquet on
+local disk. Parquet skips text parsing altogether: only the configured
+columns are read, batch by batch, into the same builders.
+
+Row-oriented analyses (survival, NRR, propensity) skip the matrix: they get
+read_table, or TableChunks when they stream, with just the columns they name
+(read_upload_table picks the Parquet equivalents).
+"""
+
+import numpy as np
+import pandas as pd
+
+# Cells (rows × parsed columns) per chunk; bounds parser memory independent of file size
+CHUNK_CELLS = 2_000_000
+
+# Rows sniffed up front to validate columns and infer numeric features
+SAMPLE_ROWS = 1_000
+
+# Bytes per block when streaming CSV text into Arrow
+ARROW_BLOCK_BYTES = 16 * 1024 * 1024
+
+# Cells pd.read_csv reads as missing by default; the Arrow parse must agree
+NA_VALUES = (
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+)
+
+FEATURE_DTYPE = np.float32
+
+# Without a memory budget, wide uploads with more feature cells than this
+# are parsed to disk (DiskCounts); with one, the budget decides
+OUT_OF_CORE_CELLS = 50_000_000
+
+# Directory for DiskCounts files (None: the system temporary directory)
+SPILL_DIR = None
+
+
+class SparseCounts:
+    """
+    Customers × features count matrix kept in CSR form.
+
+    Produced for long-format uploads so that wide, mostly-empty matrices are
+    never densified. Exposes the bits of the DataFrame API that run_analysis
+    relies on (len, columns, index, shape).
+    """
+
+    def __init__(self, X, index, columns):
+        self.X = X
+        self.index = index
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    @property
+    def shape(self) -> tuple:
+        return self.X.shape
+
+
+class DiskCounts:
+    """
+    Customers × features FEATURE_DTYPE counts in a memory-mapped file.
+
+    Produced for wide uploads too large to hold in memory. Cells are
+    cleaned as they are written (NaN and negatives as 0), so X is ready for
+    the factorization's row blocks. The file is unlinked as soon as it is
+    mapped: it takes disk space only while X is referenced. Exposes the same
+    DataFrame bits as SparseCounts.
+    """
+
+    def __init__(self, X, index, columns):
+        self.X = X
+        self.index = index
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    @property
+    def shape(self) -> tuple:
+        return self.X.shape
+
+
+def _disk_matrix(shape: tuple) -> np.memmap:
+    """A FEATURE_DTYPE matrix mapped from an already unlinked temporary file."""
+    import shutil
+    import tempfile
+
+    nbytes = int(np.prod(shape)) * np.dtype(FEATURE_DTYPE).itemsize
+    directory = SPILL_DIR or tempfile.gettempdir()
+    free = shutil.disk_usage(directory).free
+    if nbytes > free:
+        mb = 1024 * 1024
+        raise OSError(
+            f"Parsing the feature columns to disk needs about {nbytes / mb:,.0f} MB but only "
+            f"{free / mb:,.0f} MB of local disk is free. Select fewer feature columns or split the upload."
+        )
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".f32") as f:
+        return np.memmap(f.name, dtype=FEATURE_DTYPE, mode="w+", shape=shape)
+
+
+def pivot_sparse(df, index_col: str, columns_col: str, values_col: str) -> SparseCounts:
+    """Sparse equivalent of pivot_table(aggfunc="sum", fill_value=0)."""
+    import scipy.sparse as sp
+
+    row_codes, index = pd.factorize(df[index_col], sort=True)
+    col_codes, columns = pd.factorize(df[columns_col], sort=True)
+    values = pd.to_numeric(df[values_col], errors="coerce").to_numpy(dtype=np.float64)
+
+    # pivot_table drops rows with a missing key or value
+    keep = (row_codes >= 0) & (col_codes >= 0) & ~np.isnan(values)
+    X = sp.csr_matrix(
+        (values[keep], (row_codes[keep], col_codes[keep])),
+        shape=(len(index), len(columns)),
+    )
+    X.sum_duplicates()
+
+    return SparseCounts(
+        X,
+        index=pd.Index(index, name=index_col),
+        columns=pd.Index(columns, name=columns_col),
+    )
+
+
+class _Codebook:
+    """Assigns stable integer codes to labels seen across chunks."""
+
+    def __init__(self):
+        self.labels = pd.Index([], dtype=object)
+
+    def encode(self, values) -> np.ndarray:
+        """Codes for values (-1 for missing), registering unseen labels."""
+        codes, uniques = pd.factorize(values)
+        known = self.labels.get_indexer(uniques)
+        unseen = known < 0
+        if unseen.any():
+            known[unseen] = np.arange(len(self.labels), len(self.labels) + unseen.sum())
+            new = pd.Index(uniques[unseen])
+            # Appending to an empty Index trips pandas' empty-concat FutureWarning
+            self.labels = self.labels.append(new) if len(self.labels) else new
+        return np.where(codes >= 0, known[codes], -1)
+
+    def sorted_order(self):
+        """(sorted labels, old code -> new code) to match pivot_table ordering."""
+        try:
+            order = self.labels.argsort()
+        except TypeError:
+            # Mixed label types (e.g. ints and strings): keep first-seen order
+            order = np.arange(len(self.labels))
+        remap = np.empty(len(order), dtype=np.int64)
+        remap[order] = np.arange(len(order))
+        return self.labels[order], remap
+
+
+def _numeric(frame) -> tuple:
+    """
+    (compact float values, per-column flag for non-numeric content).
+
+    A column is flagged when it holds text that is not a number, or is
+    boolean: the whole-file path would have read it as a non-numeric dtype,
+    which the analyses drop (select_dtypes). Flagged cells become NaN here.
+    """
+    values = np.empty(frame.shape, dtype=FEATURE_DTYPE)
+    non_numeric = np.zeros(frame.shape[1], dtype=bool)
+    for i, col in enumerate(frame.columns):
+        column = frame[col]
+        if pd.api.types.is_bool_dtype(column):
+            non_numeric[i] = True
+        elif not pd.api.types.is_numeric_dtype(column):
+            coerced = pd.to_numeric(column, errors="coerce")
+            non_numeric[i] = bool((coerced.isna() & column.notna()).any())
+            column = coerced
+        values[:, i] = column.to_numpy(dtype=FEATURE_DTYPE, na_value=np.nan)
+    return values, non_numeric
+
+
+def read_spec(sample, column_config: dict) -> dict:
+    """
+    Validate column_config against a sample of the file and derive read options.
+
+    Raises the same errors transform_data does for missing columns.
+    """
+    format_type = column_config.get("format", "wide")
+    customer_id_col = column_config.get("customerIdColumn")
+
+    if not customer_id_col or customer_id_col not in sample.columns:
+        raise ValueError(f"Customer ID column '{customer_id_col}' not found in data")
+
+    if format_type == "wide":
+        feature_cols = column_config.get("featureColumns", [])
+        if not feature_cols:
+            # Use all numeric columns except customer ID
+            feature_cols = [c for c in sample.select_dtypes(include=["number"]).columns
+                          if c != customer_id_col]
+
+        missing = [c for c in feature_cols if c not in sample.columns]
+        if missing:
+            raise ValueError(f"Feature columns not found: {missing}")
+
+        return {
+            "format": "wide",
+            "customer_id_col": customer_id_col,
+            "feature_cols": list(feature_cols),
+            "usecols": [customer_id_col] + list(feature_cols),
+            "dtype": {},
+        }
+
+    elif format_type == "long":
+        feature_name_col = column_config.get("featureNameColumn")
+        feature_value_col = column_config.get("featureValueColumn")
+
+        if not feature_name_col or feature_name_col not in sample.columns:
+            raise ValueError(f"Feature name column '{feature_name_col}' not found")
+        if not feature_value_col or feature_value_col not in sample.columns:
+            raise ValueError(f"Feature value column '{feature_value_col}' not found")
+
+        return {
+            "format": "long",
+            "customer_id_col": customer_id_col,
+            "feature_name_col": feature_name_col,
+            "feature_value_col": feature_value_col,
+            "usecols": [customer_id_col, feature_name_col, feature_value_col],
+            # Event names repeat heavily; categories keep each chunk small
+            "dtype": {feature_name_col: "category"},
+        }
+
+    else:
+        raise ValueError(f"Unknown format type: {format_type}")
+
+
+def _count_lines(source) -> int:
+    """Upper bound on data rows in a seekable file (quoted newlines overcount)."""
+    # Read in slices: getbuffer() would make BytesIO copy the whole download
+    lines = 1
+    while block := source.read(64 * 1024 * 1024):
+        lines += block.count(b"\n")
+    source.seek(0)
+    return lines
+
+
+def _build_wide(chunks, spec: dict, max_rows: int):
+    from modal_app.lib.budget import headroom
+
+    feature_cols = spec["feature_cols"]
+    ids = []
+    cells = max_rows * len(feature_cols)
+    room = headroom()
+    on_disk = cells * np.dtype(FEATURE_DTYPE).itemsize > room if room is not None else cells > OUT_OF_CORE_CELLS
+
+    # Fill one preallocated block instead of concatenating chunk copies
+    shape = (max_rows, len(feature_cols))
+    values = _disk_matrix(shape) if on_disk else np.empty(shape, dtype=FEATURE_DTYPE)
+    non_numeric = np.zeros(len(feature_cols), dtype=bool)
+    n = 0
+    for chunk in chunks:
+        block, flagged = _numeric(chunk[feature_cols])
+        if on_disk:
+            # Cleaned on the way in, so the file is never rewritten
+            np.fmax(block, 0, out=block)
+        values[n:n + len(chunk)] = block
+        non_numeric |= flagged
+        # A copy: the column can be a view of the chunk's 2-D block, which would keep every chunk alive
+        ids.append(chunk[spec["customer_id_col"]].to_numpy(copy=True))
+        n += len(chunk)
+
+    values = values[:n]
+    if non_numeric.any():
+        # Same outcome as the whole-file read: non-numeric features are not analysed
+        dropped = [c for c, bad in zip(feature_cols, non_numeric) if bad]
+        print(f"Dropping non-numeric feature columns: {dropped}")
+        values = _drop_columns(values, non_numeric) if on_disk else values[:, ~non_numeric]
+        feature_cols = [c for c, bad in zip(feature_cols, non_numeric) if not bad]
+
+    index = pd.Index(np.concatenate(ids) if ids else [], name=spec["customer_id_col"])
+    if on_disk:
+        print(f"Parsed {n:,} × {len(feature_cols)} features to disk")
+        return DiskCounts(values, index, pd.Index(feature_cols))
+    return pd.DataFrame(values, index=index, columns=feature_cols, copy=False)
+
+
+def _drop_columns(values: np.memmap, drop) -> np.memmap:
+    """values without the dropped columns, copied to a new file in row blocks."""
+    kept = _disk_matrix((values.shape[0], int((~drop).sum())))
+    rows = max(1, CHUNK_CELLS // max(1, values.shape[1]))
+    for start in range(0, values.shape[0], rows):
+        kept[start:start + rows] = values[start:start + rows][:, ~drop]
+    return kept
+
+
+def numeric_columns(frame) -> list:
+    """Columns select_dtypes(include=["number"]) would keep, without building the selection."""
+    return [
+        col for col, dtype in frame.dtypes.items()
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+    ]
+
+
+def dense_counts(frame) -> np.ndarray:
+    """
+    The frame's numeric columns as a C-contiguous FEATURE_DTYPE array, NaN and negatives set to 0.
+
+    A frame from _build_wide already is that block: it is cleaned in place
+    and returned without a copy. Any other frame is copied once, column by
+    column, into a new block.
+    """
+    values = frame.to_numpy(copy=False) if len(frame.dtypes.unique()) == 1 else None
+    if values is None or values.dtype != FEATURE_DTYPE or not values.flags.c_contiguous or not values.flags.writeable:
+        numeric = numeric_columns(frame)
+        values = np.empty((len(frame), len(numeric)), dtype=FEATURE_DTYPE)
+        for j, col in enumerate(numeric):
+            values[:, j] = frame[col].to_numpy(dtype=FEATURE_DTYPE, na_value=np.nan)
+    # fmax returns the non-NaN argument, so this fills NaN and clips in one pass
+    return np.fmax(values, 0, out=values)
+
+
+def _build_long(chunks, spec: dict) -> SparseCounts:
+    import scipy.sparse as sp
+
+    customers, features = _Codebook(), _Codebook()
+    rows, cols, vals = [], [], []
+
+    for chunk in chunks:
+        r = customers.encode(chunk[spec["customer_id_col"]])
+        c = features.encode(chunk[spec["feature_name_col"]].astype(object))
+        v = pd.to_numeric(chunk[spec["feature_value_col"]], errors="coerce").to_numpy(dtype=np.float64)
+
+        # pivot_table drops rows with a missing key or value
+        keep = (r >= 0) & (c >= 0) & ~np.isnan(v)
+        if not keep.any():
+            continue
+
+        # Sum duplicates within the chunk before keeping the triplets
+        block = sp.coo_matrix((v[keep], (r[keep], c[keep])), shape=(r.max() + 1, c.max() + 1)).tocsr().tocoo()
+        rows.append(block.row.astype(np.int32))
+        cols.append(block.col.astype(np.int32))
+        vals.append(block.data.astype(FEATURE_DTYPE))
+
+    index, row_remap = customers.sorted_order()
+    columns, col_remap = features.sorted_order()
+
+    if rows:
+        r, c, v = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+    else:
+        r = c = np.empty(0, dtype=np.int32)
+        v = np.empty(0, dtype=FEATURE_DTYPE)
+
+    X = sp.csr_matrix(
+        (v.astype(np.float64), (row_remap[r], col_remap[c])),
+        shape=(len(index), len(columns)),
+    )
+    X.sum_duplicates()
+
+    return SparseCounts(
+        X,
+        index=pd.Index(index, name=spec["customer_id_col"]),
+        columns=pd.Index(columns, name=spec["feature_name_col"]),
+    )
+
+
+def read_csv_transformed(source, column_config: dict, chunksize: int = None):
+    """
+    Parse a CSV file object straight into the transform_data output.
+
+    source must be seekable: a small sample is read first to validate the
+    column mapping, then the file is re-read in chunks with only the needed
+    columns.
+    """
+    sample = pd.read_csv(source, nrows=SAMPLE_ROWS)
+    spec = read_spec(sample, column_config)
+    del sample
+    source.seek(0)
+    max_rows = _count_lines(source) if spec["format"] == "wide" else None
+
+    chunksize = chunksize or max(10_000, CHUNK_CELLS // len(spec["usecols"]))
+    chunks = pd.read_csv(
+        source,
+        usecols=spec["usecols"],
+        dtype=spec["dtype"],
+        chunksize=chunksize,
+    )
+
+    if spec["format"] == "wide":
+        return _build_wide(chunks, spec, max_rows)
+    return _build_long(chunks, spec)
+
+
+def csv_to_arrow(source_path: str, dest_path: str):
+    """
+    Stream a CSV file into an uncompressed Arrow IPC file (memory-mappable).
+
+    Missing cells are the ones pd.read_csv treats as missing (NA_VALUES, in
+    string columns too), so a cached parse matches an uncached one.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    reader = pacsv.open_csv(
+        pa.memory_map(source_path),
+        read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_BYTES),
+        convert_options=pacsv.ConvertOptions(null_values=list(NA_VALUES), strings_can_be_null=True),
+    )
+    with pa.OSFile(dest_path, "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+
+
+def read_arrow_transformed(path: str, column_config: dict, chunksize: int = None):
+    """Memory-map a cached Arrow file and build the transform_data output from it."""
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    # Columns with no values at all are float in pd.read_csv, null in Arrow
+    table = table.cast(pa.schema([
+        field.with_type(pa.float64()) if pa.types.is_null(field.type) else field
+        for field in table.schema
+    ]))
+    spec = read_spec(table.schema.empty_table().to_pandas(), column_config)
+    table = table.select(spec["usecols"])
+
+    chunksize = chunksize or max(10_000, CHUNK_CELLS // len(spec["usecols"]))
+    chunks = (batch.to_pandas() for batch in table.to_batches(max_chunksize=chunksize))
+
+    if spec["format"] == "wide":
+        return _build_wide(chunks, spec, table.num_rows)
+    return _build_long(chunks, spec)
+
+
+def _parquet_chunks(parquet, columns: list, chunksize: int):
+    """
+    DataFrames of about chunksize rows from a ParquetFile, reading only columns.
+
+    Batches never span row groups, so files written in small row groups
+    yield small batches; they are coalesced, as per-chunk costs (label
+    lookups, block copies) would otherwise dominate.
+    """
+    import pyarrow as pa
+
+    pending, rows = [], 0
+    for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= chunksize:
+            yield pa.Table.from_batches(pending).to_pandas()
+            pending, rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+
+def read_parquet_transformed(path: str, column_config: dict, chunksize: int = None):
+    """Build the transform_data output from a Parquet file, reading only the configured columns."""
+    import pyarrow.parquet as pq
+
+    spec = read_spec(pq.read_schema(path).empty_table().to_pandas(), column_config)
+    # Event names as dictionary arrays: categorical chunks, as with the CSV reader's dtype
+    parquet = pq.ParquetFile(path, read_dictionary=[c for c in spec["dtype"]])
+
+    chunksize = chunksize or max(10_000, CHUNK_CELLS // len(spec["usecols"]))
+    chunks = _parquet_chunks(parquet, spec["usecols"], chunksize)
+
+    if spec["format"] == "wide":
+        return _build_wide(chunks, spec, parquet.metadata.num_rows)
+    return _build_long(chunks, spec)
+
+
+def read_upload(upload, column_config: dict, cache=None):
+    """
+    Parse a SpooledUpload into the transform_data output.
+
+    Parquet is read column by column as it is. For CSV with a cache, the
+    Arrow copy is looked up by content hash (and created on a miss); CSVs
+    Arrow cannot parse fall back to the chunked pandas reader.
+    """
+    if upload.format == "parquet":
+        return read_parquet_transformed(upload.path, column_config)
+
+    if cache is not None:
+        import pyarrow as pa
+
+        key = upload.sha256
+        try:
+            path, hit = cache.get_or_put(key, lambda tmp: csv_to_arrow(upload.path, tmp))
+            print(f"Upload cache {'hit' if hit else 'miss'}: {key[:12]}")
+            return read_arrow_transformed(path, column_config)
+        except pa.ArrowInvalid as e:
+            print(f"Upload cache skipped, Arrow could not parse CSV: {e}")
+
+    with upload.open() as source:
+        return read_csv_transformed(source, column_config)
+
+
+def read_table(source, columns=None) -> pd.DataFrame:
+    """
+    Parse a CSV file object as a plain table, keeping only columns (all if None).
+
+    For analyses that work on rows (durations, revenue lines, deals) rather
+    than the customer × feature matrix. Raises ValueError listing configured
+    columns the file lacks.
+    """
+    columns = _table_columns(source, columns)
+    return pd.read_csv(source, usecols=columns)
+
+
+def _table_columns(source, columns) -> list:
+    """Validate columns against the file's header (all of them if None); rewinds source."""
+    header = list(pd.read_csv(source, nrows=0).columns)
+    source.seek(0)
+    return _check_columns(header, columns)
+
+
+def _check_columns(header: list, columns) -> list:
+    if columns is None:
+        return header
+    columns = list(dict.fromkeys(columns))
+    missing = [c for c in columns if c not in header]
+    if missing:
+        raise ValueError(f"Columns not found: {missing}")
+    return columns
+
+
+class TableChunks:
+    """
+    A CSV table read in row chunks, for analyses that stream over their input.
+
+    Every iteration re-reads the file from the start, so a handler can make
+    several passes (e.g. statistics, training epochs, scoring) while holding
+    only one chunk at a time. len() is the row count, known after the first
+    full pass.
+    """
+
+    def __init__(self, source, columns=None, chunksize: int = None):
+        self.source = source
+        self.columns = _table_columns(source, columns)
+        self.chunksize = chunksize or max(10_000, CHUNK_CELLS // max(1, len(self.columns)))
+        self._rows = None
+
+    def __iter__(self):
+        self.source.seek(0)
+        rows = 0
+        for chunk in pd.read_csv(self.source, usecols=self.columns, chunksize=self.chunksize):
+            rows += len(chunk)
+            yield chunk
+        self._rows = rows
+
+    def __len__(self) -> int:
+        if self._rows is None:
+            for _ in self:
+                pass
+        return self._rows
+
+
+class ParquetChunks:
+    """
+    TableChunks for a Parquet file: row batches of only the named columns.
+
+    Passes re-read the column chunks rather than re-parsing text, and len()
+    comes from the file's metadata without a pass.
+    """
+
+    def __init__(self, path: str, columns=None, chunksize: int = None):
+        import pyarrow.parquet as pq
+
+        self.file = pq.ParquetFile(path)
+        self.columns = _check_columns(self.file.schema_arrow.names, columns)
+        self.chunksize = chunksize or max(10_000, CHUNK_CELLS // max(1, len(self.columns)))
+
+    def __iter__(self):
+        return _parquet_chunks(self.file, self.columns, self.chunksize)
+
+    def __len__(self) -> int:
+        return self.file.metadata.num_rows
+
+
+def read_upload_table(upload, columns=None, streamed: bool = False):
+    """
+    read_table (or TableChunks, if streamed) for a SpooledUpload, CSV or Parquet.
+
+    A streamed CSV keeps its file open for later passes.
+    """
+    if upload.format == "parquet":
+        if streamed:
+            return ParquetChunks(upload.path, columns)
+        import pyarrow.parquet as pq
+
+        file = pq.ParquetFile(upload.path)
+        return file.read(columns=_check_columns(file.schema_arrow.names, columns)).to_pandas()
+
+    if streamed:
+        return TableChunks(upload.open(), columns)
+    with upload.open() as source:
+        return read_table(source, columns)
+
+
+def iter_chunks(table, chunksize: int):
+    """Row chunks of a TableChunks or ParquetChunks, or slices of an in-memory DataFrame."""
+    if isinstance(table, (TableChunks, ParquetChunks)):
+        yield from table
+        return
+    for start in range(0, len(table), chunksize):
+        yield table.iloc[start:start + chunksize]
@@ -0,0 +1,54 @@
+"""
+Keys for result memoization.
+
+A finished job's result is reused when the input bytes, job type, column
+mapping and handler version all match. The key is stored on the job row
+(jobs.result_key), so lookups are a single indexed query.
+"""
+
+import hashlib
+import json
+
+# column_config keys each format actually reads; the other format's keys are ignored
+_FORMAT_KEYS = {
+    "wide": ("customerIdColumn", "featureColumns"),
+    "long": ("customerIdColumn", "featureNameColumn", "featureValueColumn"),
+}
+_ALL_FORMAT_KEYS = {key for keys in _FORMAT_KEYS.values() for key in keys}
+
+
+def normalize_column_config(column_config) -> dict:
+    """
+    Drop defaults, empties and keys the chosen format never reads.
+
+    Keys outside the format mappings (analysis settings such as
+    durationColumn or maxFactors) are always kept: they change the result.
+    """
+    if not column_config:
+        return {}
+
+    format_type = column_config.get("format", "wide")
+    read = _FORMAT_KEYS.get(format_type, ())
+    normalized = {"format": format_type}
+    for key in sorted(column_config):
+        if key == "format" or (key in _ALL_FORMAT_KEYS and key not in read):
+            continue
+        value = column_config.get(key)
+        if value not in (None, "", []):
+            normalized[key] = value
+    return normalized
+
+
+def result_cache_key(input_hash: str, job_type: str, column_config, handler_version: str) -> str:
+    """Canonical SHA-256 key for (input, job_type, column_config, handler version)."""
+    payload = json.dumps(
+        {
+            "input": input_hash,
+            "job_type": job_type,
+            "column_config": normalize_column_config(column_config),
+            "handler_version": handler_version,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
@@ -0,0 +1,173 @@
+"""
+What a job will need, and what the container it runs in was given.
+
+trigger sizes each job before anything is spawned. It reads the first bytes
+of the upload and the object's total size (one ranged request), and
+estimate_input() turns them into rows × features: rows from the sample's
+bytes per line, features from the header (or the columns the analysis
+reads). Each handler registers resource hints next to HANDLERS in app.py
+(HANDLER_RESOURCES), which estimate_cost() scales to seconds and peak
+memory on a number of cores. choose_route() then picks the first route
+(smallest first) that covers the estimate:
+
+  inline    processed inside the trigger call: no spawn, no second container
+  standard  JobProcessor
+  large     JobProcessor with more cores, memory and time
+
+Compressed and Parquet uploads hide their rows, so they are sized from the
+transfer size times a typical expansion. Estimates only steer routing;
+lib/budget.py still guards the run itself.
+
+Modal reserves cores through the container's CPU quota, while
+os.cpu_count() and the affinity mask report every core of the host. BLAS
+and OpenMP size their thread pools from the latter, so allocated_cpus()
+reads the quota (and ANALYSIS_CPUS, which each route sets to the cores it
+requests) and limit_threads() caps the pools to it.
+"""
+
+import math
+import os
+
+from modal_app.lib.budget import BUDGET_FRACTION
+from modal_app.lib.uploads import sniff
+
+# Environment read by BLAS/OpenMP libraries when they start (e.g. in worker processes)
+THREAD_ENV = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+_CGROUP_QUOTAS = (
+    "/sys/fs/cgroup/cpu.max",  # cgroup v2: "<quota> <period>" or "max <period>"
+    "/sys/fs/cgroup/cpu/cpu.cfs_quota_us",  # cgroup v1, with cpu.cfs_period_us
+)
+
+# Parsed size of an upload per transferred byte, where the head cannot tell
+EXPANSION = {"gzip": 5.0, "zstd": 5.0, "parquet": 4.0}
+
+# Bytes of CSV text per cell, for uploads sized without a CSV sample
+CSV_BYTES_PER_CELL = 4.0
+
+# Bytes read from the start of an upload to size it
+HEAD_BYTES = 64 * 1024
+
+# Cost of any job before its input: claim, download round trips, the
+# interpreter and preloaded modules
+BASE_SECONDS = 0.1
+BASE_MB = 300
+
+
+def _cgroup_cpus():
+    """The container's CPU quota in cores, or None for no quota."""
+    for path in _CGROUP_QUOTAS:
+        try:
+            with open(path) as f:
+                fields = f.read().split()
+            if path.endswith("cfs_quota_us"):
+                with open(path.replace("quota", "period")) as f:
+                    fields.append(f.read().strip())
+        except OSError:
+            continue
+        quota, period = fields[0], fields[1] if len(fields) > 1 else "100000"
+        if quota.lstrip("-").isdigit() and int(quota) > 0 and period.isdigit():
+            return int(quota) / int(period)
+        return None
+    return None
+
+
+def allocated_cpus() -> int:
+    """Cores this process should use: the fewest of affinity mask, CPU quota and ANALYSIS_CPUS."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpus()
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    configured = os.environ.get("ANALYSIS_CPUS")
+    if configured:
+        cpus = min(cpus, max(1, math.ceil(float(configured))))
+    return max(1, cpus)
+
+
+def limit_threads(cpus: int = None) -> int:
+    """
+    Cap BLAS/OpenMP thread pools at cpus (default allocated_cpus()); returns the cap.
+
+    Pools already loaded in this process are resized through threadpoolctl
+    (installed with scikit-learn); the environment covers processes started
+    from here on.
+    """
+    cpus = cpus or allocated_cpus()
+    for name in THREAD_ENV:
+        os.environ[name] = str(cpus)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return cpus
+    threadpool_limits(limits=cpus)
+    return cpus
+
+
+def estimate_input(head: bytes, total_bytes: int) -> dict:
+    """
+    Rows and columns of an upload from its first bytes and total size.
+
+    CSV rows come from the bytes per line of the sample (exact when head is
+    the whole file). Other formats report rows=None and cells, the
+    expected number of parsed values.
+    """
+    kind = sniff(head)
+    if kind != "csv":
+        return {"format": kind, "rows": None, "columns": None,
+                "cells": total_bytes * EXPANSION[kind] / CSV_BYTES_PER_CELL}
+
+    lines = head.split(b"\n")
+    whole = len(head) >= total_bytes
+    if not whole:
+        lines = lines[:-1]  # Cut off mid-line
+    header, sample = lines[0], [line for line in lines[1:] if line.strip()]
+    columns = header.count(b",") + 1
+    if whole or not sample:
+        rows = len(sample)
+    else:
+        sample_bytes = sum(len(line) + 1 for line in sample)
+        rows = round((total_bytes - len(header) - 1) * len(sample) / sample_bytes)
+    return {"format": kind, "rows": rows, "columns": columns, "cells": rows * columns}
+
+
+def estimate_cost(work: list, cpus: int = 1) -> dict:
+    """
+    Expected seconds and peak memory (MB) of a job on cpus cores.
+
+    work lists (hint, cells) for each handler the job runs: hint is the
+    handler's HANDLER_RESOURCES entry, seconds_per_mcell and mb_per_mcell
+    per million cells (rows × the features it reads) on one core; parallel
+    handlers (the rank sweep) spread their time over the cores they get.
+    """
+    seconds, memory_mb = BASE_SECONDS, BASE_MB
+    for hint, cells in work:
+        mcells = cells / 1e6
+        seconds += hint["seconds_per_mcell"] * mcells / (cpus if hint.get("parallel") else 1)
+        memory_mb += hint["mb_per_mcell"] * mcells
+    return {"seconds": round(seconds, 2), "memory_mb": round(memory_mb)}
+
+
+def choose_route(routes: dict, estimate) -> str:
+    """
+    Name of the first route whose limits cover estimate(cpus).
+
+    routes maps name -> {"cpus", "memory_mb", "max_seconds"}, smallest
+    first; a job fits when it finishes within max_seconds and its peak
+    stays within the route's memory budget. The last route takes whatever
+    fits nowhere else.
+    """
+    for name, route in routes.items():
+        expected = estimate(route["cpus"])
+        budget_mb = route["memory_mb"] * BUDGET_FRACTION
+        if expected["seconds"] <= route["max_seconds"] and expected["memory_mb"] <= budget_mb:
+            return name
+    return name
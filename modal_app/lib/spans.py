@@ -0,0 +1,217 @@
+"""
+Per-stage spans for a job: wall time, CPU time and peak memory.
+
+_process_claimed_job opens a Spans collector per job and wraps each stage
+in it (claim, cache lookup, download, parse, analysis, artifact upload). The
+collector is also made current through a context variable, so handlers can
+time their own steps with span("rank_sweep") without being passed anything.
+Outside a job, span() does nothing.
+
+Each span records:
+
+  seconds       wall-clock time
+  cpu_seconds   CPU time of this process, all threads (worker processes,
+                e.g. the rank sweep pool, are not included)
+  rss_mb        resident memory when the span started
+  peak_rss_mb   highest resident memory while it ran
+
+Peaks come from the kernel's high-water mark (VmHWM), which each span resets
+when it starts (Linux only; elsewhere the memory fields are None). A nested
+span is named parent.child, and its peak is folded into its parent's peak.
+A collector is meant for one thread. Threads running concurrently (e.g. the
+handlers of a multi-analysis job) each use their own, and adopt() files
+their records under a span of the job's collector. Resets fold the mark
+into every open span of every collector first, so a peak is the process's
+highest RSS while the span ran; cpu_seconds likewise counts all threads.
+
+as_dict() is the `metrics` object written to the job row. With profiling
+on, the analysis stage also runs under SamplingProfiler, whose summary is
+added to the metrics.
+"""
+
+import contextlib
+import contextvars
+import sys
+import threading
+import time
+from collections import Counter
+
+_current = contextvars.ContextVar("spans", default=None)
+
+# Open spans of all collectors, by id: a VmHWM reset by one must not lose another's peak
+_open_frames = {}
+_frames_lock = threading.Lock()
+
+
+def _status_mb(field: str):
+    """A memory field of /proc/self/status in MB, or None where there is no procfs."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset VmHWM to the current RSS (Linux >= 4.0)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _max(*values):
+    present = [v for v in values if v is not None]
+    return max(present) if present else None
+
+
+class Spans:
+    """
+    Collects named spans for one job, in the order they started.
+
+    records may carry spans measured elsewhere, e.g. a batch claim shared by
+    several jobs.
+    """
+
+    def __init__(self, records: list = None):
+        self.records = list(records or [])
+        self.profile = None
+        self._open = []  # [record, running peak] per open span, outermost first
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def __call__(self, name: str):
+        """Time the block as a span; yields its record so callers can add fields."""
+        if self._open:
+            name = f"{self._open[-1][0]['name']}.{name}"
+
+        record = {"name": name}
+        with _frames_lock:
+            # Fold the high-water mark so far into the open spans before resetting it
+            high = _status_mb("VmHWM")
+            for open_frame in _open_frames.values():
+                open_frame[1] = _max(open_frame[1], high)
+            rss = _status_mb("VmRSS")
+            _reset_peak_rss()
+            frame = [record, rss]
+            _open_frames[id(frame)] = frame
+
+        self.records.append(record)
+        self._open.append(frame)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            with _frames_lock:
+                peak = _max(frame[1], _status_mb("VmHWM"))
+                del _open_frames[id(frame)]
+            self._open.pop()
+            if self._open:
+                self._open[-1][1] = _max(self._open[-1][1], peak)
+            record.update({
+                "seconds": round(time.perf_counter() - start, 4),
+                "cpu_seconds": round(time.process_time() - cpu_start, 4),
+                "rss_mb": None if rss is None else round(rss, 1),
+                "peak_rss_mb": None if peak is None else round(peak, 1),
+            })
+
+    def adopt(self, other: "Spans", parent: str):
+        """Append another collector's records (e.g. a worker thread's), named under parent."""
+        self.records.extend({**record, "name": f"{parent}.{record['name']}"} for record in other.records)
+
+    def activate(self):
+        """Make this the collector span() records into; pass the token to deactivate."""
+        return _current.set(self)
+
+    def deactivate(self, token):
+        _current.reset(token)
+
+    def as_dict(self) -> dict:
+        metrics = {
+            "spans": self.records,
+            "total_seconds": round(time.perf_counter() - self._started, 4),
+        }
+        if self.profile is not None:
+            metrics["profile"] = self.profile
+        return metrics
+
+
+def span(name: str):
+    """A span in the current job's collector, or a no-op outside a job."""
+    spans = _current.get()
+    return spans(name) if spans is not None else contextlib.nullcontext({})
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the threads that enter it (or call track()).
+
+    A daemon thread snapshots the target threads' Python stacks every
+    interval seconds (sys._current_frames) and counts them. Time spent inside
+    NumPy or other C code is charged to the Python frame that called it.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._targets = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.track()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def track(self):
+        """Also sample the calling thread, e.g. a worker the profiled code fans out to."""
+        self._targets.add(threading.get_ident())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in tuple(self._targets):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    module = code.co_filename.rsplit("/", 1)[-1]
+                    stack.append(f"{module}:{code.co_qualname}")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[tuple(reversed(stack))] += 1
+                    self.samples += 1
+
+    def summary(self, top: int = 25) -> dict:
+        """Hottest functions by own and inclusive samples, plus the hottest collapsed stacks."""
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                inclusive[function] += count
+
+        def rows(counter):
+            return [
+                {"function": f, "samples": n, "fraction": round(n / self.samples, 4)}
+                for f, n in counter.most_common(top)
+            ]
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "top_self": rows(own),
+            "top_inclusive": rows(inclusive),
+            # Collapsed (flame graph) format: caller;callee;... -> samples
+            "stacks": [{"stack": ";".join(s), "samples": n} for s, n in self.stacks.most_common(top)],
+        }
@@ -0,0 +1,159 @@
+"""
+Spooling uploads to local disk, decoding compressed CSV on the way.
+
+process_job streams an upload from storage into a SpooledUpload: a temporary
+file written chunk by chunk as the download arrives, so the upload is never
+held in memory, let alone twice (as downloaded bytes and as a parse buffer).
+The format is recognised from the first bytes:
+
+  csv      plain CSV text, spooled as is
+  gzip     gzip-compressed CSV (.csv.gz), decompressed while streaming
+  zstd     zstd-compressed CSV (.csv.zst), decompressed while streaming
+  parquet  spooled as is; readers take only the configured columns
+
+Decompression uses pyarrow's codecs, so the spool holds either CSV text or
+Parquet and lib/ingest.py only reads those two. sha256 is of the bytes as
+uploaded (compressed or not), the same digest the web app records as the
+job's input_hash.
+"""
+
+import hashlib
+import io
+import itertools
+import os
+import tempfile
+
+# Directory for spooled uploads (None: the system temporary directory)
+SPOOL_DIR = None
+
+# Bytes per read when decompressing into the spool
+SPOOL_BLOCK_BYTES = 8 * 1024 * 1024
+
+MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\x28\xb5\x2f\xfd": "zstd",
+    b"PAR1": "parquet",
+}
+
+# Compressions decoded while spooling (pyarrow codec names)
+CODECS = ("gzip", "zstd")
+
+
+def sniff(head: bytes) -> str:
+    """Upload format from its first bytes: "gzip", "zstd", "parquet" or "csv"."""
+    for magic, kind in MAGIC.items():
+        if head.startswith(magic):
+            return kind
+    return "csv"
+
+
+class SpooledUpload:
+    """
+    An upload on local disk: path, format ("csv" or "parquet"), and how it arrived.
+
+    compression is the codec it was decoded from (None if it came plain),
+    downloaded_bytes its size as transferred. Closing (or leaving the with
+    block) removes the file; readers already holding it open keep working.
+    """
+
+    def __init__(self, path: str, format: str, compression, downloaded_bytes: int, sha256: str):
+        self.path = path
+        self.format = format
+        self.compression = compression
+        self.downloaded_bytes = downloaded_bytes
+        self.sha256 = sha256
+
+    @property
+    def size(self) -> int:
+        """Bytes on disk (after decompression)."""
+        return os.path.getsize(self.path)
+
+    def open(self):
+        return open(self.path, "rb")
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file over an iterator of byte chunks (the download), for pyarrow's decompressor."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def spool(chunks, directory: str = None) -> SpooledUpload:
+    """
+    Write an upload arriving as byte chunks to a temporary file, decoding gzip/zstd.
+
+    Only one chunk (one decompression block) is in memory at a time.
+    """
+    import pyarrow as pa
+
+    digest = hashlib.sha256()
+    downloaded = 0
+
+    def counted():
+        nonlocal downloaded
+        for chunk in chunks:
+            digest.update(chunk)
+            downloaded += len(chunk)
+            yield chunk
+
+    stream = counted()
+    head = b""
+    for chunk in stream:
+        head += chunk
+        if len(head) >= 4:
+            break
+    kind = sniff(head)
+    stream = itertools.chain([head], stream)
+
+    fd, path = tempfile.mkstemp(dir=directory or SPOOL_DIR, suffix=".parquet" if kind == "parquet" else ".csv")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if kind in CODECS:
+                source = pa.CompressedInputStream(pa.PythonFile(_ChunkReader(stream), mode="r"), kind)
+                try:
+                    while block := source.read(SPOOL_BLOCK_BYTES):
+                        out.write(block)
+                except OSError as e:
+                    raise ValueError(f"Upload looks {kind}-compressed but could not be decompressed: {e}") from e
+            else:
+                for chunk in stream:
+                    out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return SpooledUpload(
+        path,
+        format="parquet" if kind == "parquet" else "csv",
+        compression=kind if kind in CODECS else None,
+        downloaded_bytes=downloaded,
+        sha256=digest.hexdigest(),
+    )
@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.fixture
+def supabase():
+    """A FakeSupabase server that modal_app.app's client points at for the test."""
+    import modal_app.app as app
+    from modal_app.benchmarks.fake_supabase import FakeSupabase
+
+    server = FakeSupabase().start()
+    previous = app._supabase_client
+    app._supabase_client = app.SupabaseClient(server.url, "service-key")
+    try:
+        yield server
+    finally:
+        app._supabase_client = previous
+        server.stop()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modal_app.lib.cache import UploadCache
+from modal_app.lib.ingest import csv_to_arrow, read_arrow_transformed, read_csv_transformed, read_upload
+from modal_app.lib.uploads import spool
+
+WIDE = {"format": "wide", "customerIdColumn": "customer_id"}
+LONG = {
+    "format": "long",
+    "customerIdColumn": "customer_id",
+    "featureNameColumn": "feature",
+    "featureValueColumn": "count",
+}
+
+WIDE_CSV = (
+    "customer_id,a,b,empty,c\n"
+    "c1,1,,,3\n"
+    "c2,NA,2,,0\n"
+    "c3,4,5,NA,\n"
+    "c4,0,n/a,,7\n"
+)
+LONG_CSV = (
+    "customer_id,feature,count\n"
+    "c1,login,3\n"
+    "c1,export,1\n"
+    "c2,login,\n"
+    "c2,NA,4\n"
+    "c3,export,2\n"
+    "c3,login,NA\n"
+    "c1,login,2\n"
+)
+
+
+def _dense(counts) -> pd.DataFrame:
+    """The parsed counts as a DataFrame, whatever container they came in."""
+    if isinstance(counts, pd.DataFrame):
+        return counts
+    X = counts.X.toarray() if hasattr(counts.X, "toarray") else np.asarray(counts.X)
+    return pd.DataFrame(X, index=counts.index, columns=counts.columns)
+
+
+def _assert_same(left, right):
+    left, right = _dense(left), _dense(right)
+    assert list(left.columns) == list(right.columns)
+    assert left.index.equals(right.index)
+    np.testing.assert_array_equal(left.to_numpy(), right.to_numpy())
+
+
+@pytest.mark.parametrize("text, config", [(WIDE_CSV, WIDE), (LONG_CSV, LONG)], ids=["wide", "long"])
+def test_arrow_parse_matches_pandas(tmp_path, text, config):
+    csv_path, arrow_path = tmp_path / "upload.csv", tmp_path / "upload.arrow"
+    csv_path.write_text(text)
+    csv_to_arrow(str(csv_path), str(arrow_path))
+
+    with open(csv_path, "rb") as source:
+        expected = read_csv_transformed(source, config)
+    _assert_same(read_arrow_transformed(str(arrow_path), config), expected)
+
+
+@pytest.mark.parametrize("text, config", [(WIDE_CSV, WIDE), (LONG_CSV, LONG)], ids=["wide", "long"])
+def test_cached_parse_matches_uncached(tmp_path, text, config):
+    cache = UploadCache(str(tmp_path / "cache"))
+    with spool(iter([text.encode()]), directory=str(tmp_path)) as upload:
+        expected = read_upload(upload, config)
+        first = read_upload(upload, config, cache=cache)
+        assert cache.get(upload.sha256) is not None
+        second = read_upload(upload, config, cache=cache)
+
+    _assert_same(first, expected)
+    _assert_same(second, expected)
@@ -0,0 +1,95 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import modal_app.app as app
+from modal_app.benchmarks.synthetic import revenue_frame, survival_frame
+from modal_app.lib.memo import result_cache_key
+
+
+def _survival_csv(n: int = 400) -> tuple:
+    df, config = survival_frame(n, 2)
+    return df.to_csv(index=False).encode(), config
+
+
+def test_complete_job_is_fenced_by_the_lease(supabase):
+    data, config = _survival_csv()
+    job_id = supabase.add_job("survival_analysis", data, column_config=config)
+    client = app.get_supabase_client()
+    a, b = app.new_worker_id(), app.new_worker_id()
+
+    assert [row["id"] for row in app.claim_jobs(client, a, job_id=job_id)] == [job_id]
+    assert app.claim_jobs(client, b, job_id=job_id) == []
+    assert not app.complete_job(client, job_id, b, {"result": {"from": "b"}})
+    assert supabase.rows[job_id]["status"] == "running"
+    assert supabase.rows[job_id]["result"] is None
+
+    assert app.complete_job(client, job_id, a, {"result": {"from": "a"}})
+    assert supabase.rows[job_id]["status"] == "done"
+    assert supabase.rows[job_id]["result"] == {"from": "a"}
+
+
+def test_expired_lease_moves_to_the_next_worker(supabase):
+    data, config = _survival_csv()
+    job_id = supabase.add_job("survival_analysis", data, column_config=config)
+    client = app.get_supabase_client()
+    a, b = app.new_worker_id(), app.new_worker_id()
+
+    app.claim_jobs(client, a, job_id=job_id)
+    supabase.rows[job_id]["lease_expires_at"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    assert [row["attempts"] for row in app.claim_jobs(client, b, job_id=job_id)] == [2]
+
+    app.fail_job(client, job_id, "late failure", worker_id=a)
+    assert not app.complete_job(client, job_id, a, {"result": {"from": "a"}})
+    assert supabase.rows[job_id]["status"] == "running"
+    assert supabase.rows[job_id]["claimed_by"] == b
+
+
+def test_result_is_keyed_on_the_downloaded_upload(supabase):
+    data, config = _survival_csv()
+    client = app.get_supabase_client()
+    version = app.HANDLER_VERSIONS["survival_analysis"]
+    expected = result_cache_key(hashlib.sha256(data).hexdigest(), "survival_analysis", config, version)
+
+    first = supabase.add_job("survival_analysis", data, column_config=config, input_hash="0" * 64)
+    app.process_job_now(client, first)
+    assert supabase.rows[first]["status"] == "done"
+    assert supabase.rows[first]["result_key"] == expected
+
+    second = supabase.add_job("survival_analysis", data, column_config=config, input_hash="0" * 64)
+    app.process_job_now(client, second)
+    assert supabase.rows[second]["result_cache_hit"] is True
+    assert supabase.rows[second]["result"]["cached_from_job"] == first
+
+
+def _comparable(result: dict) -> dict:
+    return {k: v for k, v in result.items() if k not in ("processed_at", "artifacts", "input_columns")}
+
+
+@pytest.mark.parametrize("feature_columns", [None, ["x0"]], ids=["all-covariates", "x0-only"])
+def test_multi_analysis_matches_single_jobs(supabase, feature_columns):
+    survival, survival_config = survival_frame(1500, 2)
+    revenue, revenue_config = revenue_frame(1500, 12)
+    revenue = revenue.iloc[:len(survival)].reset_index(drop=True)
+    df = survival.assign(month=revenue["month"], revenue=revenue["revenue"])
+    config = {**survival_config, **revenue_config}
+    if feature_columns is not None:
+        config["featureColumns"] = feature_columns
+    data = df.to_csv(index=False).encode()
+    client = app.get_supabase_client()
+    analyses = ["survival_analysis", "nrr_decomposition"]
+
+    singles = {}
+    for job_type in analyses:
+        job_id = supabase.add_job(job_type, data, column_config=config)
+        app.process_job_now(client, job_id)
+        assert supabase.rows[job_id]["status"] == "done"
+        singles[job_type] = supabase.rows[job_id]["result"]
+
+    job_id = supabase.add_job("multi_analysis", data, column_config={**config, "analyses": analyses})
+    app.process_job_now(client, job_id)
+    assert supabase.rows[job_id]["status"] == "done"
+    combined = supabase.rows[job_id]["result"]["analyses"]
+    for job_type in analyses:
+        assert _comparable(combined[job_type]) == _comparable(singles[job_type])
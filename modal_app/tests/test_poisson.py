@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from modal_app.benchmarks.synthetic import count_matrix
+from modal_app.jobs.poisson import _init_factors, as_count_matrix, elbow_rank, fit_kl, fit_rank_sweep
+
+
+def _kl(X, W, H):
+    """Generalized KL divergence D(X || WH), as sklearn's NMF reports it."""
+    WH = W @ H
+    nonzero = X > 0
+    return float((X[nonzero] * np.log(X[nonzero] / WH[nonzero])).sum() - X.sum() + WH.sum())
+
+
+@pytest.fixture(scope="module")
+def planted():
+    """Counts drawn from a rank-3 Poisson model."""
+    rng = np.random.default_rng(0)
+    W = rng.gamma(1.0, 1.0, (400, 3))
+    H = rng.gamma(0.5, 2.0, (3, 30))
+    return rng.poisson(W @ H).astype(np.float64)
+
+
+def test_fit_kl_matches_sklearn_kl_nmf(planted):
+    from sklearn.decomposition import NMF
+
+    fit = fit_kl(as_count_matrix(planted), 3, max_iter=1000, tol=1e-7)
+    ours = _kl(planted, fit["W"], fit["H"])
+
+    model = NMF(3, beta_loss="kullback-leibler", solver="mu", init="nndsvda", max_iter=1000, tol=1e-7, random_state=0)
+    W = model.fit_transform(planted)
+    theirs = _kl(planted, W, model.components_)
+
+    assert ours <= theirs * 1.01
+    assert fit["error"] == pytest.approx(ours, rel=1e-6)
+
+
+def test_fit_kl_keeps_given_factors(planted):
+    X = as_count_matrix(planted)
+    W, H = _init_factors(X, 3, seed=1)
+    fit = fit_kl(X, 3, W=W, H=H, max_iter=0)
+    np.testing.assert_array_equal(fit["W"], W)
+    np.testing.assert_array_equal(fit["H"], H)
+    assert fit["W"] is not W and fit["H"] is not H
+
+
+def test_solve_w_holds_h_fixed(planted):
+    X = as_count_matrix(planted)
+    H = fit_kl(X, 3)["H"]
+    fit = fit_kl(X, 3, H=H, update_h=False)
+    np.testing.assert_array_equal(fit["H"], H)
+
+
+def test_rank_sweep_finds_planted_rank(planted):
+    X = as_count_matrix(planted)
+    fits = fit_rank_sweep(X, 6, n_jobs=1)
+    assert [f["k"] for f in fits] == list(range(1, 7))
+    log_likelihoods = [f["log_likelihood"] for f in fits]
+    assert all(b >= a - 1e-6 * abs(a) for a, b in zip(log_likelihoods, log_likelihoods[1:]))
+    assert elbow_rank(log_likelihoods)[0] == 3
+
+
+def test_parallel_sweep_matches_serial_elbow():
+    X = as_count_matrix(count_matrix(2000, 20).toarray())
+
+    def stop(fits):
+        return elbow_rank([f["log_likelihood"] for f in fits])[1]
+
+    serial = fit_rank_sweep(X, 8, n_jobs=1, stop=stop)
+    parallel = fit_rank_sweep(X, 8, n_jobs=2, stop=stop)
+    assert [f["k"] for f in parallel] == list(range(1, len(parallel) + 1))
+    assert len(parallel) >= len(serial)
+    assert elbow_rank([f["log_likelihood"] for f in parallel])[0] == elbow_rank([f["log_likelihood"] for f in serial])[0]
@@ -0,0 +1,23 @@
+-- Result memoization: identical (input, job_type, column_config, handler version) reuse a stored result
+
+-- SHA-256 of the uploaded file, computed at upload time so Modal can check the cache before downloading
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS input_hash TEXT;
+
+-- Hash of input_hash + job_type + normalized column_config + handler version (set by Modal)
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS result_key TEXT;
+
+-- Whether the result was copied from an earlier job instead of computed
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS result_cache_hit BOOLEAN;
+
+-- Lookup of finished results by key
+CREATE INDEX IF NOT EXISTS idx_jobs_result_key ON jobs(result_key) WHERE status = 'done';
+
+-- Hit/miss counters
+CREATE OR REPLACE VIEW result_cache_stats AS
+SELECT
+  job_type,
+  COUNT(*) FILTER (WHERE result_cache_hit) AS hits,
+  COUNT(*) FILTER (WHERE NOT result_cache_hit) AS misses
+FROM jobs
+WHERE result_cache_hit IS NOT NULL
+GROUP BY job_type;
@@ -0,0 +1,96 @@
+-- Job leases: workers atomically claim jobs and hold them for a bounded time.
+-- A worker heartbeats its leases while processing; jobs whose lease expired
+-- (crashed or timed-out worker) are claimable again, up to max_attempts
+-- claims in total; after that the job is failed instead of retried forever.
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+
+-- Claim scans only unfinished jobs, oldest first
+CREATE INDEX IF NOT EXISTS idx_jobs_claimable ON jobs(created_at) WHERE status IN ('pending', 'running');
+
+-- Claim up to max_jobs jobs (or only only_job_id) for worker_id.
+-- SKIP LOCKED lets concurrent workers claim disjoint sets without waiting;
+-- a job is claimable when pending, or running with an expired (or no) lease.
+-- Every claim counts an attempt. Expired jobs that already used max_attempts
+-- (they keep timing out or crashing their worker) are marked as errors.
+DROP FUNCTION IF EXISTS claim_jobs(INTEGER, INTEGER, TEXT, UUID);
+CREATE OR REPLACE FUNCTION claim_jobs(
+  max_jobs INTEGER,
+  lease_seconds INTEGER,
+  worker_id TEXT,
+  only_job_id UUID DEFAULT NULL,
+  max_attempts INTEGER DEFAULT 3
+)
+RETURNS SETOF jobs AS $$
+  WITH exhausted AS (
+    UPDATE jobs
+    SET status = 'error',
+        error_message = format('Job abandoned after %s attempts (the worker timed out or crashed each time)', attempts),
+        progress = 0,
+        claimed_by = NULL,
+        lease_expires_at = NULL
+    WHERE id IN (
+      SELECT id FROM jobs
+      WHERE status = 'running'
+        AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+        AND attempts >= max_attempts
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+  )
+  UPDATE jobs
+  SET status = 'running',
+      claimed_by = worker_id,
+      lease_expires_at = NOW() + make_interval(secs => lease_seconds),
+      attempts = attempts + 1
+  WHERE id IN (
+    SELECT id FROM jobs
+    WHERE (only_job_id IS NULL OR id = only_job_id)
+      AND attempts < max_attempts
+      AND (
+        status = 'pending'
+        OR (status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < NOW()))
+      )
+    ORDER BY created_at
+    LIMIT max_jobs
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING *;
+$$ LANGUAGE sql;
+
+-- Hand back jobs worker_id claimed but will not start (out of time budget).
+-- The unused claim does not count as an attempt.
+CREATE OR REPLACE FUNCTION release_jobs(
+  job_ids UUID[],
+  worker_id TEXT
+)
+RETURNS INTEGER AS $$
+  WITH released AS (
+    UPDATE jobs
+    SET status = 'pending',
+        claimed_by = NULL,
+        lease_expires_at = NULL,
+        attempts = GREATEST(attempts - 1, 0)
+    WHERE id = ANY(job_ids) AND claimed_by = worker_id AND status = 'running'
+    RETURNING 1
+  )
+  SELECT COUNT(*)::INTEGER FROM released;
+$$ LANGUAGE sql;
+
+-- Extend the leases worker_id still holds; returns how many were extended
+CREATE OR REPLACE FUNCTION heartbeat_jobs(
+  job_ids UUID[],
+  lease_seconds INTEGER,
+  worker_id TEXT
+)
+RETURNS INTEGER AS $$
+  WITH extended AS (
+    UPDATE jobs
+    SET lease_expires_at = NOW() + make_interval(secs => lease_seconds)
+    WHERE id = ANY(job_ids) AND claimed_by = worker_id AND status = 'running'
+    RETURNING 1
+  )
+  SELECT COUNT(*)::INTEGER FROM extended;
+$$ LANGUAGE sql;
@@ -0,0 +1,14 @@
+-- Result artifacts: large per-customer arrays written by Modal as Parquet/npz files.
+-- jobs.result keeps only summaries plus pointers ({bucket, path, format, bytes, ...})
+-- under result->'artifacts', so polling the row never pulls full score tables.
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('analysis-results', 'analysis-results', false)
+ON CONFLICT (id) DO NOTHING;
+
+-- Modal writes with the service role key, which bypasses RLS; clients only read.
+-- For demo purposes reads are open - tighten this for production
+DROP POLICY IF EXISTS "Allow reading from analysis-results" ON storage.objects;
+CREATE POLICY "Allow reading from analysis-results"
+ON storage.objects FOR SELECT
+USING (bucket_id = 'analysis-results');
@@ -0,0 +1,19 @@
+-- Per-stage instrumentation written by Modal with each job's outcome:
+-- {"spans": [{"name", "seconds", "cpu_seconds", "rss_mb", "peak_rss_mb", ...}],
+--  "total_seconds", "profile"?}. Nested spans are named parent.child
+-- (e.g. analysis.rank_sweep); "profile" is present only when the job's
+-- column_config asked for it.
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS metrics JSONB;
+
+-- Where worker time goes, per job type and stage
+CREATE OR REPLACE VIEW job_stage_stats AS
+SELECT
+  job_type,
+  span->>'name' AS stage,
+  COUNT(*) AS spans,
+  percentile_cont(0.5) WITHIN GROUP (ORDER BY (span->>'seconds')::float) AS p50_seconds,
+  percentile_cont(0.95) WITHIN GROUP (ORDER BY (span->>'seconds')::float) AS p95_seconds,
+  MAX((span->>'peak_rss_mb')::float) AS max_peak_rss_mb
+FROM jobs, jsonb_array_elements(metrics->'spans') AS span
+WHERE metrics IS NOT NULL
+GROUP BY job_type, span->>'name';
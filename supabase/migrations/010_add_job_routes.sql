@@ -0,0 +1,56 @@
+-- Size-aware routing: Modal's trigger sizes each job from the head of its
+-- upload and marks jobs too big for the standard workers with route 'large'
+-- (NULL means standard). Workers claim only their own route's jobs, so a
+-- standard worker never starts a job it has neither the time nor the memory
+-- to finish.
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS route TEXT;
+
+-- claim_jobs (see 007_add_job_leases.sql), plus routes: when given, only
+-- jobs on one of those routes are claimed.
+DROP FUNCTION IF EXISTS claim_jobs(INTEGER, INTEGER, TEXT, UUID, INTEGER);
+CREATE OR REPLACE FUNCTION claim_jobs(
+  max_jobs INTEGER,
+  lease_seconds INTEGER,
+  worker_id TEXT,
+  only_job_id UUID DEFAULT NULL,
+  max_attempts INTEGER DEFAULT 3,
+  routes TEXT[] DEFAULT NULL
+)
+RETURNS SETOF jobs AS $$
+  WITH exhausted AS (
+    UPDATE jobs
+    SET status = 'error',
+        error_message = format('Job abandoned after %s attempts (the worker timed out or crashed each time)', attempts),
+        progress = 0,
+        claimed_by = NULL,
+        lease_expires_at = NULL
+    WHERE id IN (
+      SELECT id FROM jobs
+      WHERE status = 'running'
+        AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+        AND attempts >= max_attempts
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+  )
+  UPDATE jobs
+  SET status = 'running',
+      claimed_by = worker_id,
+      lease_expires_at = NOW() + make_interval(secs => lease_seconds),
+      attempts = attempts + 1
+  WHERE id IN (
+    SELECT id FROM jobs
+    WHERE (only_job_id IS NULL OR id = only_job_id)
+      AND (routes IS NULL OR COALESCE(route, 'standard') = ANY(routes))
+      AND attempts < max_attempts
+      AND (
+        status = 'pending'
+        OR (status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < NOW()))
+      )
+    ORDER BY created_at
+    LIMIT max_jobs
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING *;
+$$ LANGUAGE sql;